@@ -0,0 +1,190 @@
+"""Failure analytics of a type across the class.
+
+The submissions shown in the grading table (the best of each project)
+are grouped by the set of cases they fail. Per-case pass rates and the
+co-failure matrix come from bitsets: one Python int per case with a bit
+per submission that ran it, or failed it. Building them is a single pass
+over the case results, and each matrix cell is one AND and a popcount,
+so the cost grows with cases squared times submissions / 64.
+
+Clusters of submissions failing the same cases point at common mistakes;
+a case failed by most otherwise passing submissions, or cases that
+always fail together, point at problems in the tests themselves.
+"""
+
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from models import Submission, TestCaseResult, db
+from testcases import shorten_testcase
+
+# Clusters and co-failing pairs reported, largest first
+MAX_CLUSTERS = 50
+MAX_PAIRS = 50
+# A case failed by this share of submissions that pass nearly everything
+# else is flagged as a possible test bug
+SUSPECT_FAIL_RATE = 0.5
+SUSPECT_MAX_OTHER_FAILURES = 1
+
+
+@dataclass
+class CaseStats:
+    name: str
+    short: str
+    ran: int
+    failed: int
+    pass_rate: float
+    # Of the submissions failing this case, how many fail nothing else
+    only_failure: int
+
+
+@dataclass
+class FailureCluster:
+    cases: List[str]
+    count: int
+    projects: List[str]
+    submission_ids: List[int]
+
+
+@dataclass
+class FailureAnalytics:
+    type_id: str
+    suite: Optional[str]
+    submissions: int
+    passing: int
+    cases: List[CaseStats] = field(default_factory=list)
+    clusters: List[FailureCluster] = field(default_factory=list)
+    # Short names of the cases failed at least once, in matrix order
+    matrix_cases: List[str] = field(default_factory=list)
+    # co_failures[i][j]: submissions failing both case i and case j
+    co_failures: List[List[int]] = field(default_factory=list)
+    # Cases that fail together, with the Jaccard index of their failures
+    co_failing_pairs: List[dict] = field(default_factory=list)
+    suspect_cases: List[str] = field(default_factory=list)
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+
+def _best_submissions(type_id: str, suite: Optional[str]) -> List[Submission]:
+    """The submission of each project the grading table shows."""
+    query = Submission.query.filter(
+        Submission.type_id == type_id, Submission.has_result()
+    )
+    if suite:
+        query = query.filter(Submission.testcase_id == suite)
+    best: Dict[str, Submission] = {}
+    for sub in query.order_by(Submission.project_id, Submission.id):
+        if sub.project_id in best and sub.passed <= best[sub.project_id].passed:
+            continue
+        best[sub.project_id] = sub
+    return sorted(best.values(), key=lambda s: s.project_id)
+
+
+def analyze_failures(type_id: str, suite: Optional[str] = None) -> FailureAnalytics:
+    """Pass rates, co-failures and failure clusters of type_id."""
+    submissions = _best_submissions(type_id, suite)
+    index_of = {sub.id: i for i, sub in enumerate(submissions)}
+
+    case_index: Dict[str, int] = {}
+    ran: List[int] = []
+    failed: List[int] = []
+    # Failed cases per submission, as a bitset over case indexes
+    signatures = [0] * len(submissions)
+    rows = (
+        db.session.query(
+            TestCaseResult.submission_id, TestCaseResult.name, TestCaseResult.outcome
+        )
+        .filter(TestCaseResult.submission_id.in_(list(index_of)))
+        .all()
+        if index_of
+        else []
+    )
+    for submission_id, name, outcome in rows:
+        c = case_index.get(name)
+        if c is None:
+            c = case_index[name] = len(ran)
+            ran.append(0)
+            failed.append(0)
+        bit = 1 << index_of[submission_id]
+        ran[c] |= bit
+        if outcome == "failed":
+            failed[c] |= bit
+            signatures[index_of[submission_id]] |= 1 << c
+
+    names = sorted(case_index, key=case_index.get)
+    # Case index -> submissions failing that case alone
+    only_failures = Counter(
+        s.bit_length() - 1 for s in signatures if s and s & (s - 1) == 0
+    )
+    result = FailureAnalytics(
+        type_id,
+        suite,
+        len(submissions),
+        sum(1 for s in signatures if not s),
+    )
+
+    for c, name in enumerate(names):
+        n_ran = ran[c].bit_count()
+        n_failed = failed[c].bit_count()
+        result.cases.append(
+            CaseStats(
+                name,
+                shorten_testcase(name),
+                n_ran,
+                n_failed,
+                round(1 - n_failed / n_ran, 4) if n_ran else 0.0,
+                only_failures[c],
+            )
+        )
+    result.cases.sort(key=lambda s: (s.pass_rate, s.name))
+
+    # Submissions that pass nearly everything
+    nearly_passing = sum(
+        1 << i
+        for i, s in enumerate(signatures)
+        if s.bit_count() <= SUSPECT_MAX_OTHER_FAILURES + 1
+    )
+    for c, name in enumerate(names):
+        ran_nearly = (ran[c] & nearly_passing).bit_count()
+        failed_nearly = (failed[c] & nearly_passing).bit_count()
+        if ran_nearly and failed_nearly / ran_nearly >= SUSPECT_FAIL_RATE:
+            result.suspect_cases.append(shorten_testcase(name))
+
+    clusters: Dict[int, List[int]] = {}
+    for i, s in enumerate(signatures):
+        if s:
+            clusters.setdefault(s, []).append(i)
+    largest = sorted(clusters.items(), key=lambda kv: -len(kv[1]))[:MAX_CLUSTERS]
+    for s, members in largest:
+        result.clusters.append(
+            FailureCluster(
+                [shorten_testcase(names[c]) for c in range(len(names)) if s >> c & 1],
+                len(members),
+                [submissions[i].project_id for i in members],
+                [submissions[i].id for i in members],
+            )
+        )
+
+    failing = [c for c in range(len(names)) if failed[c]]
+    result.matrix_cases = [shorten_testcase(names[c]) for c in failing]
+    for a in failing:
+        row = []
+        for b in failing:
+            both = (failed[a] & failed[b]).bit_count()
+            row.append(both)
+            if a < b and both:
+                either = (failed[a] | failed[b]).bit_count()
+                result.co_failing_pairs.append(
+                    {
+                        "a": shorten_testcase(names[a]),
+                        "b": shorten_testcase(names[b]),
+                        "both": both,
+                        "jaccard": round(both / either, 4),
+                    }
+                )
+        result.co_failures.append(row)
+    result.co_failing_pairs.sort(key=lambda p: (-p["jaccard"], -p["both"]))
+    del result.co_failing_pairs[MAX_PAIRS:]
+    return result
@@ -1,9 +1,19 @@
-from testcases import shorten_testcase
-from score import program01score, program02score, program03score, program04score
+from testcases import diff_case_output, shorten_testcase
 import os
 import csv
+import hmac
 import io
-from flask import Flask, render_template, jsonify, request, Response
+from dataclasses import asdict
+from functools import wraps
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    jsonify,
+    render_template,
+    request,
+)
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,29 +22,61 @@ from models import (
     db,
     Submission,
     TestCaseResult,
+    SubmissionLog,
     Deadline,
     Student,
+    Worker,
     calculate_submission_timing,
 )
-from grader import check_all_issues, sync_students
+from cache import (
+    STUDENTS_SCOPE,
+    analytics_cache,
+    bump,
+    csv_cache,
+    log_cache,
+    similarity_cache,
+    table_cache,
+    type_scope,
+    versions,
+)
+from storage import CASE_DIFF_LIMIT, compress_text, decompress_text
+from tracing import instrument_sqlalchemy
+from database import WEB_POOL_SIZE, configure_app
+from sqlalchemy.orm import undefer
 from datetime import datetime, timedelta, timezone
 
 JST = timezone(timedelta(hours=9))
 
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
-    "DATABASE_URL", "sqlite:///submissions.db"
-)
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+bp = Blueprint("dashboard", __name__)
+
 
-db.init_app(app)
+def create_app():
+    """Create the dashboard app.
 
-with app.app_context():
-    db.create_all()
+    Touches neither the database nor Redmine, so gunicorn workers
+    (gunicorn 'app:create_app()') and the flask CLI start at once. The
+    schema is upgraded separately, with flask --app app db-upgrade or
+    python migrations.py upgrade.
+    """
+    app = Flask(__name__)
+    configure_app(app, WEB_POOL_SIZE)
+    app.register_blueprint(bp)
+    with app.app_context():
+        instrument_sqlalchemy(db.engine)
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade():
+        """Apply pending schema migrations."""
+        from migrations import LATEST, upgrade
+
+        applied = upgrade(db.engine)
+        print(f"Applied {len(applied)} migrations, schema at version {LATEST}")
+
+    return app
 
 
 # Custom Jinja2 filter for JST datetime formatting
-@app.template_filter("jst")
+@bp.app_template_filter("jst")
 def jst_filter(dt, fmt="%Y-%m-%d %H:%M"):
     """Convert UTC datetime to JST and format it."""
     if dt is None:
@@ -47,33 +89,49 @@ def jst_filter(dt, fmt="%Y-%m-%d %H:%M"):
 
 
 # Make calculate_submission_timing available in templates
-@app.context_processor
+@bp.app_context_processor
 def utility_processor():
     return {"calculate_timing": calculate_submission_timing}
 
 
-@app.route("/")
+@bp.route("/")
 def index():
     """Display all submissions in a table."""
     submissions = Submission.query.order_by(Submission.submitted_at.desc()).all()
     return render_template("index.html", submissions=submissions)
 
 
-@app.route("/submission/<int:submission_id>")
+@bp.route("/submission/<int:submission_id>")
 def detail(submission_id):
     """Display detailed information for a single submission."""
     submission = Submission.query.get_or_404(submission_id)
     test_results = TestCaseResult.query.filter_by(submission_id=submission_id).all()
+    # Only the ids here; outputs and diffs are fetched lazily by the page
+    output_ids = {
+        row.id
+        for row in db.session.query(TestCaseResult.id).filter(
+            TestCaseResult.submission_id == submission_id,
+            TestCaseResult.output_blob.isnot(None),
+        )
+    }
+    log_kinds = [
+        row.kind
+        for row in db.session.query(SubmissionLog.kind)
+        .filter_by(submission_id=submission_id)
+        .order_by(SubmissionLog.kind)
+    ]
     deadline = Deadline.get_deadline(submission.type_id)
     return render_template(
         "detail.html",
         submission=submission,
         test_results=test_results,
+        output_ids=output_ids,
+        log_kinds=log_kinds,
         deadline=deadline,
     )
 
 
-@app.route("/api/submissions")
+@bp.route("/api/submissions")
 def api_submissions():
     """JSON API to get all submissions."""
     submissions = Submission.query.order_by(Submission.submitted_at.desc()).all()
@@ -87,6 +145,7 @@ def api_submissions():
                 "passed": s.passed,
                 "total": s.total,
                 "failed": s.failed,
+                "score": s.score,
                 "status": s.status,
                 "submitted_at": s.submitted_at.isoformat() if s.submitted_at else None,
                 "evaluated_at": s.evaluated_at.isoformat() if s.evaluated_at else None,
@@ -96,7 +155,28 @@ def api_submissions():
     )
 
 
-@app.route("/grading")
+@bp.route("/api/events")
+def api_events():
+    """Server-sent events of submission changes (status, progress, results).
+
+    ?submission_id= or ?type_id= limit the stream to one submission or type.
+    The stream ends after SSE_STREAM_SECONDS; reconnecting browsers send
+    Last-Event-ID and get the changes they missed.
+    """
+    from events import stream
+
+    submission_id = request.args.get("submission_id", type=int)
+    type_id = request.args.get("type_id") or None
+    last_event_id = request.headers.get("Last-Event-ID")
+    app = current_app._get_current_object()
+    return Response(
+        stream(app, submission_id, type_id, last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/grading")
 def grading():
     """Display grading table selector."""
     # Get available types from grader
@@ -106,16 +186,7 @@ def grading():
     return render_template("grading.html", available_types=available_types)
 
 
-# Mapping of type_id to scoring function
-SCORE_FUNCTIONS = {
-    "program01": program01score,
-    "program02": program02score,
-    "program03": program03score,
-    "program04": program04score,
-}
-
-
-@app.route("/grading/<type_id>")
+@bp.route("/grading/<type_id>")
 def grading_table(type_id):
     """Display grading table for a specific type."""
     from grader import TEST_MAP
@@ -123,12 +194,21 @@ def grading_table(type_id):
     if type_id not in TEST_MAP:
         return "Invalid type", 404
 
+    key = (type_id, versions([type_scope(type_id), STUDENTS_SCOPE]))
+    return table_cache.get_or_build(key, lambda: _render_grading_table(type_id))
+
+
+def _render_grading_table(type_id):
+    from score import SCORE_FUNCTIONS
+
     # Get scoring function for this type
     score_func = SCORE_FUNCTIONS.get(type_id)
 
     # Get all submissions for this type
     submissions = (
-        Submission.query.filter_by(type_id=type_id, status="completed")
+        Submission.query.filter(
+            Submission.type_id == type_id, Submission.has_result()
+        )
         .order_by(Submission.project_id)
         .all()
     )
@@ -188,10 +268,20 @@ def grading_table(type_id):
     )
 
 
-@app.route("/grading/all/csv")
+@bp.route("/grading/all/csv")
 def grading_all_csv():
     """Export grading data as CSV for all types combined."""
+    text = csv_cache.get_or_build(("all", versions()), _build_all_csv)
+    return Response(
+        text,
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=all_grades.csv"},
+    )
+
+
+def _build_all_csv() -> str:
     from grader import TEST_MAP
+    from score import SCORE_FUNCTIONS
 
     available_types = sorted(TEST_MAP.keys())
 
@@ -215,7 +305,9 @@ def grading_all_csv():
     for type_id in available_types:
         score_func = SCORE_FUNCTIONS.get(type_id)
         submissions = (
-            Submission.query.filter_by(type_id=type_id, status="completed")
+            Submission.query.filter(
+                Submission.type_id == type_id, Submission.has_result()
+            )
             .order_by(Submission.project_id)
             .all()
         )
@@ -277,16 +369,10 @@ def grading_all_csv():
 
         writer.writerow(row)
 
-    # Prepare response
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=all_grades.csv"},
-    )
+    return output.getvalue()
 
 
-@app.route("/grading/<type_id>/csv")
+@bp.route("/grading/<type_id>/csv")
 def grading_csv(type_id):
     """Export grading data as CSV for a specific type (same content as grading_table)."""
     from grader import TEST_MAP
@@ -294,12 +380,26 @@ def grading_csv(type_id):
     if type_id not in TEST_MAP:
         return "Invalid type", 404
 
+    key = (type_id, versions([type_scope(type_id), STUDENTS_SCOPE]))
+    text = csv_cache.get_or_build(key, lambda: _build_grading_csv(type_id))
+    return Response(
+        text,
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={type_id}_grades.csv"},
+    )
+
+
+def _build_grading_csv(type_id) -> str:
+    from score import SCORE_FUNCTIONS
+
     # Get scoring function for this type
     score_func = SCORE_FUNCTIONS.get(type_id)
 
     # Get all submissions for this type
     submissions = (
-        Submission.query.filter_by(type_id=type_id, status="completed")
+        Submission.query.filter(
+            Submission.type_id == type_id, Submission.has_result()
+        )
         .order_by(Submission.project_id)
         .all()
     )
@@ -407,16 +507,87 @@ def grading_csv(type_id):
         ] + testcase_results
         writer.writerow(row)
 
-    # Prepare response
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={type_id}_grades.csv"},
+    return output.getvalue()
+
+
+def _failure_analytics(type_id):
+    from analytics import analyze_failures
+
+    suite = request.args.get("suite") or None
+    key = (type_id, suite, versions([type_scope(type_id)]))
+    return analytics_cache.get_or_build(
+        key, lambda: analyze_failures(type_id, suite)
+    )
+
+
+@bp.route("/analytics")
+@bp.route("/analytics/<type_id>")
+def analytics(type_id=None):
+    """Display pass rates, failure clusters and co-failures of a type."""
+    from grader import TEST_MAP
+
+    if type_id is not None and type_id not in TEST_MAP:
+        return "Invalid type", 404
+    return render_template(
+        "analytics.html",
+        available_types=list(TEST_MAP.keys()),
+        suites=TEST_MAP.get(type_id, []),
+        type_id=type_id,
+        report=_failure_analytics(type_id) if type_id else None,
+    )
+
+
+@bp.route("/api/analytics/<type_id>")
+def api_analytics(type_id):
+    """Get failure analytics of a type (?suite=01test to limit to one suite)."""
+    from grader import TEST_MAP
+
+    if type_id not in TEST_MAP:
+        return jsonify({"status": "error", "message": "Invalid type"}), 404
+    return jsonify({"status": "success", **_failure_analytics(type_id).to_json()})
+
+
+def _similarity_report(type_id):
+    from similarity import SIMILARITY_THRESHOLD, similar_pairs
+
+    try:
+        threshold = float(request.args.get("threshold", SIMILARITY_THRESHOLD))
+    except ValueError:
+        threshold = SIMILARITY_THRESHOLD
+    key = (type_id, threshold, versions([type_scope(type_id)]))
+    return similarity_cache.get_or_build(
+        key, lambda: similar_pairs(type_id, threshold)
+    )
+
+
+@bp.route("/similarity")
+@bp.route("/similarity/<type_id>")
+def similarity(type_id=None):
+    """Display projects with similar sources for a type."""
+    from grader import TEST_MAP
+
+    if type_id is not None and type_id not in TEST_MAP:
+        return "Invalid type", 404
+    report = _similarity_report(type_id) if type_id else None
+    return render_template(
+        "similarity.html",
+        available_types=list(TEST_MAP.keys()),
+        type_id=type_id,
+        report=report,
     )
 
 
-@app.route("/deadlines")
+@bp.route("/api/similarity/<type_id>")
+def api_similarity(type_id):
+    """Get pairs of projects with similar sources (?threshold=0.6)."""
+    from grader import TEST_MAP
+
+    if type_id not in TEST_MAP:
+        return jsonify({"status": "error", "message": "Invalid type"}), 404
+    return jsonify({"status": "success", **_similarity_report(type_id).to_json()})
+
+
+@bp.route("/deadlines")
 def deadlines():
     """Display deadline management page."""
     from grader import TEST_MAP, SUBJECT_MAP
@@ -437,7 +608,7 @@ def deadlines():
     )
 
 
-@app.route("/api/deadlines", methods=["GET"])
+@bp.route("/api/deadlines", methods=["GET"])
 def api_get_deadlines():
     """Get all deadlines."""
     deadlines = Deadline.query.all()
@@ -452,7 +623,7 @@ def api_get_deadlines():
     )
 
 
-@app.route("/api/deadlines/<type_id>", methods=["PUT"])
+@bp.route("/api/deadlines/<type_id>", methods=["PUT"])
 def api_set_deadline(type_id):
     """Set or update a deadline for a type."""
     data = request.get_json()
@@ -475,6 +646,7 @@ def api_set_deadline(type_id):
             new_deadline = Deadline(type_id=type_id, deadline=deadline_dt)
             db.session.add(new_deadline)
 
+        bump(type_scope(type_id))
         db.session.commit()
         return jsonify(
             {
@@ -487,12 +659,13 @@ def api_set_deadline(type_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@app.route("/api/deadlines/<type_id>", methods=["DELETE"])
+@bp.route("/api/deadlines/<type_id>", methods=["DELETE"])
 def api_delete_deadline(type_id):
     """Delete a deadline for a type."""
     existing = Deadline.query.filter_by(type_id=type_id).first()
     if existing:
         db.session.delete(existing)
+        bump(type_scope(type_id))
         db.session.commit()
         return jsonify(
             {"status": "success", "message": f"Deadline for {type_id} deleted"}
@@ -500,14 +673,14 @@ def api_delete_deadline(type_id):
     return jsonify({"status": "error", "message": "Deadline not found"}), 404
 
 
-@app.route("/students")
+@bp.route("/students")
 def students():
     """Display student list page."""
     all_students = Student.query.order_by(Student.project_id).all()
     return render_template("students.html", students=all_students)
 
 
-@app.route("/api/students", methods=["GET"])
+@bp.route("/api/students", methods=["GET"])
 def api_get_students():
     """Get all students."""
     students = Student.query.order_by(Student.project_id).all()
@@ -523,35 +696,298 @@ def api_get_students():
     )
 
 
-@app.route("/api/students/sync", methods=["POST"])
+def _start_task(kind, fn):
+    """Start fn as a background task in an app context; 202 with the task id."""
+    from tasks import start_task
+
+    task_id, started = start_task(current_app._get_current_object(), kind, fn)
+    return (
+        jsonify(
+            {
+                "status": "accepted",
+                "task_id": task_id,
+                # False if an already running task of this kind was returned
+                "started": started,
+            }
+        ),
+        202,
+    )
+
+
+@bp.route("/api/students/sync", methods=["POST"])
 def api_sync_students():
-    """Sync students from Redmine."""
-    try:
-        synced = sync_students()
-        return jsonify({"status": "success", "synced": len(synced)})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    """Sync students from Redmine projects changed since the last sync.
+
+    Runs as a background task; ?full=true refreshes every project.
+    """
+    from roster import sync_roster
+
+    force = request.args.get("full", "false").lower() == "true"
+
+    return _start_task("roster", lambda: sync_roster(force=force).summary())
 
 
-@app.route("/api/refresh", methods=["POST"])
+@bp.route("/api/refresh", methods=["POST"])
 def api_refresh():
-    """Check Redmine for new/updated submissions and register them."""
+    """Check Redmine for new/updated submissions and register them.
+
+    Runs as a background task; poll /api/tasks/<task_id> for the result.
+    """
+    from grader import check_all_issues
+
+    return _start_task("refresh", lambda: {"registered": len(check_all_issues())})
+
+
+@bp.route("/api/tasks", methods=["GET"])
+def api_tasks():
+    """List recent background tasks."""
+    from tasks import recent_tasks
+
+    return jsonify([task.to_json() for task in recent_tasks()])
+
+
+@bp.route("/api/tasks/<task_id>", methods=["GET"])
+def api_task(task_id):
+    """Get the status, progress and result of a background task."""
+    from tasks import get_task
+
+    task = get_task(task_id)
+    if task is None:
+        return jsonify({"status": "error", "message": "Task not found"}), 404
+    return jsonify(task.to_json())
+
+
+@bp.route("/metrics")
+def metrics():
+    """Prometheus text endpoint with stage timings and queue state."""
+    from burst import current_burst_state
+    from jobqueue import live_workers
+    from metrics import render_prometheus
+
+    capacity = current_burst_state().max_workers
+    capacity += sum(w.capacity for w in live_workers())
+    return Response(
+        render_prometheus(capacity), mimetype="text/plain; version=0.0.4"
+    )
+
+
+@bp.route("/api/burst", methods=["GET"])
+def api_burst():
+    """Get the deadline-burst state and the expected queue drain time."""
+    from burst import current_burst_state, drain_estimate
+
+    state = current_burst_state()
+    return jsonify(
+        {
+            "burst": asdict(state),
+            "estimate": drain_estimate(state.max_workers).to_json(),
+        }
+    )
+
+
+@bp.route("/api/disk", methods=["GET"])
+def api_disk_usage():
+    """Get disk use of archives, scratch workspaces and test temp files."""
+    from workspace import disk_usage
+
+    usage = disk_usage()
+    return jsonify({**asdict(usage), "total_bytes": usage.total_bytes})
+
+
+# Shared secret of remote workers (worker.py); unset disables the worker API
+WORKER_TOKEN = os.getenv("WORKER_TOKEN", "")
+
+
+def worker_auth(view):
+    """Require the worker token as a bearer token."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not WORKER_TOKEN:
+            return (
+                jsonify({"status": "error", "message": "Remote workers are disabled"}),
+                403,
+            )
+        header = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(header, f"Bearer {WORKER_TOKEN}"):
+            return jsonify({"status": "error", "message": "Invalid worker token"}), 401
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+@bp.route("/api/worker/heartbeat", methods=["POST"])
+@worker_auth
+def api_worker_heartbeat():
+    """Record that a remote worker is alive."""
+    from jobqueue import heartbeat
+
+    data = request.get_json() or {}
+    if not data.get("name"):
+        return jsonify({"status": "error", "message": "name is required"}), 400
+    heartbeat(
+        data["name"],
+        host=data.get("host", ""),
+        capacity=int(data.get("capacity", 1)),
+        running=int(data.get("running", 0)),
+        image=data.get("image", ""),
+        started_at=_parse_time(data.get("started_at")),
+    )
+    return jsonify({"status": "success"})
+
+
+@bp.route("/api/worker/claim", methods=["POST"])
+@worker_auth
+def api_worker_claim():
+    """Hand up to `slots` pending submissions to a remote worker."""
+    from grader import TEST_MAP, test_plan
+    from jobqueue import claim_pending
+
+    data = request.get_json() or {}
+    name = data.get("name")
+    if not name:
+        return jsonify({"status": "error", "message": "name is required"}), 400
+    slots = min(max(int(data.get("slots", 1)), 0), 16)
+
+    claimed = claim_pending(name, slots, list(TEST_MAP))
+    jobs = []
+    for sub in claimed:
+        print(f"Claimed by {name}: {sub.project_id}/{sub.type_id}")
+        suites, include_cases = test_plan(sub)
+        jobs.append(
+            {
+                "submission_id": sub.id,
+                "attachment_id": sub.attachment_id,
+                "project_id": sub.project_id,
+                "type_id": sub.type_id,
+                "suites": suites,
+                "include_cases": include_cases,
+            }
+        )
+    return jsonify({"status": "success", "jobs": jobs})
+
+
+def _claimed_submission(submission_id):
+    """The submission if it is still claimed by the requesting worker."""
+    submission = Submission.query.get_or_404(submission_id)
+    name = request.headers.get("X-Worker-Name", "")
+    if submission.status != "running" or submission.claimed_by != name:
+        return None
+    return submission
+
+
+@bp.route("/api/worker/jobs/<int:submission_id>/archive", methods=["GET"])
+@worker_auth
+def api_worker_archive(submission_id):
+    """Download the archive of a claimed submission."""
+    from flask import send_file
+    from grader import _download_attachment, get_submission_path
+
+    submission = _claimed_submission(submission_id)
+    if submission is None:
+        return jsonify({"status": "error", "message": "Not claimed by worker"}), 409
+
+    file_path = get_submission_path(submission.attachment_id, submission.type_id)
+    if not file_path.exists():
+        try:
+            _download_attachment(submission.attachment_id, submission.type_id)
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 502
+    return send_file(str(file_path.resolve()), download_name=file_path.name)
+
+
+@bp.route("/api/worker/jobs/<int:submission_id>/progress", methods=["POST"])
+@worker_auth
+def api_worker_progress(submission_id):
+    """Record which suite a remote worker is running for a claimed submission."""
+    submission = _claimed_submission(submission_id)
+    if submission is None:
+        return jsonify({"status": "error", "message": "Not claimed by worker"}), 409
+
+    data = request.get_json() or {}
+    submission.progress = str(data.get("progress", ""))[:100] or None
+    db.session.commit()
+    return jsonify({"status": "success"})
+
+
+@bp.route("/api/worker/jobs/<int:submission_id>/result", methods=["POST"])
+@worker_auth
+def api_worker_result(submission_id):
+    """Store the Evaluation a remote worker produced for a claimed submission."""
+    from grader import Evaluation, apply_evaluation
+    from metrics import recording
+
+    submission = _claimed_submission(submission_id)
+    if submission is None:
+        # Requeued after a missed heartbeat; another run owns it now
+        return jsonify({"status": "error", "message": "Not claimed by worker"}), 409
+
+    data = request.get_json() or {}
+    # Validated in full before anything is stored
     try:
-        registered = check_all_issues()
-        return jsonify({"status": "success", "registered": len(registered)})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+        evaluation = Evaluation.from_json(data["evaluation"])
+        stages = [
+            (str(name)[:50], _parse_time(started_at), float(duration))
+            for name, (started_at, duration) in (data.get("stages") or {}).items()
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Bad result: {e}"}), 400
+
+    with recording() as recorder:
+        for name, started_at, duration in stages:
+            recorder.record(name, started_at, duration)
+        apply_evaluation(submission, evaluation)
+    recorder.save(submission.id)
+    db.session.commit()
 
+    return jsonify({"status": "success", "submission_status": submission.status})
 
-@app.route("/api/submission/<int:submission_id>/attachment", methods=["GET"])
+
+@bp.route("/api/workers", methods=["GET"])
+def api_workers():
+    """List runners and remote workers with their health and their claims."""
+    from jobqueue import claims_by_worker, is_alive, is_runner
+
+    claims = claims_by_worker()
+
+    def _describe(w):
+        return {
+            "name": w.name,
+            "host": w.host,
+            "image": w.image,
+            "capacity": w.capacity,
+            "running": claims.get(w.name, []),
+            "alive": is_alive(w),
+            "started_at": w.started_at.isoformat() if w.started_at else None,
+            "last_seen_at": w.last_seen_at.isoformat() if w.last_seen_at else None,
+        }
+
+    workers = Worker.query.order_by(Worker.name).all()
+    return jsonify(
+        {
+            "runners": [_describe(w) for w in workers if is_runner(w)],
+            "workers": [_describe(w) for w in workers if not is_runner(w)],
+        }
+    )
+
+
+@bp.route("/api/submission/<int:submission_id>/attachment", methods=["GET"])
 def api_get_submission_attachment(submission_id):
     """Get the attachment file for a submission."""
     submission = Submission.query.get_or_404(submission_id)
-    from grader import get_submission_path
+    from grader import _download_attachment, get_submission_path
 
     file_path = get_submission_path(submission.attachment_id, submission.type_id)
     if not file_path.exists():
-        return jsonify({"status": "error", "message": "Attachment not found"}), 404
+        # The archive may have been evicted by workspace GC
+        try:
+            _download_attachment(submission.attachment_id, submission.type_id)
+        except Exception:
+            return jsonify({"status": "error", "message": "Attachment not found"}), 404
 
     # Send the file as an attachment
     from flask import send_file
@@ -559,21 +995,276 @@ def api_get_submission_attachment(submission_id):
     return send_file(str(file_path), download_name=file_path.name)
 
 
-@app.route("/api/submission/<int:submission_id>/rerun", methods=["POST"])
-def api_rerun_submission(submission_id):
-    """Force re-run evaluation for a submission by setting status to pending."""
+@bp.route("/api/submission/<int:submission_id>/cases")
+def api_submission_cases(submission_id):
+    """Get case outcomes and score of a submission, for one grading table row."""
+    from score import SCORE_FUNCTIONS
+
+    submission = Submission.query.get_or_404(submission_id)
+    test_results = TestCaseResult.query.filter_by(submission_id=submission.id).all()
+
+    score = None
+    score_func = SCORE_FUNCTIONS.get(submission.type_id)
+    if score_func and submission.status == "completed":
+        input_data = {tr.name: tr.outcome == "passed" for tr in test_results}
+        score = score_func(input_data, submission)
+
+    return jsonify(
+        {
+            "status": "success",
+            "submission_id": submission.id,
+            "passed": submission.passed,
+            "total": submission.total,
+            "score": score,
+            "cases": {shorten_testcase(tr.name): tr.outcome for tr in test_results},
+        }
+    )
+
+
+@bp.route("/api/submission/<int:submission_id>/cases/<int:result_id>/diff")
+def api_case_diff(submission_id, result_id):
+    """Get the actual output of a failed case and its diff against the expected output.
+
+    The diff is computed on first view and cached on the TestCaseResult.
+    """
+    result = (
+        TestCaseResult.query.options(
+            undefer(TestCaseResult.output_blob), undefer(TestCaseResult.diff_blob)
+        )
+        .filter_by(id=result_id, submission_id=submission_id)
+        .first_or_404()
+    )
+    if result.output_blob is None:
+        return jsonify({"status": "error", "message": "No output captured"}), 404
+
+    output = decompress_text(result.output_blob)
+    if result.diff_blob is None:
+        diff = diff_case_output(result.submission.testcase_id, result.name, output)
+        result.diff_blob = compress_text(diff, CASE_DIFF_LIMIT)
+        db.session.commit()
+    diff = decompress_text(result.diff_blob)
+
+    return jsonify(
+        {
+            "status": "success",
+            "name": result.name,
+            "output": output,
+            "diff": diff,
+        }
+    )
+
+
+# Largest input accepted by the interactive run endpoint
+RUN_INPUT_LIMIT = 256 * 1024
+
+
+@bp.route("/api/submission/<int:submission_id>/run", methods=["POST"])
+def api_run_submission(submission_id):
+    """Run the submission's built binary on one input and return its output.
+
+    Body: {"input": "<mpl source>"} or {"case": "sample11"} to use a case of
+    the corpus, optionally with "testsuite". The first run of a submission
+    extracts and builds it; later runs reuse the build.
+    """
+    from interactive import run_submission_input
+
+    submission = Submission.query.get_or_404(submission_id)
+    data = request.get_json(silent=True) or {}
+    source = data.get("input")
+    if source is not None and not isinstance(source, str):
+        return jsonify({"status": "error", "message": "input must be a string"}), 400
+    if source is not None and len(source.encode("utf-8")) > RUN_INPUT_LIMIT:
+        return (
+            jsonify({"status": "error", "message": "input is too large"}),
+            413,
+        )
+    try:
+        result = run_submission_input(
+            submission,
+            source,
+            testsuite=data.get("testsuite") or None,
+            case=data.get("case") or None,
+        )
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    return jsonify({"status": "success", **asdict(result)})
+
+
+# Default size of one chunk of a log served to the detail page
+LOG_CHUNK_BYTES = 64 * 1024
+
+
+@bp.route("/api/submission/<int:submission_id>/log")
+def api_submission_log(submission_id):
+    """Get a byte range of a submission's test log.
+
+    Query parameters: kind (suite name, defaults to the suite of the result),
+    offset and limit (in bytes of the stored log).
+    """
     submission = Submission.query.get_or_404(submission_id)
+    kind = request.args.get("kind") or submission.testcase_id
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = request.args.get("limit", LOG_CHUNK_BYTES, type=int)
+    limit = min(max(limit, 1), 1024 * 1024)
+
+    # Paging must not decompress the whole log for every chunk
+    data = log_cache.get_or_build(
+        (submission.id, kind, submission.updated_at),
+        lambda: SubmissionLog.read(submission, kind).encode("utf-8"),
+    )
+    start = min(offset, len(data))
+    end = min(start + limit, len(data))
+    # Do not split a multi-byte character across chunks
+    while end < len(data) and (data[end] & 0xC0) == 0x80:
+        end -= 1
+    if end <= start < len(data):
+        # limit is shorter than the character: return all of it instead
+        end = start + 1
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end += 1
+
+    return jsonify(
+        {
+            "status": "success",
+            "kind": kind,
+            "offset": start,
+            "next_offset": end,
+            "size": len(data),
+            "text": data[start:end].decode("utf-8", errors="replace"),
+        }
+    )
+
+
+@bp.route("/api/reevaluate", methods=["GET"])
+def api_reevaluation_plan():
+    """Preview which results the current test image or corpus makes stale.
+
+    ?type_id= limits the plan to one type; ?include_unknown=true also lists
+    results that were stored without an image or corpus version.
+    """
+    from reeval import plan_reevaluation
+
+    type_id = request.args.get("type_id")
+    include_unknown = request.args.get("include_unknown", "false") == "true"
+    plan = plan_reevaluation([type_id] if type_id else None, include_unknown)
+    db.session.commit()
+    return jsonify({"status": "success", "plan": plan.to_json()})
+
+
+@bp.route("/api/reevaluate", methods=["POST"])
+def api_reevaluate():
+    """Requeue stale results, each only for the cases that changed.
+
+    Takes the same options as the GET preview as a JSON body.
+    """
+    from reeval import plan_reevaluation, requeue_stale
 
-    # Delete existing test case results
-    TestCaseResult.query.filter_by(submission_id=submission_id).delete()
+    data = request.get_json(silent=True) or {}
+    type_id = data.get("type_id")
+    plan = plan_reevaluation(
+        [type_id] if type_id else None, bool(data.get("include_unknown", False))
+    )
+    requeued = requeue_stale(plan)
+    return jsonify(
+        {"status": "success", "requeued": requeued, "plan": plan.to_json()}
+    )
+
+
+@bp.route("/api/rerun", methods=["GET"])
+def api_rerun_status():
+    """Get how many requeued submissions wait to be released or are in flight."""
+    from jobqueue import RERUN_MAX_IN_FLIGHT, requeue_counts
+
+    return jsonify(
+        {"status": "success", "max_in_flight": RERUN_MAX_IN_FLIGHT, **requeue_counts()}
+    )
+
+
+@bp.route("/api/rerun", methods=["POST"])
+def api_bulk_rerun():
+    """Rerun every submission matching the filters in the JSON body.
+
+    Filters: type_id, status (default ["completed", "error"]), project_from
+    and project_to (inclusive, compared as strings), testcase_id and
+    failed_case (a full or shortened case name that failed). dry_run only
+    counts the matches. Completed matches are released to the runner a few
+    at a time and their current results stay visible until replaced;
+    errored ones are queued right away.
+    """
+    from grader import TEST_MAP
+    from jobqueue import mark_requeued
+
+    data = request.get_json(silent=True) or {}
+    statuses = data.get("status") or ["completed", "error"]
+    if isinstance(statuses, str):
+        statuses = [statuses]
+    if set(statuses) - {"completed", "error"}:
+        return (
+            jsonify(
+                {"status": "error", "message": "status must be completed or error"}
+            ),
+            400,
+        )
+
+    query = Submission.query.filter(
+        Submission.status.in_(statuses), Submission.type_id.in_(TEST_MAP)
+    )
+    if data.get("type_id"):
+        query = query.filter(Submission.type_id == data["type_id"])
+    if data.get("project_from"):
+        query = query.filter(Submission.project_id >= str(data["project_from"]))
+    if data.get("project_to"):
+        query = query.filter(Submission.project_id <= str(data["project_to"]))
+    if data.get("testcase_id"):
+        query = query.filter(Submission.testcase_id == data["testcase_id"])
+    failed_case = data.get("failed_case")
+    if failed_case:
+        query = query.filter(Submission.failed.contains(failed_case))
+
+    matched = []
+    for sub in query.order_by(Submission.id):
+        if failed_case and not any(
+            failed_case in (name, shorten_testcase(name))
+            for name in sub.failed.split(",")
+        ):
+            continue
+        matched.append(sub)
+
+    requeued = 0
+    if not data.get("dry_run"):
+        requeued = sum(1 for sub in matched if mark_requeued(sub))
+        db.session.commit()
+        print(f"Bulk rerun: {requeued} of {len(matched)} matches requeued")
+
+    return jsonify(
+        {
+            "status": "success",
+            "matched": len(matched),
+            "requeued": requeued,
+            "submission_ids": [sub.id for sub in matched],
+        }
+    )
+
+
+@bp.route("/api/submission/<int:submission_id>/rerun", methods=["POST"])
+def api_rerun_submission(submission_id):
+    """Force re-run evaluation for a submission by setting status to pending.
+
+    The current results stay visible until the new ones replace them.
+    """
+    submission = Submission.query.get_or_404(submission_id)
 
-    # Reset submission status to pending
+    # Reset submission status to pending, ahead of any bulk rerun
+    if submission.status == "completed" and submission.requeued_at is None:
+        submission.requeued_at = datetime.utcnow()
     submission.status = "pending"
-    submission.passed = 0
-    submission.total = 0
-    submission.failed = ""
-    submission.stdout = ""
-    submission.other_info = ""
+    submission.progress = None
+    submission.pending_cases = None
+    # A worker still holding the old claim gets its result rejected
+    submission.claimed_by = None
     db.session.commit()
 
     return jsonify(
@@ -588,4 +1279,4 @@ def api_rerun_submission(submission_id):
 if __name__ == "__main__":
     debug = os.getenv("FLASK_DEBUG", "false").lower() == "true"
     port = int(os.getenv("FLASK_PORT", "5000"))
-    app.run(debug=debug, port=port, use_reloader=False, host="0.0.0.0")
+    create_app().run(debug=debug, port=port, use_reloader=False, host="0.0.0.0")
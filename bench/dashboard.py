@@ -0,0 +1,293 @@
+"""Load test of the dashboard endpoints against a seeded database.
+
+Seeds students, submissions and test-case rows, serves app.py with a
+threaded WSGI server and drives the endpoints from concurrent clients,
+recording latency and SQL query count per request. Each endpoint is
+measured twice: concurrently with the grading caches warm, and one
+request at a time with them cleared before every request (the path a
+write to the data takes).
+
+Usage:
+    python -m bench.dashboard [--students 100] [--concurrency 8] [--check]
+    python -m bench.dashboard --database-url postgresql://... --reset
+
+--check compares against bench/dashboard_thresholds.json (recorded for the
+default seed parameters) and exits non-zero on a regression;
+--update-thresholds rewrites that file from the current run.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+THRESHOLDS_PATH = Path(__file__).parent / "dashboard_thresholds.json"
+ENDPOINTS = [
+    "/",
+    "/api/submissions",
+    "/grading/program01",
+    "/grading/program01/csv",
+    "/grading/all/csv",
+]
+PROGRAM_TYPES = ["program01", "program02", "program03", "program04"]
+SEED_KEYS = ["students", "submissions", "cases"]
+# Latency compared by --check for the cached (concurrent) and uncached
+# (sequential) results; the few uncached samples make p95 their slowest one
+CHECKED_LATENCY = {"endpoints": "p95_ms", "uncached": "p50_ms"}
+# Allowed slack over the recorded values before --check fails
+LATENCY_SLACK = 1.5
+QUERY_SLACK = 1.1
+
+
+def seed(db, students: int, submissions: int, cases: int, rng: random.Random):
+    """Insert students, submissions per student and type, and case results."""
+    from models import Deadline, Student, Submission, TestCaseResult
+
+    now = datetime.utcnow()
+    db.session.execute(
+        db.insert(Student),
+        [
+            {"project_id": f"{i:03d}", "name": f"Student {i}", "redmine_user_id": i}
+            for i in range(students)
+        ],
+    )
+    db.session.execute(
+        db.insert(Deadline),
+        [{"type_id": t, "deadline": now - timedelta(days=1)} for t in PROGRAM_TYPES],
+    )
+
+    sub_rows = []
+    outcomes: Dict[str, List[tuple]] = {}
+    for i in range(students):
+        for type_id in PROGRAM_TYPES:
+            for n in range(submissions):
+                attachment_id = f"{type_id}-{i}-{n}"
+                cases_ = [
+                    (
+                        f"test_run[sample{c:02d}.mpl]",
+                        "passed" if rng.random() < 0.8 else "failed",
+                    )
+                    for c in range(cases)
+                ]
+                outcomes[attachment_id] = cases_
+                failed = [name for name, outcome in cases_ if outcome == "failed"]
+                submitted_at = now - timedelta(days=2, hours=-n * 6, minutes=i)
+                sub_rows.append(
+                    {
+                        "project_id": f"{i:03d}",
+                        "type_id": type_id,
+                        "testcase_id": f"{type_id[-2:]}test",
+                        "attachment_id": attachment_id,
+                        "status": "completed",
+                        "submitted_at": submitted_at,
+                        "first_submitted_at": now - timedelta(days=2, minutes=i),
+                        "evaluated_at": submitted_at + timedelta(minutes=5),
+                        "passed": cases - len(failed),
+                        "total": cases,
+                        "failed": ",".join(failed),
+                    }
+                )
+    db.session.execute(db.insert(Submission), sub_rows)
+    db.session.commit()
+
+    ids = dict(db.session.query(Submission.attachment_id, Submission.id))
+    case_rows = [
+        {"submission_id": ids[attachment_id], "name": name, "outcome": outcome}
+        for attachment_id, cases_ in outcomes.items()
+        for name, outcome in cases_
+    ]
+    db.session.execute(db.insert(TestCaseResult), case_rows)
+    db.session.commit()
+    return len(ids), len(case_rows)
+
+
+def _install_query_counter(app, db):
+    """Count SQL statements per request and report them in a response header."""
+    from sqlalchemy import event
+
+    local = threading.local()
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        local.count = getattr(local, "count", 0) + 1
+
+    @app.before_request
+    def _reset():
+        local.count = 0
+
+    @app.after_request
+    def _report(response):
+        response.headers["X-Query-Count"] = str(getattr(local, "count", 0))
+        return response
+
+
+def _request(url: str):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=120) as response:
+        response.read()
+        queries = int(response.headers.get("X-Query-Count", "0"))
+    return time.perf_counter() - started, queries
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def _summary(samples: List[tuple]) -> dict:
+    latencies = [s[0] for s in samples]
+    return {
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "queries": max(s[1] for s in samples),
+    }
+
+
+def _clear_caches():
+    from cache import analytics_cache, csv_cache, similarity_cache, table_cache
+
+    for cache in (table_cache, csv_cache, similarity_cache, analytics_cache):
+        cache.clear()
+
+
+def drive(base_url: str, requests: int, concurrency: int) -> Dict[str, dict]:
+    """Latency of each endpoint with the caches warm, from concurrent clients."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for endpoint in ENDPOINTS:
+            # Warm up caches and connection pools
+            _request(base_url + endpoint)
+            samples = list(
+                executor.map(_request, [base_url + endpoint] * requests)
+            )
+            results[endpoint] = _summary(samples)
+    return results
+
+
+def drive_uncached(base_url: str, requests: int) -> Dict[str, dict]:
+    """Latency of each endpoint with the caches cleared before every request."""
+    results = {}
+    for endpoint in ENDPOINTS:
+        samples = []
+        for _ in range(requests):
+            _clear_caches()
+            samples.append(_request(base_url + endpoint))
+        results[endpoint] = _summary(samples)
+    return results
+
+
+def check(results: Dict[str, Dict[str, dict]], seed_params: dict) -> List[str]:
+    thresholds = json.loads(THRESHOLDS_PATH.read_text())
+    if thresholds["seed"] != seed_params:
+        return [f"seed parameters differ from the recorded {thresholds['seed']}"]
+    failures = []
+    for section, latency in CHECKED_LATENCY.items():
+        for endpoint, limit in thresholds.get(section, {}).items():
+            result = results[section].get(endpoint)
+            if result is None:
+                continue
+            if result[latency] > limit[latency] * LATENCY_SLACK:
+                failures.append(
+                    f"{section} {endpoint}: {latency} {result[latency]}ms "
+                    f"> {limit[latency]}ms"
+                )
+            if result["queries"] > limit["queries"] * QUERY_SLACK:
+                failures.append(
+                    f"{section} {endpoint}: {result['queries']} queries "
+                    f"> {limit['queries']}"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard")
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--submissions", type=int, default=2)
+    parser.add_argument("--cases", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--uncached-requests", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--database-url")
+    parser.add_argument(
+        "--reset", action="store_true", help="Drop all tables of --database-url"
+    )
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--update-thresholds", action="store_true")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        work_dir = Path(tempfile.mkdtemp(prefix="lpp-dashboard-"))
+        os.environ["DATABASE_URL"] = f"sqlite:///{work_dir / 'bench.db'}"
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    from app import create_app
+    from migrations import schema_migrations, upgrade
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            schema_migrations.drop(db.engine, checkfirst=True)
+        upgrade(db.engine)
+        started = time.perf_counter()
+        n_subs, n_cases = seed(
+            db, args.students, args.submissions, args.cases, random.Random(0)
+        )
+        print(
+            f"Seeded {n_subs} submissions and {n_cases} case rows "
+            f"in {time.perf_counter() - started:.1f}s",
+            file=sys.stderr,
+        )
+
+    _install_query_counter(app, db)
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(
+        "127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        results = {
+            "endpoints": drive(base_url, args.requests, args.concurrency),
+            "uncached": drive_uncached(base_url, args.uncached_requests),
+        }
+    finally:
+        server.shutdown()
+
+    seed_params = {k: getattr(args, k) for k in SEED_KEYS}
+    report = {"seed": seed_params, **results}
+    print(json.dumps(report, indent=2))
+
+    if args.update_thresholds:
+        THRESHOLDS_PATH.write_text(json.dumps(report, indent=2) + "\n")
+    if args.check:
+        failures = check(results, seed_params)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Local stand-in for the lpp_test_eval container.
+
+Imitates the two commands the pipeline runs in the container: extract.bash
+(unzips submission.bin in the workspace) and lpptest (sleeps for a build
+and per-case time, then writes a pytest-json-report file and .out files
+for failed cases). Outcomes are deterministic per source tree.
+"""
+
+import hashlib
+import json
+import time
+import zipfile
+from pathlib import Path
+from typing import List, Tuple
+
+from eval import TEST_TEMP_DIR
+
+REPORT_ARG = "--json-report-file=/lpp/data/"
+
+
+class FakeExecutor:
+    def __init__(
+        self,
+        n_cases: int = 30,
+        build_seconds: float = 0.2,
+        case_seconds: float = 0.01,
+        pass_rate: float = 0.8,
+    ):
+        self.n_cases = n_cases
+        self.build_seconds = build_seconds
+        self.case_seconds = case_seconds
+        self.pass_rate = pass_rate
+
+    def __call__(
+        self, target_path: Path, args: List[str], timeout
+    ) -> Tuple[int, str, str]:
+        if args[:2] == ["bash", "/extract.bash"]:
+            return self._extract(target_path)
+        if args and args[0] == "lpptest":
+            return self._lpptest(target_path, args)
+        return 127, "", f"fake executor: unsupported command {args}"
+
+    def _extract(self, target_path: Path) -> Tuple[int, str, str]:
+        with zipfile.ZipFile(target_path / "submission.bin") as zf:
+            zf.extractall(target_path)
+        return 0, "Extracting submission.bin\n", ""
+
+    def _source_hash(self, target_path: Path) -> int:
+        h = hashlib.sha256()
+        for path in sorted(target_path.rglob("*.c")):
+            h.update(path.read_bytes())
+        return int.from_bytes(h.digest()[:8], "big")
+
+    def _lpptest(self, target_path: Path, args: List[str]) -> Tuple[int, str, str]:
+        testsuite = args[1]
+        report_name = next(a for a in args if a.startswith(REPORT_ARG))[
+            len(REPORT_ARG) :
+        ]
+        seed = self._source_hash(target_path)
+
+        time.sleep(self.build_seconds + self.case_seconds * self.n_cases)
+
+        result_dir = target_path / "test_results"
+        result_dir.mkdir(exist_ok=True)
+        tests = [
+            {
+                "nodeid": f"test_{testsuite}.py::test_compile",
+                "outcome": "passed",
+                "call": {"duration": self.build_seconds},
+            }
+        ]
+        for i in range(self.n_cases):
+            case = f"sample{i:02d}.mpl"
+            passed = ((seed >> (i % 64)) & 0xFF) / 255 < self.pass_rate
+            tests.append(
+                {
+                    "nodeid": f"test_{testsuite}.py::test_run[{case}]",
+                    "outcome": "passed" if passed else "failed",
+                    "call": {"duration": self.case_seconds},
+                }
+            )
+            if not passed:
+                (result_dir / f"{case}.out").write_text(f"unexpected output {i}\n")
+
+        TEST_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        (TEST_TEMP_DIR / report_name).write_text(json.dumps({"tests": tests}))
+        passed_count = sum(t["outcome"] == "passed" for t in tests)
+        return 0, f"{passed_count} passed, {len(tests) - passed_count} failed\n", ""
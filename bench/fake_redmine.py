@@ -0,0 +1,245 @@
+"""Local HTTP stand-in for the parts of the Redmine API that grader.py uses.
+
+Serves issues (with journals), attachments and their downloads, projects
+and memberships from in-memory state. Upload times are recorded so that
+benchmarks can measure upload-to-result latency.
+"""
+
+import io
+import json
+import threading
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+PROJECT_NAME = "言語処理プログラミング ({})"
+PROGRAM_SUBJECT = "{:02d}.06 プログラムの提出"
+STUDENT_ROLE_NAME = "学生"
+
+
+def _ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def make_submission_zip(project_id: str, revision: int = 0) -> bytes:
+    """A small C project with a Makefile, as students submit it."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr(f"{project_id}/Makefile", "all:\n\tcc -o tc *.c\n")
+        zf.writestr(
+            f"{project_id}/main.c",
+            f"/* {project_id} r{revision} */\nint main(void) {{ return 0; }}\n",
+        )
+    return buf.getvalue()
+
+
+@dataclass
+class FakeIssue:
+    id: int
+    project_id: int
+    subject: str
+    updated_on: datetime
+    journals: List[dict] = field(default_factory=list)
+
+
+@dataclass
+class FakeAttachment:
+    id: int
+    filename: str
+    content: bytes
+    uploaded_at: datetime
+
+
+class FakeRedmine:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.lock = threading.Lock()
+        self.projects: Dict[int, str] = {}
+        self.project_updated_on: Dict[int, datetime] = {}
+        self.issues: Dict[int, FakeIssue] = {}
+        self.attachments: Dict[int, FakeAttachment] = {}
+        self.request_count = 0
+        self._next_id = 1
+        # Redmine timestamps have second resolution; keep them strictly
+        # increasing so rapid resubmissions still change updated_on
+        self._clock = datetime.utcnow().replace(microsecond=0)
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def add_project(self, project_id: str) -> int:
+        with self.lock:
+            redmine_id = self._new_id()
+            self.projects[redmine_id] = PROJECT_NAME.format(project_id)
+            self.project_updated_on[redmine_id] = datetime.utcnow()
+            return redmine_id
+
+    def upload(
+        self, redmine_project_id: int, program: int, content: bytes
+    ) -> FakeAttachment:
+        """Attach content to the program issue of a project (created on demand)."""
+        now = datetime.utcnow()
+        subject = PROGRAM_SUBJECT.format(program)
+        with self.lock:
+            self._clock = max(
+                self._clock + timedelta(seconds=1), now.replace(microsecond=0)
+            )
+            stamp = self._clock
+            issue = next(
+                (
+                    i
+                    for i in self.issues.values()
+                    if i.project_id == redmine_project_id and i.subject == subject
+                ),
+                None,
+            )
+            if issue is None:
+                issue = FakeIssue(self._new_id(), redmine_project_id, subject, stamp)
+                self.issues[issue.id] = issue
+            attachment = FakeAttachment(
+                self._new_id(), f"submission{len(issue.journals)}.zip", content, now
+            )
+            self.attachments[attachment.id] = attachment
+            issue.updated_on = stamp
+            issue.journals.append(
+                {
+                    "id": self._new_id(),
+                    "created_on": _ts(stamp),
+                    "details": [
+                        {
+                            "property": "attachment",
+                            "name": str(attachment.id),
+                            "old_value": None,
+                            "new_value": attachment.filename,
+                        }
+                    ],
+                }
+            )
+            return attachment
+
+    def upload_time(self, attachment_id: str) -> Optional[datetime]:
+        attachment = self.attachments.get(int(attachment_id))
+        return attachment.uploaded_at if attachment else None
+
+    # JSON views
+
+    def _project_ref(self, redmine_id: int) -> dict:
+        return {"id": redmine_id, "name": self.projects[redmine_id]}
+
+    def _issue_json(self, issue: FakeIssue, journals=False) -> dict:
+        data = {
+            "id": issue.id,
+            "project": self._project_ref(issue.project_id),
+            "tracker": {"id": 15, "name": "提出"},
+            "status": {"id": 1, "name": "New"},
+            "subject": issue.subject,
+            "created_on": _ts(issue.updated_on),
+            "updated_on": _ts(issue.updated_on),
+        }
+        if journals:
+            data["journals"] = issue.journals
+        return data
+
+    def _route(self, path: str, query: Dict[str, List[str]]):
+        def page(items: list, key: str):
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["25"])[0])
+            return {
+                key: items[offset : offset + limit],
+                "total_count": len(items),
+                "offset": offset,
+                "limit": limit,
+            }
+
+        parts = path.strip("/").split("/")
+        with self.lock:
+            if path == "/issues.json":
+                issues = [self._issue_json(i) for i in self.issues.values()]
+                return page(issues, "issues")
+            if parts[0] == "issues" and len(parts) == 2:
+                issue = self.issues.get(int(parts[1].removesuffix(".json")))
+                return issue and {"issue": self._issue_json(issue, journals=True)}
+            if parts[0] == "attachments" and len(parts) == 2:
+                attachment = self.attachments.get(int(parts[1].removesuffix(".json")))
+                return attachment and {
+                    "attachment": {
+                        "id": attachment.id,
+                        "filename": attachment.filename,
+                        "filesize": len(attachment.content),
+                        "content_url": f"{self.url}/attachments/download/"
+                        f"{attachment.id}/{attachment.filename}",
+                    }
+                }
+            if parts[:2] == ["attachments", "download"]:
+                attachment = self.attachments.get(int(parts[2]))
+                return attachment and attachment.content
+            if path == "/projects.json":
+                projects = [
+                    {
+                        **self._project_ref(pid),
+                        "identifier": f"p{pid}",
+                        "updated_on": _ts(self.project_updated_on[pid]),
+                    }
+                    for pid in self.projects
+                ]
+                return page(projects, "projects")
+            if parts[0] == "projects" and parts[-1] == "memberships.json":
+                pid = int(parts[1])
+                if pid not in self.projects:
+                    return None
+                memberships = [
+                    {
+                        "id": pid * 10,
+                        "project": self._project_ref(pid),
+                        "user": {"id": pid * 100, "name": f"Student {pid}"},
+                        "roles": [{"id": 5, "name": STUDENT_ROLE_NAME}],
+                    }
+                ]
+                return page(memberships, "memberships")
+        return None
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                fake.request_count += 1
+                body = fake._route(url.path, parse_qs(url.query))
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if isinstance(body, bytes):
+                    content_type = "application/octet-stream"
+                else:
+                    body = json.dumps(body).encode("utf-8")
+                    content_type = "application/json"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,140 @@
+"""Import-time budget of the entry points.
+
+Each entry point is imported in a fresh interpreter, as a gunicorn worker
+restart or a CLI invocation does; the best of --repeat runs is reported
+with the slowest modules from python -X importtime. Creating the
+dashboard app is included, since gunicorn runs create_app() per worker.
+
+Usage:
+    python -m bench.imports [--repeat 5] [--check] [--update-thresholds]
+
+--check compares against bench/import_thresholds.json and exits non-zero
+on a regression, or if an entry point imports one of its DEFERRED
+modules; --update-thresholds rewrites that file from the current run.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+THRESHOLDS_PATH = Path(__file__).parent / "import_thresholds.json"
+REPO_DIR = Path(__file__).resolve().parent.parent
+ENTRY_POINTS = {
+    "app": "import app; app.create_app()",
+    "runner": "import runner",
+    "worker": "import worker",
+    "migrations": "import migrations",
+    "report": "import report",
+    "similarity": "import similarity",
+    "difftest": "import difftest",
+    "workspace": "import workspace",
+}
+# Modules an entry point must only import on first use
+_DASHBOARD_DEFERRED = ["redminelib", "grader", "score", "interactive", "lpp_collector"]
+DEFERRED = {
+    "app": _DASHBOARD_DEFERRED,
+    "runner": ["redminelib"],
+    "worker": ["redminelib"],
+    "migrations": ["grader", "redminelib"],
+}
+# Allowed slack over the recorded times before --check fails
+TIME_SLACK = 1.5
+SLOWEST = 5
+
+
+def _run(statement: str, env: Dict[str, str], importtime: bool = False):
+    code = (
+        "import time; _started = time.perf_counter(); "
+        f"{statement}; print(time.perf_counter() - _started)"
+    )
+    args = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    result = subprocess.run(
+        args + ["-c", code],
+        cwd=REPO_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def _parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative microseconds per module of a -X importtime run."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def measure(repeat: int) -> Dict[str, dict]:
+    # Nothing is connected at import, but keep any stray access off real data
+    work_dir = tempfile.mkdtemp(prefix="lpp-imports-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{work_dir}/imports.db")
+    results = {}
+    for name, statement in ENTRY_POINTS.items():
+        best = min(_run(statement, env)[0] for _ in range(repeat))
+        _, stderr = _run(statement, env, importtime=True)
+        modules = _parse_importtime(stderr)
+        # Only this repo's and third-party top-level packages
+        top = {m: us for m, us in modules.items() if "." not in m}
+        slowest = sorted(top.items(), key=lambda kv: -kv[1])[:SLOWEST]
+        results[name] = {
+            "ms": round(best * 1000, 1),
+            "modules": len(modules),
+            "slowest": {m: round(us / 1000, 1) for m, us in slowest},
+            "deferred_imported": [
+                m for m in DEFERRED.get(name, []) if m in modules
+            ],
+        }
+    return results
+
+
+def check(results: Dict[str, dict]) -> List[str]:
+    thresholds = json.loads(THRESHOLDS_PATH.read_text())
+    failures = []
+    for name, result in results.items():
+        if result["deferred_imported"]:
+            failures.append(
+                f"{name}: imports {', '.join(result['deferred_imported'])} at startup"
+            )
+        limit = thresholds["entry_points"].get(name)
+        if limit is not None and result["ms"] > limit["ms"] * TIME_SLACK:
+            failures.append(f"{name}: {result['ms']}ms > {limit['ms']}ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure entry point import times")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--update-thresholds", action="store_true")
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    print(json.dumps({"entry_points": results}, indent=2))
+
+    if args.update_thresholds:
+        budgets = {name: {"ms": r["ms"]} for name, r in results.items()}
+        THRESHOLDS_PATH.write_text(
+            json.dumps({"entry_points": budgets}, indent=2) + "\n"
+        )
+    if args.check:
+        failures = check(results)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""End-to-end benchmark of the ingest and test pipeline.
+
+Runs runner.py's check/drain cycle against a fake Redmine (bench.fake_redmine)
+and a local executor imitating lpptest (bench.fake_executor), in a scratch
+directory with its own SQLite database.
+
+Usage:
+    python -m bench.pipeline deadline_burst --students 100
+    python -m bench.pipeline resubmission_storm --students 50 --revisions 3
+    python -m bench.pipeline full_rerun --students 100 --workers 4
+
+Prints throughput, p50/p95 latency from upload (or requeue) to result,
+per-stage means and the database size as JSON.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+SCENARIOS = ["deadline_burst", "resubmission_storm", "full_rerun"]
+
+
+def _configure_env(work_dir: Path, redmine_url: str):
+    """Point every module-level setting at the scratch directory.
+
+    Must run before grader, eval or runner are imported.
+    """
+    os.environ.update(
+        {
+            "REDMINE_URL": redmine_url,
+            "REDMINE_API_KEY": "bench",
+            "DATABASE_URL": f"sqlite:///{work_dir / 'bench.db'}",
+            "OUTPUT_DIR": str(work_dir / "output"),
+            "WORKSPACE_DIR": str(work_dir / "workspaces"),
+            "TEST_TEMP_DIR": str(work_dir / "tmp"),
+            "LIMITED_CASES": "",
+        }
+    )
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Pipeline:
+    def __init__(self, fake, workers: int, quiet: bool):
+        from runner import create_app
+
+        from migrations import upgrade
+        from models import db
+
+        self.fake = fake
+        self.workers = workers
+        self.quiet = quiet
+        self.app = create_app()
+        with self.app.app_context():
+            upgrade(db.engine)
+
+    def cycle(self):
+        """One runner iteration: ingest from Redmine, then drain the queue."""
+        from runner import check_redmine, run_pending_tests
+
+        out = io.StringIO() if self.quiet else sys.stdout
+        with contextlib.redirect_stdout(out):
+            check_redmine(self.app)
+            run_pending_tests(self.app, self.workers)
+
+    def drain(self):
+        from models import Submission
+
+        while True:
+            self.cycle()
+            with self.app.app_context():
+                remaining = Submission.query.filter(
+                    Submission.status.in_(["pending", "running"])
+                ).count()
+            if remaining == 0:
+                return
+
+    def upload_all(self, projects: Dict[str, int], revision: int):
+        from bench.fake_redmine import make_submission_zip
+
+        for project_id, redmine_id in projects.items():
+            self.fake.upload(redmine_id, 1, make_submission_zip(project_id, revision))
+
+
+def run_scenario(name: str, args) -> dict:
+    from bench.fake_redmine import FakeRedmine
+
+    fake = FakeRedmine().start()
+    work_dir = Path(tempfile.mkdtemp(prefix="lpp-bench-"))
+    _configure_env(work_dir, fake.url)
+
+    import eval
+    from bench.fake_executor import FakeExecutor
+    from models import StageTiming, Submission, db
+
+    eval.set_executor(
+        FakeExecutor(
+            n_cases=args.cases,
+            build_seconds=args.build_seconds,
+            case_seconds=args.case_seconds,
+        )
+    )
+    pipeline = Pipeline(fake, args.workers, not args.verbose)
+    projects = {f"{i:03d}": fake.add_project(f"{i:03d}") for i in range(args.students)}
+
+    requeued_at = None
+    if name == "deadline_burst":
+        pipeline.upload_all(projects, 0)
+        started = time.monotonic()
+        pipeline.drain()
+    elif name == "resubmission_storm":
+        started = time.monotonic()
+        for revision in range(args.revisions):
+            pipeline.upload_all(projects, revision)
+            pipeline.cycle()
+        pipeline.drain()
+    elif name == "full_rerun":
+        pipeline.upload_all(projects, 0)
+        pipeline.drain()
+        with pipeline.app.app_context():
+            requeued_at = datetime.utcnow()
+            Submission.query.update({"status": "pending"})
+            db.session.commit()
+        started = time.monotonic()
+        pipeline.drain()
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+    wall = time.monotonic() - started
+
+    with pipeline.app.app_context():
+        completed = Submission.query.filter_by(status="completed").all()
+        latencies = []
+        for sub in completed:
+            origin = requeued_at or fake.upload_time(sub.attachment_id)
+            if origin is not None and sub.evaluated_at is not None:
+                latencies.append((sub.evaluated_at - origin).total_seconds())
+        stages = {
+            stage: round(mean, 4)
+            for stage, mean in db.session.query(
+                StageTiming.stage, db.func.avg(StageTiming.duration)
+            ).group_by(StageTiming.stage)
+        }
+        errors = Submission.query.filter_by(status="error").count()
+        db.session.remove()
+
+    fake.stop()
+    return {
+        "scenario": name,
+        "students": args.students,
+        "workers": args.workers,
+        "completed": len(completed),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(completed) / wall, 3) if wall else None,
+        "latency_p50_seconds": round(_percentile(latencies, 0.5), 3),
+        "latency_p95_seconds": round(_percentile(latencies, 0.95), 3),
+        "stage_mean_seconds": stages,
+        "db_size_bytes": (work_dir / "bench.db").stat().st_size,
+        "redmine_requests": fake.request_count,
+        "work_dir": str(work_dir),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grading pipeline")
+    parser.add_argument("scenario", choices=SCENARIOS)
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--revisions", type=int, default=3)
+    parser.add_argument("--cases", type=int, default=30)
+    parser.add_argument("--build-seconds", type=float, default=0.2)
+    parser.add_argument("--case-seconds", type=float, default=0.01)
+    parser.add_argument("--output", type=Path, help="Also write the result here")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    result = run_scenario(args.scenario, args)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Cache of build products keyed by source tree and test image.
+
+lpptest builds the student's project with make before every suite. After
+a successful build, the files the build created or changed (the binaries
+of BUILD_OUT_MAP and any object files) are stored under
+BUILD_CACHE_DIR/<key>/, where key hashes the extracted source tree and the
+test image. A later run of the same tree (another suite in a new
+workspace, a rerun, an identical resubmission) copies them back with an
+mtime newer than every source, so make finds nothing to rebuild.
+
+BUILD_CACHE_MB bounds the cache; collect_garbage() evicts the least
+recently used entries. BUILD_CACHE=false disables it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BUILD_CACHE_ENABLED = os.getenv("BUILD_CACHE", "true").lower() == "true"
+BUILD_CACHE_DIR = Path(os.getenv("BUILD_CACHE_DIR", "./build_cache"))
+BUILD_CACHE_MAX_BYTES = int(os.getenv("BUILD_CACHE_MB", "1024")) * 1024 * 1024
+
+# Written by the tests, never build products
+IGNORED_DIRS = {"test_results"}
+# The downloaded archive (workspace.ARCHIVE_PREFIX), not part of the tree
+ARCHIVE_PREFIX = "submission."
+META_FILE = "meta.json"
+FILES_DIR = "files"
+
+# (size, mtime_ns) per file, relative to the source root
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+@dataclass
+class BuildEntry:
+    key: str
+    # Paths relative to the source root
+    products: List[str] = field(default_factory=list)
+    # Outcome of test_compile in the run that built them
+    compile_outcome: str = "passed"
+
+
+def _files(root: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_DIRS)
+        for name in sorted(filenames):
+            if name.startswith(ARCHIVE_PREFIX) and Path(dirpath) == root:
+                continue
+            path = Path(dirpath) / name
+            if path.is_file() and not path.is_symlink():
+                yield path.relative_to(root).as_posix(), path
+
+
+def snapshot(root: Path) -> Snapshot:
+    result = {}
+    for rel, path in _files(root):
+        stat = path.stat()
+        result[rel] = (stat.st_size, stat.st_mtime_ns)
+    return result
+
+
+def build_key(root: Path, image: str) -> str:
+    """sha256 of the image and every file (path and content) under root."""
+    h = hashlib.sha256(image.encode("utf-8") + b"\0")
+    for rel, path in _files(root):
+        h.update(rel.encode("utf-8") + b"\0")
+        h.update(hashlib.sha256(path.read_bytes()).digest())
+    return h.hexdigest()
+
+
+def restore(root: Path, key: str) -> Optional[BuildEntry]:
+    """Copy cached products of key into root. None on a miss."""
+    if not BUILD_CACHE_ENABLED:
+        return None
+    entry_dir = BUILD_CACHE_DIR / key
+    try:
+        meta = json.loads((entry_dir / META_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+    entry = BuildEntry(key, meta["products"], meta.get("compile_outcome", "passed"))
+
+    # Newer than every source, even ones with a future mtime from the archive
+    newest = max((mtime for _, mtime in snapshot(root).values()), default=0)
+    stamp = max(time.time_ns(), newest + 1_000_000_000)
+    for rel in entry.products:
+        dest = root / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(entry_dir / FILES_DIR / rel, dest)
+        os.utime(dest, ns=(stamp, stamp))
+    # Recently used entries survive pruning
+    os.utime(entry_dir / META_FILE)
+    return entry
+
+
+def store(
+    root: Path, key: str, before: Snapshot, compile_outcome: str
+) -> Optional[BuildEntry]:
+    """Cache the files a build created or changed since the before snapshot."""
+    if not BUILD_CACHE_ENABLED or (BUILD_CACHE_DIR / key).exists():
+        return None
+    after = snapshot(root)
+    products = sorted(rel for rel, stat in after.items() if before.get(rel) != stat)
+    if not products:
+        return None
+
+    staging = None
+    try:
+        BUILD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".tmp-", dir=BUILD_CACHE_DIR))
+        for rel in products:
+            dest = staging / FILES_DIR / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(root / rel, dest)
+        entry = BuildEntry(key, products, compile_outcome)
+        (staging / META_FILE).write_text(
+            json.dumps({"products": products, "compile_outcome": compile_outcome})
+        )
+        # Another run may have stored the same key meanwhile
+        os.rename(staging, BUILD_CACHE_DIR / key)
+        return entry
+    except OSError as e:
+        print(f"Failed to cache build {key[:12]}: {e}")
+        return None
+    finally:
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def cache_usage() -> Tuple[int, int]:
+    """Bytes and number of cached builds."""
+    if not BUILD_CACHE_DIR.exists():
+        return 0, 0
+    total = count = 0
+    for entry_dir in BUILD_CACHE_DIR.iterdir():
+        count += 1
+        for _, path in _files(entry_dir):
+            total += path.stat().st_size
+    return total, count
+
+
+def prune(max_bytes: int = BUILD_CACHE_MAX_BYTES) -> Tuple[int, int]:
+    """Evict least recently used builds until the cache fits max_bytes.
+
+    Returns the number of removed entries and the bytes freed.
+    """
+    if not BUILD_CACHE_DIR.exists():
+        return 0, 0
+    entries = []
+    for entry_dir in BUILD_CACHE_DIR.iterdir():
+        meta = entry_dir / META_FILE
+        last_used = meta.stat().st_mtime if meta.exists() else 0
+        size = sum(path.stat().st_size for _, path in _files(entry_dir))
+        entries.append((last_used, entry_dir, size))
+    entries.sort(key=lambda e: e[0])
+
+    total = sum(size for _, _, size in entries)
+    removed = freed = 0
+    for _, entry_dir, size in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        removed += 1
+        freed += size
+    return removed, freed
@@ -0,0 +1,160 @@
+"""Deadline-burst mode of the runner.
+
+From DEADLINE_WINDOW_MINUTES before until DEADLINE_GRACE_MINUTES after any
+Deadline, the runner polls Redmine every RUNNER_FAST_INTERVAL_SECONDS and
+tests up to BURST_MAX_PARALLEL_TESTS submissions at once. Outside those
+windows it falls back to RUNNER_INTERVAL_SECONDS and MAX_PARALLEL_TESTS.
+
+drain_estimate() predicts when the current queue will be empty and whether
+that is before the results of a deadline are due (RESULTS_DUE_HOURS after
+it).
+"""
+
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Dict, List, Optional
+
+INTERVAL = int(os.getenv("RUNNER_INTERVAL_SECONDS", "300"))
+FAST_INTERVAL = int(os.getenv("RUNNER_FAST_INTERVAL_SECONDS", "30"))
+DEADLINE_WINDOW_MINUTES = int(os.getenv("DEADLINE_WINDOW_MINUTES", "60"))
+DEADLINE_GRACE_MINUTES = int(os.getenv("DEADLINE_GRACE_MINUTES", "15"))
+MAX_PARALLEL_TESTS = int(os.getenv("MAX_PARALLEL_TESTS", "2"))
+BURST_MAX_PARALLEL_TESTS = int(
+    os.getenv("BURST_MAX_PARALLEL_TESTS", str(MAX_PARALLEL_TESTS * 2))
+)
+RESULTS_DUE_HOURS = float(os.getenv("RESULTS_DUE_HOURS", "24"))
+# Used for the estimate until some submissions have been tested
+DEFAULT_TEST_SECONDS = 60.0
+# Recent test runs the per-submission duration is taken from
+DURATION_SAMPLE = 50
+
+
+@dataclass
+class BurstState:
+    active: bool
+    ingest_interval: int
+    max_workers: int
+    # type_ids whose deadline window contains now
+    type_ids: List[str] = field(default_factory=list)
+
+
+def burst_state(now: datetime, deadlines: Dict[str, datetime]) -> BurstState:
+    """Polling interval and local test concurrency for the given time."""
+    before = timedelta(minutes=DEADLINE_WINDOW_MINUTES)
+    after = timedelta(minutes=DEADLINE_GRACE_MINUTES)
+    type_ids = sorted(
+        type_id
+        for type_id, deadline in deadlines.items()
+        if deadline - before <= now <= deadline + after
+    )
+    if type_ids:
+        return BurstState(True, FAST_INTERVAL, BURST_MAX_PARALLEL_TESTS, type_ids)
+    return BurstState(False, INTERVAL, MAX_PARALLEL_TESTS)
+
+
+def current_burst_state() -> BurstState:
+    from models import Deadline
+
+    return burst_state(datetime.utcnow(), Deadline.get_all_deadlines())
+
+
+@dataclass
+class DrainEstimate:
+    pending: int
+    running: int
+    # Parallel tests of the runner and live remote workers
+    capacity: int
+    seconds_per_submission: float
+    eta_seconds: float
+    drained_at: datetime
+    # Per deadline with queued submissions: when results are due and
+    # whether the queue drains before then
+    deadlines: List[dict] = field(default_factory=list)
+
+    def to_json(self) -> dict:
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "capacity": self.capacity,
+            "seconds_per_submission": round(self.seconds_per_submission, 1),
+            "eta_seconds": round(self.eta_seconds),
+            "drained_at": self.drained_at.isoformat(),
+            "deadlines": self.deadlines,
+        }
+
+
+def recent_test_seconds() -> Optional[float]:
+    """Median claim-to-result time of recently tested submissions."""
+    from models import Submission, db
+
+    rows = (
+        db.session.query(Submission.claimed_at, Submission.evaluated_at)
+        .filter(
+            Submission.status == "completed",
+            Submission.claimed_at.isnot(None),
+            Submission.evaluated_at.isnot(None),
+        )
+        .order_by(Submission.evaluated_at.desc())
+        .limit(DURATION_SAMPLE)
+        .all()
+    )
+    durations = [
+        (evaluated_at - claimed_at).total_seconds()
+        for claimed_at, evaluated_at in rows
+        if evaluated_at >= claimed_at
+    ]
+    return median(durations) if durations else None
+
+
+def drain_estimate(local_capacity: int) -> DrainEstimate:
+    """Expected time until every pending and running submission has a result."""
+    from sqlalchemy import func
+
+    from grader import TEST_MAP
+    from jobqueue import live_workers
+    from models import Deadline, Submission, db
+
+    counts = dict(
+        db.session.query(Submission.status, func.count(Submission.id))
+        .filter(
+            Submission.status.in_(["pending", "running"]),
+            Submission.type_id.in_(TEST_MAP),
+        )
+        .group_by(Submission.status)
+    )
+    pending = counts.get("pending", 0)
+    running = counts.get("running", 0)
+    capacity = local_capacity + sum(w.capacity for w in live_workers())
+    per_submission = recent_test_seconds() or DEFAULT_TEST_SECONDS
+
+    # Running ones are on average half done
+    work = (pending + running / 2) * per_submission
+    eta = work / capacity if capacity > 0 else float("inf")
+    now = datetime.utcnow()
+    drained_at = now + timedelta(seconds=min(eta, 365 * 86400))
+
+    queued_types = {
+        type_id
+        for (type_id,) in db.session.query(Submission.type_id)
+        .filter(Submission.status.in_(["pending", "running"]))
+        .distinct()
+    }
+    deadlines = []
+    for type_id, deadline in sorted(Deadline.get_all_deadlines().items()):
+        if type_id not in queued_types:
+            continue
+        due_at = deadline + timedelta(hours=RESULTS_DUE_HOURS)
+        deadlines.append(
+            {
+                "type_id": type_id,
+                "deadline": deadline.isoformat(),
+                "results_due_at": due_at.isoformat(),
+                "on_track": drained_at <= due_at,
+            }
+        )
+
+    return DrainEstimate(
+        pending, running, capacity, per_submission, eta, drained_at, deadlines
+    )
@@ -0,0 +1,100 @@
+"""Caches of the rendered grading tables, CSVs, class-wide reports and logs.
+
+Entries are keyed by the versions of the data they were built from. The
+write paths bump a version in the same transaction as their change
+(bump()), so every process sees a changed key on its next read and stale
+entries simply age out of the LRU:
+
+    type:<type_id>   results of a type (completion, rerun, source index)
+                     or its deadline
+    students         the student roster
+
+GRADING_CACHE_SIZE bounds the entries of each cache. Submission logs are
+keyed by the submission's updated_at instead, which every evaluation
+changes along with the logs.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+GRADING_CACHE_SIZE = int(os.getenv("GRADING_CACHE_SIZE", "32"))
+# Logs are up to SUBMISSION_LOG_LIMIT each once decompressed
+LOG_CACHE_SIZE = int(os.getenv("LOG_CACHE_SIZE", "8"))
+STUDENTS_SCOPE = "students"
+
+
+def type_scope(type_id: str) -> str:
+    return f"type:{type_id}"
+
+
+def bump(*scopes: str):
+    """Invalidate cached views of scopes. Committed with the caller's session."""
+    from models import CacheVersion, db
+
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    for scope in scopes:
+        stmt = insert(CacheVersion).values(scope=scope, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CacheVersion.scope],
+            set_={"version": CacheVersion.version + 1},
+        )
+        db.session.execute(stmt)
+
+
+def versions(scopes: Optional[List[str]] = None) -> Tuple:
+    """Current (scope, version) pairs of scopes, or of every scope if None."""
+    from models import CacheVersion, db
+
+    query = db.session.query(CacheVersion.scope, CacheVersion.version)
+    if scopes is not None:
+        query = query.filter(CacheVersion.scope.in_(scopes))
+    return tuple(sorted(query.all()))
+
+
+class LRUCache:
+    """Thread-safe LRU of at most maxsize entries, with hit and miss counts."""
+
+    def __init__(self, name: str, maxsize: int = GRADING_CACHE_SIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        # Built outside the lock; two concurrent misses both build
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+table_cache = LRUCache("grading_table")
+csv_cache = LRUCache("grading_csv")
+similarity_cache = LRUCache("similarity")
+analytics_cache = LRUCache("analytics")
+# Decompressed logs paged through by /api/submission/<id>/log
+log_cache = LRUCache("submission_log", LOG_CACHE_SIZE)
@@ -0,0 +1,71 @@
+"""Database URL and connection pool settings.
+
+DATABASE_URL defaults to a local SQLite file. PostgreSQL URLs
+(postgres://, postgresql://) use psycopg 3, installed with the "postgres"
+extra. Each PostgreSQL process keeps its own pool: the dashboard needs
+one connection per request thread, the runner one per test thread plus
+its scheduler jobs, so the app factories pass the pool size they need.
+python -m bench.postgres checks concurrent migrations and claims against
+a PostgreSQL server (docker/compose.postgres.yml starts one).
+"""
+
+import os
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///submissions.db")
+# Connections kept open per process; DB_POOL_SIZE overrides the callers' sizes
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0"))
+# Extra connections opened under load and closed when returned
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+# Connections older than this are replaced, ahead of server-side timeouts
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+WEB_POOL_SIZE = 10
+# One-off commands (report.py, migrations.py, ...) run few threads
+CLI_POOL_SIZE = 4
+
+
+def database_url(url: str = DATABASE_URL) -> str:
+    """url with PostgreSQL URLs pointed at the psycopg 3 driver."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix) :]
+    return url
+
+
+def engine_options(url: str, pool_size: int) -> dict:
+    if not url.startswith("postgresql"):
+        # SQLite waits for a writer instead of failing with "database is locked"
+        return {"connect_args": {"timeout": 30}} if url.startswith("sqlite") else {}
+    return {
+        "pool_size": DB_POOL_SIZE or pool_size,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        # Connections dropped by a database restart are replaced, not handed out
+        "pool_pre_ping": True,
+    }
+
+
+def configure_app(app, pool_size: int):
+    """Point app at DATABASE_URL and bind models.db to it."""
+    from models import db
+
+    url = database_url()
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(url, pool_size)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+
+
+def create_db_app(pool_size: int = CLI_POOL_SIZE):
+    """Create a minimal Flask app for DB access, for the runner and CLIs."""
+    from flask import Flask
+
+    from models import db
+    from tracing import instrument_sqlalchemy
+
+    app = Flask(__name__)
+    configure_app(app, pool_size)
+    with app.app_context():
+        instrument_sqlalchemy(db.engine)
+    return app
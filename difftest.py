@@ -0,0 +1,363 @@
+"""Differential testing of student builds against a reference build.
+
+Runs a reference implementation and the latest submission of every
+student on the same inputs: the corpus cases of a suite, extra .mpl files
+and mutants of the corpus. Each build runs all inputs in one batched
+container session (eval.run_batch), several builds at a time in worker
+processes. Per input, the outputs are bucketed across the class. Inputs
+ranked by how well they separate failing from passing submissions (or
+catch passing submissions that disagree with the reference) are
+candidates for the corpus.
+
+Usage:
+    python difftest.py 02test --reference DIR [--inputs DIR] [--mutants N]
+                       [--workers N] [--timeout S] [--out DIR]
+
+Per-build results are printed and appended to <out>/builds.jsonl as they
+finish; the buckets and ranking go to <out>/summary.json.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DIFFTEST_DIR = Path(os.getenv("DIFFTEST_DIR", "./difftest"))
+DIFFTEST_TIMEOUT = int(os.getenv("DIFFTEST_TIMEOUT_SECONDS", "5"))
+# Output kept per bucket to show what the bucket looks like
+PREVIEW_CHARS = 2000
+REFERENCE = "reference"
+
+
+def _mutants(inputs: Dict[str, str], count: int, seed: int = 0) -> Dict[str, str]:
+    """Variants of corpus inputs with one line dropped, duplicated or swapped.
+
+    Mostly broken programs, which exercise error handling the corpus only
+    samples.
+    """
+    rng = random.Random(seed)
+    names = sorted(inputs)
+    mutants = {}
+    for index in range(count if names else 0):
+        basename = rng.choice(names)
+        lines = inputs[basename].splitlines(keepends=True)
+        if len(lines) < 2:
+            continue
+        i = rng.randrange(len(lines) - 1)
+        kind = rng.choice(["drop", "dup", "swap"])
+        if kind == "drop":
+            del lines[i]
+        elif kind == "dup":
+            lines.insert(i, lines[i])
+        else:
+            lines[i], lines[i + 1] = lines[i + 1], lines[i]
+        mutants[f"m{index:04d}-{kind}{i}-{basename}"] = "".join(lines)
+    return mutants
+
+
+def collect_inputs(
+    testsuite: str, extra_dir: Optional[Path] = None, mutants: int = 0
+) -> Dict[str, str]:
+    """Source of every input, keyed by basename."""
+    from testcases import corpus_inputs
+
+    inputs = {name: path.read_text() for name, path in corpus_inputs(testsuite).items()}
+    corpus = dict(inputs)
+    if extra_dir is not None:
+        for path in sorted(extra_dir.glob("*.mpl")):
+            inputs.setdefault(path.stem, path.read_text())
+    inputs.update(_mutants(corpus, mutants))
+    return inputs
+
+
+def _signature(output) -> str:
+    """What two runs must share to count as the same behaviour.
+
+    Exit codes are ignored (the tasks only prescribe output), but whether
+    anything went to stderr is kept: it is how errors are reported.
+    """
+    data = [output.stdout, sorted(output.files.items()), bool(output.stderr.strip())]
+    if output.timed_out:
+        data = ["timeout"]
+    return hashlib.sha256(json.dumps(data).encode("utf-8")).hexdigest()[:16]
+
+
+def _preview(output) -> str:
+    if output.timed_out:
+        return "(timed out)"
+    text = output.stdout
+    for name, content in sorted(output.files.items()):
+        text += f"\n--- {name} ---\n{content}"
+    if output.stderr.strip():
+        text += f"\n--- stderr ---\n{output.stderr}"
+    return text[:PREVIEW_CHARS]
+
+
+def _run_job(job: dict) -> dict:
+    """Build one submission (or the reference) and run every input.
+
+    Runs in a worker process; the job and its result are plain dicts.
+    """
+    from eval import run_batch, stop_warm_containers
+    from interactive import prepare_archive_workspace, prepare_source_workspace
+
+    result = {"key": job["key"], "project_id": job["project_id"], "error": None}
+    started = time.monotonic()
+    try:
+        if job["source_dir"] is not None:
+            root = prepare_source_workspace(Path(job["source_dir"]))
+        else:
+            root = prepare_archive_workspace(job["key"], Path(job["archive"]))
+        outputs = run_batch(
+            root, job["testsuite"], Path(job["input_dir"]), job["timeout"]
+        )
+        result["signatures"] = {name: _signature(o) for name, o in outputs.items()}
+        result["previews"] = {name: _preview(o) for name, o in outputs.items()}
+    except Exception as e:
+        result["error"] = (str(e) or type(e).__name__)[:PREVIEW_CHARS]
+    finally:
+        # Worker processes exit without atexit handlers
+        stop_warm_containers()
+    result["seconds"] = round(time.monotonic() - started, 2)
+    return result
+
+
+@dataclass
+class InputReport:
+    name: str
+    # Builds whose output differs from the reference, per group
+    differ_failing: List[str] = field(default_factory=list)
+    differ_passing: List[str] = field(default_factory=list)
+    separation: float = 0.0
+    # signature -> {"projects": [...], "reference": bool, "preview": str}
+    buckets: Dict[str, dict] = field(default_factory=dict)
+
+
+def summarize(
+    results: List[dict], passing: Dict[str, bool], corpus: List[str]
+) -> dict:
+    """Bucket outputs per input and rank inputs by how they separate builds.
+
+    passing: whether each project's current result passes every case.
+    separation is the share of failing builds an input catches minus the
+    share of passing builds it flags; inputs that flag passing builds show
+    behaviour the corpus does not check.
+    """
+    reference = next(r for r in results if r["key"] == REFERENCE)
+    students = [r for r in results if r["key"] != REFERENCE and not r["error"]]
+    n_failing = sum(1 for r in students if not passing.get(r["project_id"]))
+    n_passing = len(students) - n_failing
+
+    reports = []
+    for name, expected in sorted(reference["signatures"].items()):
+        report = InputReport(name)
+        report.buckets[expected] = {
+            "projects": [],
+            "reference": True,
+            "preview": reference["previews"][name],
+        }
+        for r in students:
+            signature = r["signatures"].get(name)
+            bucket = report.buckets.setdefault(
+                signature,
+                {"projects": [], "reference": False, "preview": r["previews"][name]},
+            )
+            bucket["projects"].append(r["project_id"])
+            if signature == expected:
+                continue
+            if passing.get(r["project_id"]):
+                report.differ_passing.append(r["project_id"])
+            else:
+                report.differ_failing.append(r["project_id"])
+        report.separation = round(
+            len(report.differ_failing) / max(n_failing, 1)
+            - len(report.differ_passing) / max(n_passing, 1),
+            4,
+        )
+        reports.append(report)
+
+    def rank(report: InputReport):
+        return (report.separation, len(report.differ_passing))
+
+    reports.sort(key=rank, reverse=True)
+    return {
+        "builds": len(students),
+        "failing": n_failing,
+        "passing": n_passing,
+        "build_errors": {
+            r["project_id"]: r["error"] for r in results if r["error"]
+        },
+        "new_inputs": [r.name for r in reports if r.name not in corpus],
+        "inputs": [asdict(r) for r in reports],
+    }
+
+
+def _latest_submissions(testsuite: str):
+    from grader import TEST_MAP
+    from models import Submission
+
+    type_ids = [t for t, suites in TEST_MAP.items() if testsuite in suites]
+    submissions = (
+        Submission.query.filter(
+            Submission.type_id.in_(type_ids), Submission.status == "completed"
+        )
+        .order_by(Submission.project_id, Submission.submitted_at.desc())
+        .all()
+    )
+    latest = {}
+    for sub in submissions:
+        latest.setdefault(sub.project_id, sub)
+    return list(latest.values())
+
+
+def run_difftest(
+    testsuite: str,
+    reference_dir: Path,
+    extra_dir: Optional[Path] = None,
+    mutants: int = 0,
+    workers: Optional[int] = None,
+    timeout: int = DIFFTEST_TIMEOUT,
+    out_dir: Path = DIFFTEST_DIR,
+) -> dict:
+    """Run the reference and every student's latest build on the same inputs."""
+    from interactive import submission_archive
+    from testcases import corpus_inputs
+
+    inputs = collect_inputs(testsuite, extra_dir, mutants)
+    # Copied into each build's run workspace by run_batch()
+    run_dir = Path(tempfile.mkdtemp(prefix="lpp-difftest-"))
+    input_dir = run_dir / "inputs"
+    input_dir.mkdir()
+    for name, source in inputs.items():
+        (input_dir / f"{name}.mpl").write_text(source)
+
+    common = {
+        "testsuite": testsuite,
+        "input_dir": str(input_dir),
+        "timeout": timeout,
+    }
+    jobs = [
+        {
+            **common,
+            "key": REFERENCE,
+            "project_id": REFERENCE,
+            "source_dir": str(reference_dir.resolve()),
+            "archive": None,
+        }
+    ]
+    passing = {}
+    for sub in _latest_submissions(testsuite):
+        try:
+            archive = submission_archive(sub)
+        except Exception as e:
+            print(f"{sub.project_id}: archive unavailable: {e}")
+            continue
+        passing[sub.project_id] = bool(sub.total) and sub.passed == sub.total
+        jobs.append(
+            {
+                **common,
+                "key": sub.attachment_id,
+                "project_id": sub.project_id,
+                "source_dir": None,
+                "archive": str(archive),
+            }
+        )
+    print(f"Running {len(inputs)} inputs on {len(jobs) - 1} builds and the reference")
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor, open(
+            out_dir / "builds.jsonl", "w"
+        ) as log:
+            # Without reference outputs there is nothing to compare against
+            reference = executor.submit(_run_job, jobs[0]).result()
+            if reference["error"]:
+                raise Exception(f"Reference build failed: {reference['error']}")
+            expected = reference["signatures"]
+            results.append(reference)
+            log.write(json.dumps(reference) + "\n")
+
+            futures = [executor.submit(_run_job, job) for job in jobs[1:]]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results.append(result)
+                log.write(json.dumps(result) + "\n")
+                log.flush()
+                if result["error"]:
+                    status = f"error: {result['error'].splitlines()[0][:80]}"
+                else:
+                    differ = sum(
+                        1 for n, s in result["signatures"].items() if expected[n] != s
+                    )
+                    status = f"{differ}/{len(expected)} inputs differ"
+                print(
+                    f"[{done}/{len(futures)}] {result['project_id']}: {status} "
+                    f"({result['seconds']}s)"
+                )
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    summary = summarize(results, passing, list(corpus_inputs(testsuite)))
+    (out_dir / "summary.json").write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare student builds against a reference build"
+    )
+    parser.add_argument("testsuite", help="e.g. 02test")
+    parser.add_argument(
+        "--reference", type=Path, required=True, help="Source tree with a Makefile"
+    )
+    parser.add_argument("--inputs", type=Path, help="Directory of extra .mpl inputs")
+    parser.add_argument(
+        "--mutants", type=int, default=0, help="Number of corpus mutants to add"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=int, default=DIFFTEST_TIMEOUT)
+    parser.add_argument("--out", type=Path, default=DIFFTEST_DIR)
+    args = parser.parse_args()
+
+    from database import create_db_app
+
+    app = create_db_app()
+    started = time.monotonic()
+    with app.app_context():
+        summary = run_difftest(
+            args.testsuite,
+            args.reference,
+            args.inputs,
+            args.mutants,
+            args.workers,
+            args.timeout,
+            args.out,
+        )
+    print(
+        f"{summary['builds']} builds ({summary['failing']} failing) compared in "
+        f"{time.monotonic() - started:.1f}s; top separating inputs:"
+    )
+    for report in summary["inputs"][:10]:
+        print(
+            f"  {report['name']}: separation {report['separation']:+.2f}, "
+            f"{len(report['differ_failing'])} failing and "
+            f"{len(report['differ_passing'])} passing builds differ, "
+            f"{len(report['buckets'])} buckets"
+        )
+
+
+if __name__ == "__main__":
+    main()
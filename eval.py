@@ -1,10 +1,20 @@
-from dataclasses import dataclass
+import atexit
+from dataclasses import dataclass, field
 from datetime import datetime
 import json
 import os
 from pathlib import Path
+import shutil
+import socket
 import subprocess
-from typing import List, Tuple
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import record_stage, stage
+from storage import CASE_OUTPUT_LIMIT, read_capped
+from tracing import span
 
 TEST_DOCKER_IMAGE = os.getenv(
     "TEST_DOCKER_IMAGE", "ghcr.io/f0reacharr/lpp_test_eval:latest"
@@ -13,16 +23,17 @@ TEST_TEMP_DIR = Path(os.getenv("TEST_TEMP_DIR", "./tmp")).resolve()
 BUILD_OUT_MAP = {"01": "tc", "02": "pp", "03": "cr", "04": "mpplc"}
 
 
-def _call_container(target_path: Path, args: List[str], timeout=60):
-    TEST_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+def _docker_args(target_path: Path, args: List[str], data_dir=True) -> List[str]:
+    """docker create arguments running args in target_path at /workspaces.
 
-    run_args = [
-        "run",
-        "--rm",
-        "-v",
-        f"{target_path}:/workspaces",
-        "-v",
-        f"{TEST_TEMP_DIR}:/lpp/data",
+    data_dir also mounts TEST_TEMP_DIR at /lpp/data, for lpptest reports.
+    The container is not --rm: _create_and_start() reads its logs first.
+    """
+    mounts = ["-v", f"{target_path}:/workspaces"]
+    if data_dir:
+        mounts += ["-v", f"{TEST_TEMP_DIR}:/lpp/data"]
+    return [
+        *mounts,
         "-w",
         "/workspaces",
         "--env",
@@ -36,13 +47,115 @@ def _call_container(target_path: Path, args: List[str], timeout=60):
         *args,
     ]
 
-    result = subprocess.run(["docker", *run_args], timeout=timeout, capture_output=True)
 
-    return (
-        result.returncode,
-        result.stdout.decode("utf-8"),
-        result.stderr.decode("utf-8"),
-    )
+def _run_in_docker(
+    target_path: Path, args: List[str], timeout
+) -> Tuple[int, str, str]:
+    return _create_and_start(_docker_args(target_path, args), timeout)
+
+
+# Runs a command against a workspace: (target_path, args, timeout) ->
+# (returncode, stdout, stderr). Replaced by set_executor() in benchmarks.
+Executor = Callable[[Path, List[str], int], Tuple[int, str, str]]
+_executor: Executor = _run_in_docker
+
+
+def set_executor(executor: Optional[Executor]):
+    """Replace the container executor (None restores docker)."""
+    global _executor
+    _executor = executor or _run_in_docker
+
+
+# Seconds an image digest is reused before asking docker again
+IMAGE_DIGEST_TTL_SECONDS = 300
+_image_digest: Tuple[float, Optional[str]] = (0.0, None)
+
+
+def image_digest() -> Optional[str]:
+    """Content id of the local TEST_DOCKER_IMAGE (None if docker cannot tell)."""
+    global _image_digest
+    checked_at, digest = _image_digest
+    if time.monotonic() - checked_at < IMAGE_DIGEST_TTL_SECONDS:
+        return digest
+    try:
+        inspected = subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{.Id}}", TEST_DOCKER_IMAGE],
+            timeout=10,
+            capture_output=True,
+        )
+        digest = inspected.stdout.decode("utf-8").strip() or None
+        if inspected.returncode != 0:
+            digest = None
+    except (OSError, subprocess.TimeoutExpired):
+        digest = None
+    _image_digest = (time.monotonic(), digest)
+    return digest
+
+
+def _call_container(target_path: Path, args: List[str], timeout=60):
+    TEST_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+
+    with span(
+        "container", kind="CLIENT", image=TEST_DOCKER_IMAGE, command=args[0]
+    ) as sp:
+        returncode, stdout, stderr = _executor(target_path, args, timeout)
+        if sp is not None:
+            sp.set_attribute("returncode", returncode)
+    return returncode, stdout, stderr
+
+
+def _create_and_start(run_args: List[str], timeout) -> Tuple[int, str, str]:
+    # create + start (detached) + wait instead of run, so that container
+    # startup is timed on its own
+    with stage("container_start"):
+        created = subprocess.run(
+            ["docker", "create", *run_args], timeout=timeout, capture_output=True
+        )
+        if created.returncode != 0:
+            return (
+                created.returncode,
+                created.stdout.decode("utf-8"),
+                created.stderr.decode("utf-8"),
+            )
+        container_id = created.stdout.decode("utf-8").strip()
+        try:
+            started = subprocess.run(
+                ["docker", "start", container_id], timeout=timeout, capture_output=True
+            )
+        except subprocess.TimeoutExpired:
+            _remove_container(container_id)
+            raise
+
+    try:
+        if started.returncode != 0:
+            return (
+                started.returncode,
+                started.stdout.decode("utf-8"),
+                started.stderr.decode("utf-8"),
+            )
+        waited = subprocess.run(
+            ["docker", "wait", container_id], timeout=timeout, capture_output=True
+        )
+        if waited.returncode != 0:
+            return (
+                waited.returncode,
+                waited.stdout.decode("utf-8"),
+                waited.stderr.decode("utf-8"),
+            )
+        logs = subprocess.run(
+            ["docker", "logs", container_id], timeout=60, capture_output=True
+        )
+        return (
+            int(waited.stdout.decode("utf-8").strip()),
+            logs.stdout.decode("utf-8"),
+            logs.stderr.decode("utf-8"),
+        )
+    finally:
+        _remove_container(container_id)
+
+
+def _remove_container(container_id: str):
+    subprocess.run(["docker", "rm", "--force", container_id], capture_output=True)
 
 
 def run_extract(target_path: Path) -> Path:
@@ -51,7 +164,8 @@ def run_extract(target_path: Path) -> Path:
         "/extract.bash",
     ]
 
-    _call_container(target_path, cmd, timeout=10)
+    with stage("extract"), span("extract"):
+        _call_container(target_path, cmd, timeout=10)
 
     # Determine root directory of source code
     ## Step1. Find Makefile in root or sub directory
@@ -77,6 +191,8 @@ def run_extract(target_path: Path) -> Path:
 class TestResult:
     summary: List[Tuple[str, str]]
     stdout: str
+    # Size-capped actual outputs of the failed cases, keyed by case name
+    outputs: Dict[str, bytes] = field(default_factory=dict)
 
 
 def run_tests(
@@ -97,7 +213,8 @@ def run_tests(
         cmd.append("-k")
         cmd.append(" or ".join(include_cases))
 
-    (returncode, stdout, stderr) = _call_container(target_path, cmd, timeout)
+    with span("suite", suite=testsuite):
+        (returncode, stdout, stderr) = _call_container(target_path, cmd, timeout)
 
     if returncode != 0:
         raise Exception(f"Test failed: {returncode} {stdout} {stderr}")
@@ -108,18 +225,340 @@ def run_tests(
     result_json = json.loads(result_text)
 
     result_summary = []
+    build_duration = 0.0
     for test in result_json["tests"]:
         nodeid = test["nodeid"]
         case_name = nodeid.split("::")[-1]
         result_summary.append((case_name, test["outcome"]))
+        if case_name.startswith("test_compile"):
+            build_duration += sum(
+                test.get(phase, {}).get("duration", 0.0)
+                for phase in ("setup", "call", "teardown")
+            )
+    record_stage("build", build_duration)
 
-    return TestResult(result_summary, stdout)
+    failed_cases = [name for name, outcome in result_summary if outcome == "failed"]
+    outputs = read_case_outputs(target_path / "test_results", failed_cases)
 
+    return TestResult(result_summary, stdout, outputs)
 
-def run_raw_output(target_path: Path, testsuite: str, input: str, timeout=30) -> str:
-    TEST_TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
-    cmd = [
-        f"/workspaces/{BUILD_OUT_MAP[testsuite]}",
-        testsuite,
-    ]
+def case_output_path(result_dir: Path, case_name: str) -> Path:
+    """Path of the captured output for a case such as test_run[sample11.mpl]."""
+    if "[" in case_name and case_name.endswith("]"):
+        param = case_name[case_name.index("[") + 1 : -1]
+        return result_dir / f"{param}.out"
+    return result_dir / f"{case_name}.out"
+
+
+def read_case_outputs(
+    result_dir: Path, case_names: List[str], limit=CASE_OUTPUT_LIMIT
+) -> Dict[str, bytes]:
+    """Read the (size-capped) outputs of the given cases from test_results."""
+    outputs = {}
+    for case_name in case_names:
+        path = case_output_path(result_dir, case_name)
+        if path.is_file():
+            outputs[case_name], _ = read_capped(path, limit)
+    return outputs
+
+
+# Interactive runs execute in a long-lived container per run workspace
+# (RUN_WORKSPACE_DIR/<name>); docker exec into it takes tens of
+# milliseconds where starting a container takes about a second
+RUN_WORKSPACE_DIR = Path(os.getenv("RUN_WORKSPACE_DIR", "./run_workspaces")).resolve()
+WARM_CONTAINER_IDLE_SECONDS = int(os.getenv("WARM_CONTAINER_IDLE_SECONDS", "600"))
+# Warm containers kept per process; the least recently used one is stopped
+WARM_CONTAINER_MAX = int(os.getenv("WARM_CONTAINER_MAX", "4"))
+# Output files larger than this kill the program (ulimit -f)
+RAW_FILE_LIMIT = 16 * 1024 * 1024
+# Writable directory of a run workspace, mounted at /runs
+RUNS_DIR = ".runs"
+
+
+class WarmContainer:
+    """A sleeping container that commands are docker exec'd into.
+
+    It sees only its own workspace, read-only at /workspaces, and the
+    workspace's RUNS_DIR, writable at /runs, so a program can neither read
+    nor overwrite another submission's files. Started on first use and
+    stopped after WARM_CONTAINER_IDLE_SECONDS without one, when evicted
+    or when the process exits.
+    """
+
+    def __init__(self, workspace: Path, name: str, image: str = TEST_DOCKER_IMAGE):
+        self.workspace = workspace
+        self.runs = workspace / RUNS_DIR
+        self.image = image
+        self.name = name
+        self._lock = threading.Lock()
+        self._container_id: Optional[str] = None
+        self.last_used = 0.0
+
+    def _start(self) -> str:
+        self.runs.mkdir(exist_ok=True)
+        started = subprocess.run(
+            [
+                "docker",
+                "run",
+                "--detach",
+                "--rm",
+                "--name",
+                self.name,
+                "-v",
+                f"{self.workspace}:/workspaces:ro",
+                "-v",
+                f"{self.runs}:/runs",
+                "-w",
+                "/runs",
+                "--memory=512m",
+                "--cpus=0.5",
+                "--network=none",
+                "--entrypoint",
+                "sleep",
+                self.image,
+                "infinity",
+            ],
+            timeout=60,
+            capture_output=True,
+        )
+        if started.returncode != 0:
+            raise Exception(
+                f"Failed to start container: {started.stderr.decode('utf-8')}"
+            )
+        return started.stdout.decode("utf-8").strip()
+
+    def _stop(self):
+        subprocess.run(
+            ["docker", "rm", "--force", self._container_id], capture_output=True
+        )
+        self._container_id = None
+
+    def stop(self):
+        with self._lock:
+            if self._container_id:
+                self._stop()
+
+    def stop_if_idle(self, idle_seconds: float):
+        with self._lock:
+            idle = time.monotonic() - self.last_used
+            if self._container_id and idle > idle_seconds:
+                self._stop()
+
+    def exec(
+        self, workdir: str, args: List[str], timeout, retry=True
+    ) -> Tuple[int, str, str]:
+        """Run args in workdir (a container path) as the current user."""
+        with self._lock:
+            if self._container_id is None:
+                self._container_id = self._start()
+            container_id = self._container_id
+            self.last_used = time.monotonic()
+        cmd = [
+            "docker",
+            "exec",
+            "--user",
+            f"{os.getuid()}:{os.getgid()}",
+            "-w",
+            workdir,
+            container_id,
+            *args,
+        ]
+        with span("container", kind="CLIENT", image=self.image, command=args[0]):
+            result = subprocess.run(cmd, timeout=timeout, capture_output=True)
+        # Removed behind our back (docker restart, manual cleanup): start anew
+        if retry and result.returncode != 0 and b"No such container" in result.stderr:
+            with self._lock:
+                if self._container_id == container_id:
+                    self._container_id = None
+            return self.exec(workdir, args, timeout, retry=False)
+        return (
+            result.returncode,
+            result.stdout.decode("utf-8", errors="replace"),
+            result.stderr.decode("utf-8", errors="replace"),
+        )
+
+
+_warm: Dict[Path, WarmContainer] = {}
+_warm_lock = threading.Lock()
+_warm_started = 0
+_reaper: Optional[threading.Thread] = None
+
+
+def _reap_warm_containers():
+    while True:
+        time.sleep(min(30, WARM_CONTAINER_IDLE_SECONDS))
+        with _warm_lock:
+            containers = list(_warm.values())
+        for container in containers:
+            container.stop_if_idle(WARM_CONTAINER_IDLE_SECONDS)
+
+
+def warm_container(workspace: Path) -> WarmContainer:
+    """The warm container of a run workspace (RUN_WORKSPACE_DIR/<name>)."""
+    global _reaper, _warm_started
+    evicted = None
+    with _warm_lock:
+        container = _warm.get(workspace)
+        if container is None:
+            if len(_warm) >= WARM_CONTAINER_MAX:
+                lru = min(_warm, key=lambda w: _warm[w].last_used)
+                evicted = _warm.pop(lru)
+            _warm_started += 1
+            name = f"lpp-warm-{socket.gethostname()}-{os.getpid()}-{_warm_started}"
+            container = _warm[workspace] = WarmContainer(workspace, name)
+            # Marks it used, so it is not evicted before its first exec
+            container.last_used = time.monotonic()
+        if _reaper is None:
+            atexit.register(stop_warm_containers)
+            _reaper = threading.Thread(
+                target=_reap_warm_containers, name="warm-containers", daemon=True
+            )
+            _reaper.start()
+    if evicted is not None:
+        evicted.stop()
+    return container
+
+
+def stop_warm_containers():
+    with _warm_lock:
+        containers = list(_warm.values())
+        _warm.clear()
+    for container in containers:
+        container.stop()
+
+
+def _run_workspace(target_path: Path) -> Tuple[Path, str]:
+    """The run workspace of target_path, and target_path inside /workspaces."""
+    rel = target_path.resolve().relative_to(RUN_WORKSPACE_DIR)
+    workspace = RUN_WORKSPACE_DIR / rel.parts[0]
+    return workspace, Path("/workspaces", *rel.parts[1:]).as_posix()
+
+
+def run_build(target_path: Path, timeout=120) -> Tuple[int, str, str]:
+    """Run make in a source root, in a throwaway container that mounts only it."""
+    run_args = _docker_args(target_path, ["make"], data_dir=False)
+    with span("container", kind="CLIENT", image=TEST_DOCKER_IMAGE, command="make"):
+        return _create_and_start(run_args, timeout)
+
+
+@dataclass
+class RawOutput:
+    returncode: int
+    stdout: str
+    stderr: str
+    # Other files the program wrote next to its input (e.g. .csl of mpplc)
+    files: Dict[str, str] = field(default_factory=dict)
+    timed_out: bool = False
+    duration: float = 0.0
+
+
+def _read_output(path: Path) -> str:
+    if not path.is_file():
+        return ""
+    data, _ = read_capped(path, CASE_OUTPUT_LIMIT)
+    return data.decode("utf-8", errors="replace")
+
+
+def _collect_run(run_dir: Path, filename: str, returncode: int) -> RawOutput:
+    files = {
+        path.name: _read_output(path)
+        for path in sorted(run_dir.iterdir())
+        if path.name not in (filename, ".stdout", ".stderr", ".rc")
+    }
+    return RawOutput(
+        returncode,
+        _read_output(run_dir / ".stdout"),
+        _read_output(run_dir / ".stderr"),
+        files,
+        timed_out=returncode == 124,
+    )
+
+
+def run_raw_output(
+    target_path: Path,
+    testsuite: str,
+    input: str,
+    timeout=30,
+    filename: str = "input.mpl",
+) -> RawOutput:
+    """Run the built binary of testsuite in target_path on one input.
+
+    target_path is a built source root in a run workspace. The input is
+    written to a fresh directory under the workspace's RUNS_DIR that is
+    also the working directory, and stdout, stderr and written files are
+    returned size-capped.
+    """
+    workspace, root = _run_workspace(target_path)
+    container = warm_container(workspace)
+    binary = f"{root}/{BUILD_OUT_MAP[testsuite[:2]]}"
+    container.runs.mkdir(exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(prefix="raw-", dir=container.runs))
+    try:
+        (run_dir / filename).write_text(input)
+        # Redirected to files so runaway output is bounded by ulimit, not memory
+        script = (
+            f"ulimit -f {RAW_FILE_LIMIT // 512}; "
+            f'timeout -k 1 {timeout} "$1" "$2" > .stdout 2> .stderr'
+        )
+        started = time.monotonic()
+        returncode, _, exec_stderr = container.exec(
+            f"/runs/{run_dir.name}",
+            ["sh", "-c", script, "raw", binary, filename],
+            timeout + 10,
+        )
+        output = _collect_run(run_dir, filename, returncode)
+        output.stderr += exec_stderr
+        output.duration = time.monotonic() - started
+        return output
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def run_batch(
+    target_path: Path, testsuite: str, input_dir: Path, timeout=10
+) -> Dict[str, RawOutput]:
+    """Run the built binary of testsuite on every .mpl in input_dir.
+
+    Like run_raw_output(), but all inputs run in one docker exec, each in
+    a working directory of its own. Returns the outputs keyed by input
+    basename.
+    """
+    workspace, root = _run_workspace(target_path)
+    container = warm_container(workspace)
+    binary = f"{root}/{BUILD_OUT_MAP[testsuite[:2]]}"
+    inputs = sorted(input_dir.glob("*.mpl"))
+    container.runs.mkdir(exist_ok=True)
+    out_dir = Path(tempfile.mkdtemp(prefix="batch-", dir=container.runs))
+    for path in inputs:
+        (out_dir / path.stem).mkdir()
+        shutil.copyfile(path, out_dir / path.stem / path.name)
+    script = (
+        f"ulimit -f {RAW_FILE_LIMIT // 512}; "
+        'for f in */*.mpl; do d="${f%/*}"; n="${f##*/}"; '
+        f'(cd "$d" && timeout -k 1 {timeout} "$1" "$n" > .stdout 2> .stderr; '
+        "echo $? > .rc); done"
+    )
+    try:
+        returncode, stdout, stderr = container.exec(
+            f"/runs/{out_dir.name}",
+            ["sh", "-c", script, "batch", binary],
+            (timeout + 2) * len(inputs) + 30,
+        )
+        if returncode != 0:
+            raise Exception(f"Batch run failed: {returncode} {stdout} {stderr}")
+        return _collect_batch(out_dir, inputs)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def _collect_batch(out_dir: Path, inputs: List[Path]) -> Dict[str, RawOutput]:
+    outputs = {}
+    for path in inputs:
+        run_dir = out_dir / path.stem
+        try:
+            case_returncode = int((run_dir / ".rc").read_text().strip())
+        except (OSError, ValueError):
+            case_returncode = -1
+        outputs[path.stem] = _collect_run(run_dir, path.name, case_returncode)
+    return outputs
@@ -0,0 +1,239 @@
+"""Change feed of submissions for server-sent events (/api/events).
+
+One poller thread per web process reads submissions whose updated_at
+moved since its last poll and hands them to every connected client, so
+the database sees one small query per SSE_POLL_SECONDS no matter how many
+pages are open. The poller stops when the last client leaves. Works
+across processes: the runner and remote workers only write rows.
+
+Each open stream occupies a request thread for its lifetime, so serve the
+dashboard with threads (the Flask server does; gunicorn needs
+--worker-class gthread --threads N, or gevent) rather than sync workers.
+Streams end after SSE_STREAM_SECONDS; the browser reconnects after
+SSE_RETRY_MS with the id of the last event it saw, and the changes made
+meanwhile are replayed. Keepalives and the end of a stream carry the
+feed's position as an id too, so an idle client resumes from there.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "1"))
+# Comment lines sent while idle so proxies keep the connection open
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# Browsers reconnect after this many milliseconds when the stream drops
+SSE_RETRY_MS = 5000
+# Streams are closed after this long, freeing their request thread
+SSE_STREAM_SECONDS = float(os.getenv("SSE_STREAM_SECONDS", "300"))
+# Most changes replayed to a reconnecting client
+REPLAY_LIMIT = 1000
+# Clients that fall this far behind are dropped
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Rows are re-read this far back in case commits land out of timestamp order
+OVERLAP = timedelta(seconds=2)
+
+
+def submission_event(sub) -> dict:
+    return {
+        "id": sub.id,
+        "project_id": sub.project_id,
+        "type_id": sub.type_id,
+        "testcase_id": sub.testcase_id,
+        "status": sub.status,
+        "progress": sub.progress,
+        "passed": sub.passed,
+        "total": sub.total,
+        "score": sub.score,
+        "submitted_at": sub.submitted_at.isoformat() if sub.submitted_at else None,
+        "evaluated_at": sub.evaluated_at.isoformat() if sub.evaluated_at else None,
+        "updated_at": sub.updated_at.isoformat() if sub.updated_at else None,
+    }
+
+
+class ChangeFeed:
+    def __init__(self, app, interval: float = SSE_POLL_SECONDS):
+        self.app = app
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers: Set[queue.Queue] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._cursor: Optional[datetime] = None
+        # Changes up to this updated_at have been handed to all subscribers
+        self.delivered: Optional[datetime] = None
+        # (id, updated_at) of rows in the overlap window already sent
+        self._sent: Dict[Tuple[int, datetime], None] = {}
+
+    def subscribe(self) -> "queue.Queue[dict]":
+        q: "queue.Queue[dict]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="change-feed", daemon=True
+                )
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _run(self):
+        while True:
+            try:
+                events = self.poll()
+            except Exception as e:
+                print(f"Change feed poll failed: {e}")
+                events = []
+            with self._lock:
+                subscribers = list(self._subscribers)
+                if not subscribers:
+                    # The next subscriber starts a new poller from the present
+                    self._thread = None
+                    self._cursor = None
+                    self.delivered = None
+                    self._sent = {}
+                    return
+            for event in events:
+                for q in subscribers:
+                    try:
+                        q.put_nowait(event)
+                    except queue.Full:
+                        self.unsubscribe(q)
+            self.delivered = self._cursor
+            time.sleep(self.interval)
+
+    def poll(self) -> List[dict]:
+        """Events for submissions changed since the previous poll."""
+        from models import Submission, db
+
+        with self.app.app_context():
+            first = self._cursor is None
+            if first:
+                latest = db.session.query(db.func.max(Submission.updated_at)).scalar()
+                self._cursor = latest or datetime.utcnow()
+
+            rows = (
+                Submission.query.filter(Submission.updated_at > self._cursor - OVERLAP)
+                .order_by(Submission.updated_at)
+                .all()
+            )
+            events = []
+            for sub in rows:
+                key = (sub.id, sub.updated_at)
+                if key in self._sent:
+                    continue
+                self._sent[key] = None
+                events.append(submission_event(sub))
+            if rows:
+                self._cursor = max(self._cursor, rows[-1].updated_at)
+            horizon = self._cursor - OVERLAP
+            self._sent = {k: None for k in self._sent if k[1] > horizon}
+            db.session.remove()
+            # The first poll only records where the feed starts
+            return [] if first else events
+
+
+_feed: Optional[ChangeFeed] = None
+_feed_lock = threading.Lock()
+
+
+def get_feed(app) -> ChangeFeed:
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = ChangeFeed(app)
+        return _feed
+
+
+def replay(
+    app,
+    since: datetime,
+    submission_id: Optional[int] = None,
+    type_id: Optional[str] = None,
+) -> List[dict]:
+    """Events for submissions changed since a reconnecting client's last one.
+
+    Starts OVERLAP early, like the poller, so a few events may repeat.
+    """
+    from models import Submission, db
+
+    with app.app_context():
+        query = Submission.query.filter(Submission.updated_at > since - OVERLAP)
+        if submission_id is not None:
+            query = query.filter(Submission.id == submission_id)
+        if type_id is not None:
+            query = query.filter(Submission.type_id == type_id)
+        rows = query.order_by(Submission.updated_at).limit(REPLAY_LIMIT).all()
+        events = [submission_event(sub) for sub in rows]
+        db.session.remove()
+        return events
+
+
+def _format(event: dict) -> str:
+    # The id comes back as Last-Event-ID when the browser reconnects
+    return (
+        f"id: {event['updated_at'] or ''}\n"
+        f"event: submission\ndata: {json.dumps(event)}\n\n"
+    )
+
+
+def _position(feed: ChangeFeed) -> str:
+    # An id without data moves Last-Event-ID without dispatching an event
+    delivered = feed.delivered
+    return f"id: {delivered.isoformat()}\n\n" if delivered else ""
+
+
+def stream(
+    app,
+    submission_id: Optional[int] = None,
+    type_id: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    lifetime: float = SSE_STREAM_SECONDS,
+) -> Iterator[str]:
+    """text/event-stream of "submission" events, optionally filtered.
+
+    Ends after lifetime seconds. last_event_id (the Last-Event-ID header
+    of a reconnect) replays the changes since that event first.
+    """
+    feed = get_feed(app)
+    # Subscribed before the replay, so no change falls in between
+    q = feed.subscribe()
+    deadline = time.monotonic() + lifetime
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        try:
+            since = datetime.fromisoformat(last_event_id) if last_event_id else None
+        except ValueError:
+            since = None
+        if since is not None:
+            for event in replay(app, since, submission_id, type_id):
+                yield _format(event)
+        while True:
+            remaining = deadline - time.monotonic()
+            # Read before waiting: once the queue is found empty, every
+            # change up to this position has been sent
+            position = _position(feed)
+            try:
+                if remaining <= 0:
+                    event = q.get_nowait()
+                else:
+                    event = q.get(timeout=min(SSE_KEEPALIVE_SECONDS, remaining))
+            except queue.Empty:
+                if remaining <= 0:
+                    yield position
+                    return
+                yield ": keepalive\n\n" + position
+                continue
+            if submission_id is not None and event["id"] != submission_id:
+                continue
+            if type_id is not None and event["type_id"] != type_id:
+                continue
+            yield _format(event)
+    finally:
+        feed.unsubscribe(q)
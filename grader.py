@@ -1,22 +1,45 @@
+import asyncio
+import base64
 import os
 import re
 import shutil
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from redminelib import Redmine
-from redminelib.resources import Issue
 
-from eval import run_extract, run_tests
-from models import Submission, TestCaseResult, Student, RedmineIssue, db
+from cache import bump, type_scope
+from buildcache import build_key, restore, snapshot, store
+from eval import TEST_DOCKER_IMAGE, image_digest, run_extract, run_tests
+from metrics import recording, stage
+from models import (
+    Submission,
+    SubmissionLog,
+    SourceSignature,
+    TestCaseResult,
+    RedmineIssue,
+    db,
+)
+from redmine_async import REDMINE_TIMEOUT_SECONDS, AsyncRedmine
+from similarity import index_source
+from storage import CASE_OUTPUT_LIMIT, compress_bytes
+from tasks import advance_progress, report_progress
+from testcases import case_basename, corpus_version
+from tracing import set_attribute, span, tracing_engine
+from workspace import OUTPUT_DIR, scratch_workspace
+
+if TYPE_CHECKING:
+    # Imported when a client is made; app.py and CLIs that only need
+    # TEST_MAP do not pay for python-redmine
+    from redminelib import Redmine
+    from redminelib.resources import Issue
 
 load_dotenv()
 
 REDMINE_URL = os.getenv("REDMINE_URL")
 REDMINE_API_KEY = os.getenv("REDMINE_API_KEY")
-OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "./output"))
 LIMITED_CASES = os.getenv("LIMITED_CASES", "").split(",")
 
 SUBJECT_MAP: Dict[str, str] = {
@@ -48,6 +71,11 @@ TEST_MAP: Dict[str, List[str]] = {
     "program04": ["04test"],
 }
 
+# Every suite in TEST_MAP, for corpus manifests
+ALL_SUITES: List[str] = sorted(
+    {suite for suites in TEST_MAP.values() for suite in suites}
+)
+
 REPORT_MAP: Dict[str, str] = {
     "program01": "report01",
     "program02": "report02",
@@ -59,19 +87,28 @@ PROJECT_REGEX = re.compile(r"言語処理プログラミング \((\d+)\)")
 STUDENT_ROLE_NAME = os.getenv("STUDENT_ROLE_NAME", "学生")
 
 
-def get_redmine_client() -> Redmine:
-    return Redmine(REDMINE_URL, key=REDMINE_API_KEY)
+def get_redmine_client() -> "Redmine":
+    from redminelib import Redmine
+
+    return Redmine(
+        REDMINE_URL,
+        key=REDMINE_API_KEY,
+        engine=tracing_engine(),
+        # Ends the request thread too when AsyncRedmine gives up on a call
+        requests={"timeout": REDMINE_TIMEOUT_SECONDS},
+    )
 
 
 def get_attachment_info(
-    redmine: Redmine, issue: Issue, report_type: str
+    detailed_issue: "Issue", report_type: str
 ) -> Optional[Tuple[str, datetime, datetime]]:
     """Get the latest attachment ID, its creation time, and first attachment time for an issue.
 
+    detailed_issue must have been fetched with its journals.
+
     Returns:
         Tuple of (latest_attachment_id, latest_created_on, first_created_on) or None
     """
-    detailed_issue = redmine.issue.get(issue.id, include=["journals"])
     journals = sorted(detailed_issue.journals, key=lambda x: x.created_on)
 
     latest_attachment_id = None
@@ -112,15 +149,19 @@ def _make_updated_on_naive(updated_on) -> Optional[datetime]:
     return None
 
 
-def check_and_register_issue(
-    redmine: Redmine, issue: Issue, known_issues: Dict[int, Optional[datetime]]
+async def check_and_register_issue(
+    client: AsyncRedmine, issue: "Issue", known_issues: Dict[int, Optional[datetime]]
 ) -> Optional[Submission]:
     """Check a Redmine issue for changes and register/update a Submission.
 
     Compares the issue's updated_on against the stored value.
     Downloads the attachment but does NOT run tests.
     Returns the created/updated Submission, or None if no action needed.
+
+    Database work happens between awaits only, so concurrent calls on one
+    event loop never interleave inside a transaction.
     """
+    redmine = client.redmine
     issue_updated_on = _make_updated_on_naive(issue.updated_on)
 
     # Check if this issue has changed since last check
@@ -129,6 +170,12 @@ def check_and_register_issue(
         if stored is not None and issue_updated_on is not None and stored == issue_updated_on:
             return None
 
+    # Parse issue details
+    with stage("redmine_fetch"):
+        detailed_issue = await client.call(
+            redmine.issue.get, issue.id, include=["journals"]
+        )
+
     # Update RedmineIssue record
     ri = RedmineIssue.query.filter_by(issue_id=issue.id).first()
     if ri is None:
@@ -138,8 +185,6 @@ def check_and_register_issue(
         ri.updated_on = issue_updated_on
     db.session.commit()
 
-    # Parse issue details
-    detailed_issue = redmine.issue.get(issue.id, include=["journals"])
     project_name = detailed_issue.project.name
     match = PROJECT_REGEX.match(project_name)
 
@@ -154,13 +199,14 @@ def check_and_register_issue(
         print(f"Unknown report type: {detailed_issue.subject}")
         return None
 
-    attachment_info = get_attachment_info(redmine, issue, report_type)
+    attachment_info = get_attachment_info(detailed_issue, report_type)
 
     if attachment_info is None:
         print(f"No attachment found for {report_type} (project: {project_name})")
         return None
 
     attachment_id, submitted_at, first_submitted_at = attachment_info
+    set_attribute("attachment_id", attachment_id)
 
     # Check if already processed
     existing = Submission.query.filter_by(attachment_id=attachment_id).first()
@@ -169,13 +215,18 @@ def check_and_register_issue(
         return None
 
     try:
-        attachment = redmine.attachment.get(attachment_id)
+        with stage("redmine_fetch"):
+            attachment = await client.call(redmine.attachment.get, attachment_id)
     except Exception as e:
         print(f"Failed to get attachment: {e}")
+        _forget_issue(issue.id)
         return None
 
     print(f"Registering: {project_id} {report_type} {attachment.filename}")
 
+    # Another task may have registered the attachment while we waited
+    existing = Submission.query.filter_by(attachment_id=attachment_id).first()
+
     # Create or update submission record
     submission = (
         Submission(
@@ -190,6 +241,7 @@ def check_and_register_issue(
         else existing
     )
     if existing is not None:
+        bump(type_scope(report_type))
         submission.status = "pending"
     if existing is None:
         db.session.add(submission)
@@ -201,10 +253,14 @@ def check_and_register_issue(
     file_dir.mkdir(parents=True, exist_ok=True)
     file_dir = file_dir.resolve()
     ext = EXT_MAP[report_type]
-    attachment.download(savepath=str(file_dir), filename=f"submission{ext}")
+    with stage("download"):
+        await client.call(
+            _download_file, attachment.content_url, file_dir, f"submission{ext}"
+        )
 
     # If not a program submission (report), mark as completed immediately
     if report_type not in TEST_MAP:
+        bump(type_scope(report_type))
         submission.status = "completed"
         submission.evaluated_at = datetime.utcnow()
         db.session.commit()
@@ -216,6 +272,20 @@ def check_and_register_issue(
     return submission
 
 
+def _download_file(url: str, file_dir: Path, filename: str):
+    # Redmine.download() swaps the client's engine while it runs, so
+    # concurrent downloads each need a client of their own
+    get_redmine_client().download(url, savepath=str(file_dir), filename=filename)
+
+
+def _forget_issue(issue_id: int):
+    """Make the next check process an issue again after a failed registration."""
+    ri = RedmineIssue.query.filter_by(issue_id=issue_id).first()
+    if ri is not None:
+        ri.updated_on = None
+        db.session.commit()
+
+
 def _download_attachment(attachment_id: str, type_id: str) -> Path:
     """Download an attachment from Redmine and return the file directory."""
     redmine = get_redmine_client()
@@ -233,7 +303,26 @@ def run_submission_tests(submission: Submission) -> Submission:
     """Run tests for a pending Submission and update results in DB.
 
     If the downloaded file is missing, re-downloads from Redmine.
+    Stage timings of the run are stored as StageTiming rows.
     """
+    with recording() as recorder, span(
+        "submission",
+        attachment_id=submission.attachment_id,
+        project_id=submission.project_id,
+        type_id=submission.type_id,
+    ):
+        try:
+            return _run_submission_tests(submission)
+        finally:
+            try:
+                recorder.save(submission.id)
+                db.session.commit()
+            except Exception as e:
+                print(f"Failed to save stage timings: {e}")
+                db.session.rollback()
+
+
+def _run_submission_tests(submission: Submission) -> Submission:
     submission.status = "running"
     db.session.commit()
 
@@ -245,36 +334,180 @@ def run_submission_tests(submission: Submission) -> Submission:
     if not submission_file.exists():
         print(f"File missing, re-downloading: {submission.attachment_id}")
         try:
-            file_dir = _download_attachment(submission.attachment_id, submission.type_id)
+            with stage("download"):
+                file_dir = _download_attachment(
+                    submission.attachment_id, submission.type_id
+                )
         except Exception as e:
             print(f"Failed to re-download attachment: {e}")
-            submission.status = "error"
-            submission.other_info = f"Download failed: {e}"
-            submission.evaluated_at = datetime.utcnow()
+            record_error(submission, f"Download failed: {e}")
             db.session.commit()
             return submission
+        submission_file = file_dir / f"submission{ext}"
+
+    # Extract and build in a scratch copy; the archive itself stays pristine
+    with scratch_workspace(submission_file, submission.attachment_id) as work_dir:
+        return _run_tests_in_workspace(submission, work_dir)
+
+
+@dataclass
+class Evaluation:
+    """Result of testing one workspace, independent of the database.
+
+    Produced by evaluate_workspace() locally or by a remote worker, and
+    stored by apply_evaluation().
+    """
+
+    status: str  # "completed" or "error"
+    other_info: str = ""
+    testcase_id: Optional[str] = None
+    summary: List[Tuple[str, str]] = field(default_factory=list)
+    # Size-capped outputs of the failed cases of the chosen suite
+    outputs: Dict[str, bytes] = field(default_factory=dict)
+    # lpptest stdout (or the error) per suite
+    logs: Dict[str, str] = field(default_factory=dict)
+    # Test image and corpus the evaluation ran with
+    image_digest: Optional[str] = None
+    corpus_version: Optional[str] = None
+    # MinHash signature of the extracted source (similarity.py)
+    source_signature: Optional[bytes] = None
+    source_shingles: int = 0
+
+    def to_json(self) -> dict:
+        return {
+            "status": self.status,
+            "other_info": self.other_info,
+            "testcase_id": self.testcase_id,
+            "summary": [list(item) for item in self.summary],
+            "outputs": {
+                name: base64.b64encode(output).decode("ascii")
+                for name, output in self.outputs.items()
+            },
+            "logs": self.logs,
+            "image_digest": self.image_digest,
+            "corpus_version": self.corpus_version,
+            "source_signature": (
+                base64.b64encode(self.source_signature).decode("ascii")
+                if self.source_signature
+                else None
+            ),
+            "source_shingles": self.source_shingles,
+        }
+
+    @staticmethod
+    def from_json(data: dict) -> "Evaluation":
+        return Evaluation(
+            status=data["status"],
+            other_info=data.get("other_info", ""),
+            testcase_id=data.get("testcase_id"),
+            summary=[(name, outcome) for name, outcome in data.get("summary", [])],
+            outputs={
+                name: base64.b64decode(output)
+                for name, output in data.get("outputs", {}).items()
+            },
+            logs=data.get("logs", {}),
+            image_digest=data.get("image_digest"),
+            corpus_version=data.get("corpus_version"),
+            source_signature=(
+                base64.b64decode(data["source_signature"])
+                if data.get("source_signature")
+                else None
+            ),
+            source_shingles=data.get("source_shingles", 0),
+        )
+
+
+def parse_cases(cases: Optional[str]) -> List[str]:
+    return [case for case in (cases or "").split(",") if case]
+
+
+def test_plan(submission: Submission) -> Tuple[List[str], List[str]]:
+    """Suites to run and the include_cases filter for a submission.
+
+    A selective re-evaluation reruns only its pending cases, in the suite
+    that produced the current result.
+    """
+    cases = parse_cases(submission.pending_cases)
+    if cases and submission.testcase_id:
+        return [submission.testcase_id], ["test_compile"] + cases
+    return TEST_MAP[submission.type_id], LIMITED_CASES
+
+
+def _run_tests_in_workspace(submission: Submission, work_dir: Path) -> Submission:
+    def on_progress(progress: str):
+        submission.progress = progress
+        db.session.commit()
+
+    suites, include_cases = test_plan(submission)
+    evaluation = evaluate_workspace(
+        work_dir, submission.type_id, include_cases, on_progress, suites
+    )
+    return apply_evaluation(submission, evaluation)
+
+
+def evaluate_workspace(
+    work_dir: Path,
+    type_id: str,
+    include_cases: List[str] = [],
+    on_progress: Optional[Callable[[str], None]] = None,
+    suites: Optional[List[str]] = None,
+) -> Evaluation:
+    """Extract the submission in work_dir and run every suite of type_id.
+
+    The suite with the most passed cases is chosen as the result.
+    on_progress is called with e.g. "01test (1/2)" before each suite.
+    suites limits the run to some of the type's suites.
+    """
+    stamp = {
+        "image_digest": image_digest(),
+        "corpus_version": corpus_version(ALL_SUITES),
+    }
 
     # Extract source
     try:
-        root = run_extract(file_dir)
+        root = run_extract(work_dir)
     except Exception as e:
         print(f"Failed to extract source code: {e}")
-        submission.status = "error"
-        submission.other_info = f"Extraction failed: {e}"
-        submission.evaluated_at = datetime.utcnow()
-        db.session.commit()
-        return submission
+        return Evaluation("error", f"Extraction failed: {e}", **stamp)
 
     test_results_dir = root / "test_results"
-    shutil.rmtree(test_results_dir, ignore_errors=True)
 
-    test_names = TEST_MAP[submission.type_id]
+    try:
+        with stage("similarity_index"):
+            signature, shingles = index_source(root)
+        stamp.update(source_signature=signature, source_shingles=shingles)
+    except (OSError, ValueError) as e:
+        print(f"Failed to index source: {e}")
+
+    # Products of an earlier build of the same tree make the build a no-op
+    try:
+        with stage("build_cache"):
+            cache_key = build_key(root, stamp["image_digest"] or TEST_DOCKER_IMAGE)
+            before_build = snapshot(root)
+            cached_build = restore(root, cache_key)
+        if cached_build is not None:
+            print(f"Build cache hit: {len(cached_build.products)} files")
+    except OSError as e:
+        print(f"Build cache unavailable: {e}")
+        cache_key, cached_build = None, None
+
+    test_names = suites or TEST_MAP[type_id]
     best_result = (None, "", 0, [])
     all_result_info: List[str] = []
-
-    for test_name in test_names:
+    logs: Dict[str, str] = {}
+
+    for index, test_name in enumerate(test_names, 1):
+        if on_progress is not None:
+            try:
+                on_progress(f"{test_name} ({index}/{len(test_names)})")
+            except Exception as e:
+                print(f"Failed to report progress: {e}")
+        # Each suite writes its case outputs here; keep them apart per suite
+        shutil.rmtree(test_results_dir, ignore_errors=True)
         try:
-            result = run_tests(root, test_name, include_cases=LIMITED_CASES)
+            with stage(f"suite:{test_name}"):
+                result = run_tests(root, test_name, include_cases=include_cases)
+            logs[test_name] = result.stdout
             passed_count = len([r for r in result.summary if r[1] == "passed"])
             print(f"{test_name}: {passed_count}/{len(result.summary)}")
             all_result_info.append(
@@ -283,43 +516,143 @@ def run_submission_tests(submission: Submission) -> Submission:
 
             if passed_count >= best_result[2]:
                 best_result = (result, test_name, passed_count, result.summary)
+
+            compile_outcome = dict(result.summary).get("test_compile")
+            if cache_key and cached_build is None and compile_outcome == "passed":
+                cached_build = store(root, cache_key, before_build, compile_outcome)
         except Exception as e:
             print(f"Test {test_name} failed: {e}")
+            logs[test_name] = str(e)
             all_result_info.append(f"{test_name} (error)")
 
     if best_result[0] is None:
+        return Evaluation("error", "All tests failed", logs=logs, **stamp)
+
+    return Evaluation(
+        "completed",
+        " | ".join(all_result_info),
+        testcase_id=best_result[1],
+        summary=best_result[3],
+        outputs=best_result[0].outputs,
+        logs=logs,
+        **stamp,
+    )
+
+
+# Appended to other_info of a result kept after its re-evaluation failed
+REEVALUATION_FAILED = " | Re-evaluation failed: "
+
+
+def record_error(submission: Submission, message: str):
+    """Record a failed evaluation of submission (committed by the caller).
+
+    A requeued submission keeps its previous result and goes back to
+    "completed", with the error noted in other_info; only a submission
+    without an earlier result becomes "error".
+    """
+    bump(type_scope(submission.type_id))
+    if submission.requeued_at is not None:
+        previous = (submission.other_info or "").split(REEVALUATION_FAILED)[0]
+        submission.status = "completed"
+        submission.other_info = f"{previous}{REEVALUATION_FAILED}{message}"
+    else:
         submission.status = "error"
-        submission.other_info = "All tests failed"
+        submission.other_info = message
         submission.evaluated_at = datetime.utcnow()
+    submission.progress = None
+    submission.requeued_at = None
+    submission.pending_cases = None
+
+
+def apply_evaluation(submission: Submission, evaluation: Evaluation) -> Submission:
+    """Store an Evaluation as the result of submission.
+
+    Case results are merged into the existing TestCaseResult rows by name.
+    After a full run, rows of cases that no longer ran are removed; after a
+    selective run (submission.pending_cases), only the requested cases are
+    replaced or, if they are gone from the corpus, removed.
+    """
+    from reeval import ensure_corpus_recorded
+
+    if evaluation.status != "completed":
+        # The logs of a failed re-evaluation would not match the kept result
+        if submission.requeued_at is None:
+            for kind, text in evaluation.logs.items():
+                SubmissionLog.save(submission.id, kind, text)
+        record_error(submission, evaluation.other_info)
         db.session.commit()
         return submission
 
-    # Clear old test case results if re-running
-    TestCaseResult.query.filter_by(submission_id=submission.id).delete()
+    bump(type_scope(submission.type_id))
+    for kind, text in evaluation.logs.items():
+        SubmissionLog.save(submission.id, kind, text)
 
-    # Update submission with best results
-    submission.testcase_id = best_result[1]
-    submission.passed = best_result[2]
-    submission.total = len(best_result[3])
-    submission.failed = ",".join([s for s, r in best_result[3] if r == "failed"])
-    submission.other_info = " | ".join(all_result_info)
-    submission.stdout = best_result[0].stdout if best_result[0] else ""
-    submission.status = "completed"
-    submission.evaluated_at = datetime.utcnow()
+    if evaluation.source_signature:
+        SourceSignature.save(
+            submission.id, evaluation.source_signature, evaluation.source_shingles
+        )
+    submission.progress = None
+    submission.requeued_at = None
+
+    selective = parse_cases(submission.pending_cases)
+    summary = dict(evaluation.summary)
+    existing = {
+        r.name: r
+        for r in TestCaseResult.query.filter_by(submission_id=submission.id)
+    }
+    for name, result in existing.items():
+        if name in summary:
+            continue
+        if not selective or case_basename(name) in selective:
+            db.session.delete(result)
 
     # Save individual test case results
-    for case_name, outcome in best_result[3]:
-        test_result = TestCaseResult(
-            submission_id=submission.id,
-            name=case_name,
-            outcome=outcome,
-            test_output="",
+    for case_name, outcome in evaluation.summary:
+        output = evaluation.outputs.get(case_name)
+        test_result = existing.get(case_name)
+        if test_result is None:
+            test_result = TestCaseResult(submission_id=submission.id, name=case_name)
+            db.session.add(test_result)
+        test_result.outcome = outcome
+        test_result.test_output = ""
+        test_result.output_blob = (
+            compress_bytes(output, CASE_OUTPUT_LIMIT) if output is not None else None
         )
-        db.session.add(test_result)
+        test_result.diff_blob = None
+
+    if selective:
+        # Cases outside the selection keep their earlier outcome
+        outcomes = {
+            name: r.outcome
+            for name, r in existing.items()
+            if case_basename(name) not in selective
+        }
+        outcomes.update(summary)
+    else:
+        outcomes = summary
+        submission.testcase_id = evaluation.testcase_id
+        submission.other_info = evaluation.other_info
+    passed_count = len([o for o in outcomes.values() if o == "passed"])
 
-    db.session.commit()
+    # Update submission with best results
+    submission.passed = passed_count
+    submission.total = len(outcomes)
+    submission.failed = ",".join([s for s, r in outcomes.items() if r == "failed"])
+    # Recomputed from the new case results by rematerialize_scores()
+    submission.score = None
+    # Logs live in SubmissionLog; clear any legacy copy
+    submission.stdout = ""
+    submission.status = "completed"
+    submission.evaluated_at = datetime.utcnow()
+    submission.pending_cases = None
+    submission.image_digest = evaluation.image_digest
+    submission.corpus_version = evaluation.corpus_version
+    ensure_corpus_recorded(evaluation.corpus_version)
+
+    with stage("db_write"):
+        db.session.commit()
     print(
-        f"Completed: {submission.project_id}/{submission.type_id} - {best_result[2]}/{len(best_result[3])}"
+        f"Completed: {submission.project_id}/{submission.type_id} - {passed_count}/{len(outcomes)}"
     )
 
     return submission
@@ -327,86 +660,38 @@ def run_submission_tests(submission: Submission) -> Submission:
 
 def check_all_issues() -> List[Submission]:
     """Check all Redmine issues for updates and register new/changed submissions."""
-    redmine = get_redmine_client()
-    known = {ri.issue_id: ri.updated_on for ri in RedmineIssue.query.all()}
-    issues: List[Issue] = redmine.issue.filter(tracker_id=15, status_id="*")
-    registered: List[Submission] = []
-
-    for issue in issues:
-        try:
-            submission = check_and_register_issue(redmine, issue, known)
-            if submission:
-                registered.append(submission)
-        except Exception as e:
-            print(f"Error checking issue {issue.id}: {e}")
-            continue
-
-    return registered
-
-
-def sync_students() -> List[Student]:
-    """Sync students from Redmine projects.
-
-    Fetches all projects matching the pattern and extracts student users.
-    """
-    redmine = get_redmine_client()
-    synced: List[Student] = []
-
-    # Get all projects
-    try:
-        projects = redmine.project.all()
-    except Exception as e:
-        print(f"Failed to fetch projects: {e}")
-        return synced
-
-    for project in projects:
-        match = PROJECT_REGEX.match(project.name)
-        if not match:
-            continue
+    return asyncio.run(_check_all_issues())
 
-        project_id = match.group(1)
 
-        # Check if student already exists
-        existing = Student.get_by_project_id(project_id)
-        if existing:
-            continue
+async def _check_all_issues() -> List[Submission]:
+    client = AsyncRedmine(get_redmine_client())
+    known = {ri.issue_id: ri.updated_on for ri in RedmineIssue.query.all()}
+    report_progress(message="Listing issues")
+    issues: List["Issue"] = await client.fetch_all(
+        client.redmine.issue, tracker_id=15, status_id="*"
+    )
+    report_progress(0, len(issues), "Checking issues")
 
-        # Get project memberships
+    async def _check(issue: "Issue") -> Optional[Submission]:
         try:
-            memberships = redmine.project_membership.filter(project_id=project.id)
+            with recording() as recorder, span("register_issue", issue_id=issue.id):
+                submission = await check_and_register_issue(client, issue, known)
+                if submission:
+                    recorder.save(submission.id)
+                    db.session.commit()
+                return submission
         except Exception as e:
-            print(f"Failed to fetch memberships for {project.name}: {e}")
-            continue
-
-        # Find student role member
-        student_name = None
-        student_user_id = None
-
-        for membership in memberships:
-            # Check if this member has the student role
-            roles = getattr(membership, "roles", [])
-            for role in roles:
-                if role.name == STUDENT_ROLE_NAME:
-                    user = getattr(membership, "user", None)
-                    if user:
-                        student_name = user.name
-                        student_user_id = user.id
-                        break
-            if student_name:
-                break
-
-        if student_name:
-            student = Student(
-                project_id=project_id,
-                name=student_name,
-                redmine_user_id=student_user_id,
-            )
-            db.session.add(student)
-            db.session.commit()
-            synced.append(student)
-            print(f"Synced student: {project_id} - {student_name}")
+            print(f"Error checking issue {issue.id}: {e}")
+            db.session.rollback()
+            _forget_issue(issue.id)
+            return None
+        finally:
+            advance_progress()
 
-    return synced
+    results = await asyncio.gather(*(_check(issue) for issue in issues))
+    if client.retried:
+        print(f"Redmine: {client.calls} calls, {client.retried} retried")
+    return [submission for submission in results if submission is not None]
 
 
 def get_submission_path(attachment_id: str, type_id: str) -> Path:
@@ -0,0 +1,178 @@
+"""Interactive runs of a submission's build on arbitrary input.
+
+RUN_WORKSPACE_DIR/<attachment_id>/ keeps an extracted and built copy of a
+submission between requests, so only the first run of a submission pays
+for extraction and make (nothing at all when the build cache has the
+tree). Builds run in a container of their own; runs are docker exec'd
+into the copy's warm container (eval.warm_container), which keeps the
+round trip well under a second. collect_garbage() removes
+copies unused for SCRATCH_MAX_AGE_HOURS.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from buildcache import build_key, restore, snapshot, store
+from eval import (
+    RUN_WORKSPACE_DIR,
+    TEST_DOCKER_IMAGE,
+    RawOutput,
+    image_digest,
+    run_build,
+    run_extract,
+    run_raw_output,
+)
+from models import Submission
+from testcases import case_basename, get_testcase
+
+RAW_RUN_TIMEOUT = int(os.getenv("RAW_RUN_TIMEOUT_SECONDS", "10"))
+# Holds the source root, relative to the run workspace
+READY_FILE = ".ready"
+
+_prepare_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+_prepare_locks_lock = threading.Lock()
+
+
+def submission_archive(submission: Submission) -> Path:
+    """Path of the submission's archive, downloaded again if it was evicted."""
+    from grader import EXT_MAP, _download_attachment, get_submission_path
+
+    archive = get_submission_path(submission.attachment_id, submission.type_id)
+    if not archive.exists():
+        file_dir = _download_attachment(submission.attachment_id, submission.type_id)
+        archive = file_dir / f"submission{EXT_MAP[submission.type_id]}"
+    return archive.resolve()
+
+
+def _ready_root(workspace: Path) -> Optional[Path]:
+    try:
+        rel = (workspace / READY_FILE).read_text().strip()
+    except OSError:
+        return None
+    # Last use, for collect_garbage()
+    os.utime(workspace)
+    return workspace / rel
+
+
+def _prepare(name: str, populate: Callable[[Path], Path]) -> Path:
+    """Source root of a built copy under RUN_WORKSPACE_DIR/name.
+
+    populate fills an empty staging directory and returns the source root.
+    """
+    workspace = RUN_WORKSPACE_DIR / name
+    root = _ready_root(workspace)
+    if root is not None:
+        return root
+
+    with _prepare_locks_lock:
+        lock = _prepare_locks[name]
+    with lock:
+        root = _ready_root(workspace)
+        if root is not None:
+            return root
+
+        RUN_WORKSPACE_DIR.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".tmp-", dir=RUN_WORKSPACE_DIR))
+        try:
+            staged_root = populate(staging)
+            key = build_key(staged_root, image_digest() or TEST_DOCKER_IMAGE)
+            before = snapshot(staged_root)
+            if restore(staged_root, key) is not None:
+                print(f"Build cache hit for run workspace {name}")
+            else:
+                returncode, stdout, stderr = run_build(staged_root)
+                if returncode != 0:
+                    raise Exception(f"Build failed: {stdout}{stderr}")
+                store(staged_root, key, before, "passed")
+
+            rel = staged_root.relative_to(staging).as_posix()
+            (staging / READY_FILE).write_text(rel)
+            try:
+                os.rename(staging, workspace)
+            except OSError:
+                # Prepared by another process meanwhile
+                if not (workspace / READY_FILE).is_file():
+                    raise
+            else:
+                staging = None
+            return workspace / rel
+        finally:
+            if staging is not None:
+                shutil.rmtree(staging, ignore_errors=True)
+
+
+def prepare_archive_workspace(attachment_id: str, archive: Path) -> Path:
+    """Extract and build a submission archive; returns its source root."""
+
+    def populate(staging: Path) -> Path:
+        shutil.copyfile(archive, staging / archive.name)
+        os.utime(archive)
+        return run_extract(staging)
+
+    return _prepare(attachment_id, populate)
+
+
+def prepare_source_workspace(source_dir: Path) -> Path:
+    """Build a copy of a source tree (e.g. a reference implementation).
+
+    Copies are named after the content of the tree, so editing it builds
+    a new one.
+    """
+    name = "source-" + build_key(source_dir, "")[:16]
+
+    def populate(staging: Path) -> Path:
+        shutil.copytree(source_dir, staging / "src")
+        return staging / "src"
+
+    return _prepare(name, populate)
+
+
+def prepare_run_workspace(submission: Submission) -> Path:
+    """Source root of a built copy of submission under RUN_WORKSPACE_DIR."""
+    workspace = RUN_WORKSPACE_DIR / submission.attachment_id
+    root = _ready_root(workspace)
+    if root is not None:
+        return root
+    archive = submission_archive(submission)
+    return prepare_archive_workspace(submission.attachment_id, archive)
+
+
+def run_submission_input(
+    submission: Submission,
+    source: Optional[str] = None,
+    testsuite: Optional[str] = None,
+    case: Optional[str] = None,
+) -> RawOutput:
+    """Run the submission's binary on source, or on a case of the corpus.
+
+    testsuite selects the binary (BUILD_OUT_MAP); it defaults to the suite
+    of the current result. case is a corpus case such as sample11 or
+    test_run[sample11.mpl].
+    """
+    from grader import TEST_MAP
+
+    suites = TEST_MAP.get(submission.type_id)
+    if not suites:
+        raise ValueError(f"{submission.type_id} has no program to run")
+    testsuite = testsuite or submission.testcase_id or suites[0]
+    if testsuite not in suites:
+        raise ValueError(f"{testsuite} is not a suite of {submission.type_id}")
+
+    filename = "input.mpl"
+    if source is None:
+        if not case:
+            raise ValueError("input or case is required")
+        basename = case_basename(case)
+        if not basename or "/" in basename or basename.startswith("."):
+            raise ValueError(f"Invalid case: {case}")
+        # FileNotFoundError for cases that are not in the corpus
+        source = get_testcase(testsuite, basename)
+        filename = f"{basename}.mpl"
+
+    root = prepare_run_workspace(submission)
+    return run_raw_output(root, testsuite, source, RAW_RUN_TIMEOUT, filename)
@@ -0,0 +1,274 @@
+"""Claiming of pending submissions by the runner and remote workers.
+
+A submission is claimed by moving it from pending to running in one
+conditional UPDATE, so runner.py and any number of worker.py processes can
+poll the same queue without testing a submission twice. On PostgreSQL,
+claim_pending() instead locks a batch of pending rows with SELECT ... FOR
+UPDATE SKIP LOCKED, so claimers never wait on or lose races for the same
+rows. Each runner.py process claims under its own runner_name() and sends
+heartbeats like a worker does; claims held by a runner or worker that
+stopped sending them go back to the queue.
+
+Completed submissions queued again (bulk rerun, re-evaluation) keep their
+status and results and only get requeued_at set. release_requeued() moves
+them to pending a few at a time, so at most RERUN_MAX_IN_FLIGHT of them
+are pending or running at once and new submissions are claimed first.
+Errored submissions have no result to keep and go straight to pending.
+"""
+
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from models import Submission, Worker, db
+
+# Worker name prefix of runner.py processes
+RUNNER_PREFIX = "runner:"
+# A worker without a heartbeat for this long is considered gone
+WORKER_TIMEOUT_SECONDS = int(os.getenv("WORKER_TIMEOUT_SECONDS", "120"))
+RERUN_MAX_IN_FLIGHT = int(os.getenv("RERUN_MAX_IN_FLIGHT", "4"))
+_RELEASE_LOCK_ID = 0x6C707066
+
+
+def runner_name() -> str:
+    """Claim and heartbeat name of this runner process."""
+    return f"{RUNNER_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+
+def is_runner(worker: Worker) -> bool:
+    return worker.name.startswith(RUNNER_PREFIX)
+
+
+def claim(submission_id: int, worker_name: str) -> bool:
+    """Claim one pending submission. False if someone else got it first."""
+    updated = Submission.query.filter_by(id=submission_id, status="pending").update(
+        {
+            "status": "running",
+            "claimed_by": worker_name,
+            "claimed_at": datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return updated == 1
+
+
+def claim_pending(
+    worker_name: str, limit: int, type_ids: List[str]
+) -> List[Submission]:
+    """Claim up to limit pending submissions of type_ids, oldest first.
+
+    Requeued submissions come after new ones. On PostgreSQL the candidates
+    are locked with FOR UPDATE SKIP LOCKED, so concurrent claimers each get
+    different rows instead of racing for the same ones.
+    """
+    release_requeued()
+    if db.engine.dialect.name == "postgresql":
+        return _claim_locked(worker_name, limit, type_ids)
+    claimed = []
+    candidates = (
+        db.session.query(Submission.id)
+        .filter(Submission.status == "pending", Submission.type_id.in_(type_ids))
+        .order_by(Submission.requeued_at.isnot(None), Submission.id)
+        .limit(limit * 2)
+        .all()
+    )
+    for (submission_id,) in candidates:
+        if len(claimed) >= limit:
+            break
+        if claim(submission_id, worker_name):
+            claimed.append(db.session.get(Submission, submission_id))
+    return claimed
+
+
+def _claim_locked(
+    worker_name: str, limit: int, type_ids: List[str]
+) -> List[Submission]:
+    submissions = (
+        Submission.query.filter(
+            Submission.status == "pending", Submission.type_id.in_(type_ids)
+        )
+        .order_by(Submission.requeued_at.isnot(None), Submission.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    now = datetime.utcnow()
+    for submission in submissions:
+        submission.status = "running"
+        submission.claimed_by = worker_name
+        submission.claimed_at = now
+    db.session.commit()
+    return submissions
+
+
+def mark_requeued(submission: Submission, pending_cases: Optional[str] = None) -> bool:
+    """Queue a tested submission again; release_requeued() hands it out.
+
+    pending_cases limits the rerun to some cases (see reeval.py); requests
+    for a submission still waiting are merged, and None (all cases) wins.
+    False if the submission is already queued or running. An errored one is
+    made pending for a full run, like a new one, so that a failing rerun
+    cannot turn it into a "completed" one (see grader.record_error).
+    """
+    if submission.status in ("pending", "running"):
+        return False
+    if submission.status == "error":
+        submission.status = "pending"
+        submission.progress = None
+        submission.claimed_by = None
+        submission.requeued_at = None
+        submission.pending_cases = None
+        return True
+    if submission.requeued_at is None:
+        submission.requeued_at = datetime.utcnow()
+        submission.pending_cases = pending_cases
+    elif submission.pending_cases is None or pending_cases is None:
+        submission.pending_cases = None
+    else:
+        cases = submission.pending_cases.split(",")
+        cases += [c for c in pending_cases.split(",") if c not in cases]
+        submission.pending_cases = ",".join(cases)
+    return True
+
+
+def release_requeued(limit: int = RERUN_MAX_IN_FLIGHT) -> int:
+    """Move waiting requeued submissions to pending, up to limit in flight."""
+    if db.engine.dialect.name == "postgresql":
+        # Serializes concurrent releases until commit, so that runners
+        # counting in-flight submissions together do not exceed limit
+        db.session.execute(
+            text("SELECT pg_advisory_xact_lock(:id)"), {"id": _RELEASE_LOCK_ID}
+        )
+    requeued = Submission.requeued_at.isnot(None)
+    # Errored submissions requeued by earlier versions rerun as new ones
+    Submission.query.filter(Submission.status == "error", requeued).update(
+        {
+            "status": "pending",
+            "claimed_by": None,
+            "progress": None,
+            "requeued_at": None,
+            "pending_cases": None,
+        },
+        synchronize_session=False,
+    )
+    in_flight = Submission.query.filter(
+        requeued, Submission.status.in_(["pending", "running"])
+    ).count()
+    if in_flight >= limit:
+        db.session.commit()
+        return 0
+    waiting = [Submission.status == "completed", requeued]
+    ids = [
+        submission_id
+        for (submission_id,) in db.session.query(Submission.id)
+        .filter(*waiting)
+        .order_by(Submission.requeued_at, Submission.id)
+        .limit(limit - in_flight)
+    ]
+    if not ids:
+        db.session.commit()
+        return 0
+    released = Submission.query.filter(Submission.id.in_(ids), *waiting).update(
+        {"status": "pending", "claimed_by": None, "progress": None},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return released
+
+
+def requeue_counts() -> Dict[str, int]:
+    """Requeued submissions waiting to be released and those in flight."""
+    from sqlalchemy import func
+
+    counts = dict(
+        db.session.query(Submission.status, func.count(Submission.id))
+        .filter(Submission.requeued_at.isnot(None))
+        .group_by(Submission.status)
+    )
+    return {
+        "waiting": counts.get("completed", 0),
+        "in_flight": counts.get("pending", 0) + counts.get("running", 0),
+    }
+
+
+def heartbeat(
+    name: str,
+    host: str = "",
+    capacity: int = 1,
+    running: int = 0,
+    image: str = "",
+    started_at: Optional[datetime] = None,
+) -> Worker:
+    """Create or refresh the Worker row of a remote worker or runner."""
+    worker = Worker.query.filter_by(name=name).first()
+    if worker is None:
+        worker = Worker(name=name)
+        db.session.add(worker)
+    worker.host = host
+    worker.capacity = capacity
+    worker.running = running
+    worker.image = image
+    worker.started_at = started_at or worker.started_at
+    worker.last_seen_at = datetime.utcnow()
+    db.session.commit()
+    return worker
+
+
+def is_alive(worker: Worker, now: Optional[datetime] = None) -> bool:
+    now = now or datetime.utcnow()
+    return worker.last_seen_at is not None and now - worker.last_seen_at <= timedelta(
+        seconds=WORKER_TIMEOUT_SECONDS
+    )
+
+
+def live_workers() -> List[Worker]:
+    """Remote workers that are alive; runners are not included."""
+    now = datetime.utcnow()
+    return [
+        w
+        for w in Worker.query.order_by(Worker.name).all()
+        if not is_runner(w) and is_alive(w, now)
+    ]
+
+
+def requeue_stale_claims() -> int:
+    """Return running submissions of dead or unknown claimers to the queue."""
+    now = datetime.utcnow()
+    workers = Worker.query.all()
+    alive = {w.name for w in workers if is_alive(w, now)}
+    stale = Submission.query.filter(
+        Submission.status == "running",
+        Submission.claimed_by.isnot(None),
+    ).all()
+    requeued = 0
+    for submission in stale:
+        if submission.claimed_by in alive:
+            continue
+        print(
+            f"Requeueing {submission.project_id}/{submission.type_id}: "
+            f"{submission.claimed_by} is gone"
+        )
+        submission.status = "pending"
+        submission.claimed_by = None
+        submission.progress = None
+        requeued += 1
+    # A runner's name is never reused, so the row of a dead one is clutter
+    for worker in workers:
+        if is_runner(worker) and worker.name not in alive:
+            db.session.delete(worker)
+    db.session.commit()
+    return requeued
+
+
+def claims_by_worker() -> Dict[str, List[int]]:
+    """Ids of the running submissions per claiming worker."""
+    claims: Dict[str, List[int]] = {}
+    for submission_id, worker_name in db.session.query(
+        Submission.id, Submission.claimed_by
+    ).filter(Submission.status == "running", Submission.claimed_by.isnot(None)):
+        claims.setdefault(worker_name, []).append(submission_id)
+    return claims
@@ -0,0 +1,256 @@
+"""Stage-level timing of submission processing and Prometheus-style metrics.
+
+Code paths mark stages with ``with stage("extract"): ...``. Timings are
+collected by the StageRecorder active in the current context (see
+recording()) and stored as StageTiming rows for the submission.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600]
+QUANTILES = [0.5, 0.9, 0.99]
+# Percentiles are computed over this recent window
+METRICS_WINDOW_HOURS = int(os.getenv("METRICS_WINDOW_HOURS", "24"))
+
+_current_recorder: ContextVar[Optional["StageRecorder"]] = ContextVar(
+    "stage_recorder", default=None
+)
+
+
+class StageRecorder:
+    """Collects stage durations; repeated stages are summed."""
+
+    def __init__(self):
+        self.timings: Dict[str, Tuple[datetime, float]] = {}
+
+    def record(self, name: str, started_at: datetime, duration: float):
+        if name in self.timings:
+            first_started_at, total = self.timings[name]
+            self.timings[name] = (first_started_at, total + duration)
+        else:
+            self.timings[name] = (started_at, duration)
+
+    def save(self, submission_id: int):
+        """Add the collected timings to the session as StageTiming rows."""
+        from models import StageTiming, db
+
+        for name, (started_at, duration) in self.timings.items():
+            db.session.add(
+                StageTiming(
+                    submission_id=submission_id,
+                    stage=name,
+                    started_at=started_at,
+                    duration=duration,
+                )
+            )
+        self.timings = {}
+
+
+@contextmanager
+def recording():
+    """Make a new StageRecorder current for the enclosed block."""
+    recorder = StageRecorder()
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+def record_stage(name: str, duration: float, started_at: datetime = None):
+    """Record an externally measured duration (e.g. from a test report)."""
+    recorder = _current_recorder.get()
+    if recorder is not None:
+        recorder.record(name, started_at or datetime.utcnow(), duration)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as stage name of the current submission."""
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started, started_at)
+
+
+def _quantile(values: List[float], q: float) -> float:
+    index = min(int(q * len(values)), len(values) - 1)
+    return values[index]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(worker_capacity: int) -> str:
+    """Render stage histograms, recent percentiles and queue gauges."""
+    from sqlalchemy import case, func
+
+    from models import StageTiming, Submission, db
+
+    lines: List[str] = []
+
+    # Cumulative histogram over every recorded timing, aggregated in SQL
+    bucket_columns = [
+        func.sum(case((StageTiming.duration <= bound, 1), else_=0))
+        for bound in DURATION_BUCKETS
+    ]
+    rows = (
+        db.session.query(
+            StageTiming.stage,
+            func.count(StageTiming.id),
+            func.sum(StageTiming.duration),
+            *bucket_columns,
+        )
+        .group_by(StageTiming.stage)
+        .order_by(StageTiming.stage)
+        .all()
+    )
+    lines.append(
+        "# HELP lpp_stage_duration_seconds Duration of submission processing stages."
+    )
+    lines.append("# TYPE lpp_stage_duration_seconds histogram")
+    for stage_name, count, total, *buckets in rows:
+        label = f'stage="{_escape(stage_name)}"'
+        for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+            lines.append(
+                f'lpp_stage_duration_seconds_bucket{{{label},le="{bound}"}} '
+                f"{bucket_count or 0}"
+            )
+        lines.append(
+            f'lpp_stage_duration_seconds_bucket{{{label},le="+Inf"}} {count}'
+        )
+        lines.append(f"lpp_stage_duration_seconds_sum{{{label}}} {total or 0}")
+        lines.append(f"lpp_stage_duration_seconds_count{{{label}}} {count}")
+
+    # Percentiles over the recent window
+    since = datetime.utcnow() - timedelta(hours=METRICS_WINDOW_HOURS)
+    recent: Dict[str, List[float]] = {}
+    for stage_name, duration in db.session.query(
+        StageTiming.stage, StageTiming.duration
+    ).filter(StageTiming.started_at >= since):
+        recent.setdefault(stage_name, []).append(duration)
+    lines.append(
+        "# HELP lpp_stage_duration_recent_seconds Stage duration percentiles "
+        f"over the last {METRICS_WINDOW_HOURS}h."
+    )
+    lines.append("# TYPE lpp_stage_duration_recent_seconds summary")
+    for stage_name, durations in sorted(recent.items()):
+        durations.sort()
+        label = f'stage="{_escape(stage_name)}"'
+        for q in QUANTILES:
+            lines.append(
+                f'lpp_stage_duration_recent_seconds{{{label},quantile="{q}"}} '
+                f"{_quantile(durations, q):.3f}"
+            )
+        lines.append(
+            f"lpp_stage_duration_recent_seconds_sum{{{label}}} {sum(durations):.3f}"
+        )
+        lines.append(
+            f"lpp_stage_duration_recent_seconds_count{{{label}}} {len(durations)}"
+        )
+
+    # Queue depth and worker utilization
+    counts = dict(
+        db.session.query(Submission.status, func.count(Submission.id)).group_by(
+            Submission.status
+        )
+    )
+    lines.append("# HELP lpp_submissions Number of submissions by status.")
+    lines.append("# TYPE lpp_submissions gauge")
+    for status in ["pending", "running", "completed", "error"]:
+        lines.append(f'lpp_submissions{{status="{status}"}} {counts.get(status, 0)}')
+
+    busy = counts.get("running", 0)
+    lines.append("# HELP lpp_queue_depth Submissions waiting to be tested.")
+    lines.append("# TYPE lpp_queue_depth gauge")
+    lines.append(f"lpp_queue_depth {counts.get('pending', 0)}")
+    lines.append("# HELP lpp_workers_busy Submissions currently being tested.")
+    lines.append("# TYPE lpp_workers_busy gauge")
+    lines.append(f"lpp_workers_busy {busy}")
+    lines.append(
+        "# HELP lpp_workers_capacity Parallel test capacity of the runner and "
+        "live remote workers."
+    )
+    lines.append("# TYPE lpp_workers_capacity gauge")
+    lines.append(f"lpp_workers_capacity {worker_capacity}")
+    lines.append("# HELP lpp_worker_utilization Busy share of the test capacity.")
+    lines.append("# TYPE lpp_worker_utilization gauge")
+    utilization = busy / worker_capacity if worker_capacity > 0 else 0
+    lines.append(f"lpp_worker_utilization {utilization:.3f}")
+
+    from burst import current_burst_state, drain_estimate
+
+    state = current_burst_state()
+    estimate = drain_estimate(state.max_workers)
+    lines.append("# HELP lpp_burst_active Whether deadline-burst mode is on.")
+    lines.append("# TYPE lpp_burst_active gauge")
+    lines.append(f"lpp_burst_active {int(state.active)}")
+    lines.append(
+        "# HELP lpp_queue_drain_eta_seconds Expected time until the queue is empty."
+    )
+    lines.append("# TYPE lpp_queue_drain_eta_seconds gauge")
+    lines.append(f"lpp_queue_drain_eta_seconds {estimate.eta_seconds:.0f}")
+
+    from jobqueue import is_alive, is_runner
+    from models import Worker
+
+    workers = [w for w in Worker.query.all() if not is_runner(w)]
+    alive = sum(1 for w in workers if is_alive(w))
+    lines.append("# HELP lpp_remote_workers Remote workers by heartbeat state.")
+    lines.append("# TYPE lpp_remote_workers gauge")
+    lines.append(f'lpp_remote_workers{{state="alive"}} {alive}')
+    lines.append(f'lpp_remote_workers{{state="gone"}} {len(workers) - alive}')
+
+    from cache import (
+        analytics_cache,
+        csv_cache,
+        log_cache,
+        similarity_cache,
+        table_cache,
+    )
+
+    caches = [table_cache, csv_cache, similarity_cache, analytics_cache, log_cache]
+    lines.append("# HELP lpp_cache_hits_total Grading views served from the cache.")
+    lines.append("# TYPE lpp_cache_hits_total counter")
+    for c in caches:
+        lines.append(f'lpp_cache_hits_total{{cache="{c.name}"}} {c.hits}')
+    lines.append("# HELP lpp_cache_misses_total Grading views built on request.")
+    lines.append("# TYPE lpp_cache_misses_total counter")
+    for c in caches:
+        lines.append(f'lpp_cache_misses_total{{cache="{c.name}"}} {c.misses}')
+    lines.append("# HELP lpp_cache_entries Entries held by each cache.")
+    lines.append("# TYPE lpp_cache_entries gauge")
+    for c in caches:
+        lines.append(f'lpp_cache_entries{{cache="{c.name}"}} {len(c)}')
+
+    from workspace import recorded_disk_usage
+
+    # As of the runner's last workspace GC; measuring here would walk the tree
+    recorded = recorded_disk_usage()
+    if recorded is not None:
+        usage, measured_at = recorded
+        lines.append("# HELP lpp_disk_bytes Disk use of submission files by area.")
+        lines.append("# TYPE lpp_disk_bytes gauge")
+        lines.append(f'lpp_disk_bytes{{area="archive"}} {usage.archive_bytes}')
+        lines.append(f'lpp_disk_bytes{{area="scratch"}} {usage.scratch_bytes}')
+        lines.append(f'lpp_disk_bytes{{area="temp"}} {usage.temp_bytes}')
+        lines.append(
+            f'lpp_disk_bytes{{area="build_cache"}} {usage.build_cache_bytes}'
+        )
+        lines.append(
+            "# HELP lpp_disk_usage_measured_timestamp_seconds "
+            "When lpp_disk_bytes was measured."
+        )
+        lines.append("# TYPE lpp_disk_usage_measured_timestamp_seconds gauge")
+        lines.append(f"lpp_disk_usage_measured_timestamp_seconds {measured_at:.0f}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,232 @@
+"""Schema migrations.
+
+MIGRATIONS are applied in order, each once, and recorded in the
+schema_migrations table. Tables are created from the models and columns
+added with ALTER TABLE, both only if missing, so databases made by the
+old db.create_all() at any point of the history are brought up to date
+the same way as new ones. A migration that stops halfway is simply run
+again.
+
+On PostgreSQL the whole upgrade is one transaction behind an advisory
+lock, so concurrent upgrades (say, from several deploy hooks) are safe.
+Nothing upgrades implicitly: run this, or flask --app app db-upgrade,
+before starting a new version. runner.py refuses to start on an older
+schema.
+
+Usage:
+    python migrations.py [upgrade|status]
+"""
+
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    func,
+    Table,
+    inspect,
+    select,
+    text,
+)
+
+load_dotenv()
+
+from models import (
+    BackgroundTask,
+    CacheVersion,
+    CorpusManifest,
+    Deadline,
+    ProjectFingerprint,
+    RedmineIssue,
+    SourceSignature,
+    StageTiming,
+    Student,
+    Submission,
+    SubmissionLog,
+    TaskLock,
+    TestCaseResult,
+    Worker,
+)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Any constant shared by every process that migrates this database
+_ADVISORY_LOCK_ID = 0x6C707065
+
+
+def _create_tables(conn, *models):
+    for model in models:
+        model.__table__.create(conn, checkfirst=True)
+
+
+def _add_columns(conn, model, *names: str):
+    """ALTER TABLE ADD COLUMN for the columns of model the table lacks.
+
+    Indexes of the model that cover only added columns are created too.
+    """
+    table = model.__table__
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    added = set()
+    for name in names:
+        if name in existing:
+            continue
+        column_type = table.c[name].type.compile(dialect=conn.dialect)
+        conn.execute(
+            text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}")
+        )
+        added.add(name)
+    for index in table.indexes:
+        if {c.name for c in index.columns} <= added:
+            index.create(conn)
+
+
+def _create_indexes(conn, model, *names: str):
+    existing = {i["name"] for i in inspect(conn).get_indexes(model.__table__.name)}
+    for index in model.__table__.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(conn)
+
+
+def _initial(conn):
+    _create_tables(conn, Submission, TestCaseResult, Student, RedmineIssue, Deadline)
+
+
+def _case_outputs_and_logs(conn):
+    _add_columns(conn, TestCaseResult, "output_blob", "diff_blob")
+    _create_tables(conn, SubmissionLog)
+
+
+def _stage_timings(conn):
+    _create_tables(conn, StageTiming)
+
+
+def _remote_workers(conn):
+    _add_columns(conn, Submission, "claimed_by", "claimed_at")
+    _create_tables(conn, Worker)
+
+
+def _roster_fingerprints(conn):
+    _create_tables(conn, ProjectFingerprint)
+
+
+def _scores_and_events(conn):
+    _add_columns(conn, Submission, "score", "progress", "updated_at")
+    _create_tables(conn, CacheVersion)
+
+
+def _reevaluation(conn):
+    _add_columns(
+        conn,
+        Submission,
+        "image_digest",
+        "corpus_version",
+        "pending_cases",
+        "requeued_at",
+    )
+    _create_tables(conn, CorpusManifest)
+
+
+def _source_signatures(conn):
+    _create_tables(conn, SourceSignature)
+
+
+def _queue_indexes(conn):
+    _create_indexes(
+        conn, Submission, "ix_submissions_status_type_id", "ix_submissions_project_type"
+    )
+    _create_indexes(conn, TestCaseResult, "ix_test_case_results_submission_id")
+
+
+def _background_tasks(conn):
+    _create_tables(conn, BackgroundTask, TaskLock)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "initial", _initial),
+    (2, "case_outputs_and_logs", _case_outputs_and_logs),
+    (3, "stage_timings", _stage_timings),
+    (4, "remote_workers", _remote_workers),
+    (5, "roster_fingerprints", _roster_fingerprints),
+    (6, "scores_and_events", _scores_and_events),
+    (7, "reevaluation", _reevaluation),
+    (8, "source_signatures", _source_signatures),
+    (9, "queue_indexes", _queue_indexes),
+    (10, "background_tasks", _background_tasks),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def applied_versions(conn) -> List[int]:
+    schema_migrations.create(conn, checkfirst=True)
+    query = select(schema_migrations.c.version).order_by(schema_migrations.c.version)
+    return [version for (version,) in conn.execute(query)]
+
+
+def _upgrade(conn) -> List[str]:
+    if conn.dialect.name == "postgresql":
+        # Held until commit; others wait and then find nothing left to do
+        conn.execute(
+            text("SELECT pg_advisory_xact_lock(:id)"), {"id": _ADVISORY_LOCK_ID}
+        )
+    applied = set(applied_versions(conn))
+    names = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"Applying migration {version:03d} {name}")
+        migrate(conn)
+        conn.execute(
+            schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            )
+        )
+        names.append(name)
+    return names
+
+
+def upgrade(engine) -> List[str]:
+    """Apply the pending migrations; returns their names."""
+    with engine.begin() as conn:
+        return _upgrade(conn)
+
+
+def current_version(engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(schema_migrations.name):
+            return 0
+        return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    from database import create_db_app
+    from models import db
+
+    app = create_db_app()
+    with app.app_context():
+        if command == "upgrade":
+            applied = upgrade(db.engine)
+            print(f"Applied {len(applied)} migrations, schema at version {LATEST}")
+        elif command == "status":
+            version = current_version(db.engine)
+            print(f"Schema at version {version}, latest is {LATEST}")
+            sys.exit(0 if version == LATEST else 1)
+        else:
+            print(f"Unknown command: {command}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,20 @@
+import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import deferred, undefer
+
+from storage import SUBMISSION_LOG_LIMIT, compress_text_with_info, decompress_text
 
 db = SQLAlchemy()
 
 
 class Submission(db.Model):
     __tablename__ = "submissions"
+    __table_args__ = (
+        # Queue polling and the per-type grading views
+        db.Index("ix_submissions_status_type_id", "status", "type_id"),
+        db.Index("ix_submissions_project_type", "project_id", "type_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.String(50), nullable=False)
@@ -19,7 +28,8 @@ class Submission(db.Model):
     submitted_at = db.Column(db.DateTime, nullable=True)
     evaluated_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default="pending")
-    stdout = db.Column(db.Text, default="")
+    # Legacy plain-text stdout; new runs store it in SubmissionLog instead
+    stdout = deferred(db.Column(db.Text, default=""))
     # Submission timing classification
     # on_time: 期限内提出
     # resubmission: 期限内提出後の再提出
@@ -27,30 +37,197 @@ class Submission(db.Model):
     # submission_timing = db.Column(db.String(20), default="unknown")
     # First submission timestamp for this project/type (to detect resubmission)
     first_submitted_at = db.Column(db.DateTime, nullable=True)
+    # Runner or remote worker that is (or was last) testing this submission
+    claimed_by = db.Column(db.String(100), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    # Score of the result (score.py), filled in by rematerialize_scores()
+    score = db.Column(db.Float, nullable=True)
+    # Test image (docker image id) and lpp_collector corpus the result is from
+    image_digest = db.Column(db.String(100), nullable=True)
+    corpus_version = db.Column(db.String(32), nullable=True)
+    # Comma-separated case basenames of a selective re-evaluation (reeval.py);
+    # only these are rerun and merged into the existing results
+    pending_cases = db.Column(db.Text, nullable=True)
+    # Set when a tested submission is queued again (rerun, re-evaluation);
+    # its previous results stay visible until the new ones are stored
+    requeued_at = db.Column(db.DateTime, nullable=True, index=True)
+    # Suite being run while status is "running", e.g. "01test (1/2)"
+    progress = db.Column(db.String(100), nullable=True)
+    # Bumped on every change; /api/events polls it
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     test_case_results = db.relationship(
         "TestCaseResult", backref="submission", lazy=True, cascade="all, delete-orphan"
     )
+    logs = db.relationship(
+        "SubmissionLog", backref="submission", lazy=True, cascade="all, delete-orphan"
+    )
+    stage_timings = db.relationship(
+        "StageTiming", backref="submission", lazy=True, cascade="all, delete-orphan"
+    )
 
     def __repr__(self):
         return f"<Submission {self.project_id}/{self.type_id}>"
 
+    @staticmethod
+    def has_result():
+        """Filter for submissions whose results the grading views show.
+
+        Includes requeued ones that are waiting for or being tested again.
+        """
+        return db.or_(
+            Submission.status == "completed",
+            db.and_(
+                Submission.requeued_at.isnot(None),
+                Submission.testcase_id.isnot(None),
+                Submission.status.in_(["pending", "running"]),
+            ),
+        )
+
 
 class TestCaseResult(db.Model):
     __tablename__ = "test_case_results"
 
     id = db.Column(db.Integer, primary_key=True)
     submission_id = db.Column(
-        db.Integer, db.ForeignKey("submissions.id"), nullable=False
+        db.Integer, db.ForeignKey("submissions.id"), nullable=False, index=True
     )
     name = db.Column(db.String(100), nullable=False)
     outcome = db.Column(db.String(20), nullable=False)
     test_output = db.Column(db.Text, default="")
+    # zlib-compressed, size-capped actual output of a failed case (see storage.py)
+    output_blob = deferred(db.Column(db.LargeBinary, nullable=True))
+    # zlib-compressed diff against the expected output, filled on first view
+    diff_blob = deferred(db.Column(db.LargeBinary, nullable=True))
 
     def __repr__(self):
         return f"<TestCaseResult {self.name}: {self.outcome}>"
 
 
+class SubmissionLog(db.Model):
+    """Compressed, size-capped log of a submission (lpptest stdout per suite)."""
+
+    __tablename__ = "submission_logs"
+    __table_args__ = (db.UniqueConstraint("submission_id", "kind"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(
+        db.Integer, db.ForeignKey("submissions.id"), nullable=False, index=True
+    )
+    # Suite name such as "01test"
+    kind = db.Column(db.String(50), nullable=False)
+    data = deferred(db.Column(db.LargeBinary, nullable=False))
+    # Size of the original text before truncation, in bytes
+    size = db.Column(db.Integer, default=0)
+    truncated = db.Column(db.Boolean, default=False)
+
+    def __repr__(self):
+        return f"<SubmissionLog {self.submission_id}/{self.kind}>"
+
+    @staticmethod
+    def save(submission_id: int, kind: str, text: str):
+        """Store (or replace) a log, truncated to SUBMISSION_LOG_LIMIT."""
+        data, size, truncated = compress_text_with_info(text, SUBMISSION_LOG_LIMIT)
+        log = SubmissionLog.query.filter_by(
+            submission_id=submission_id, kind=kind
+        ).first()
+        if log is None:
+            log = SubmissionLog(submission_id=submission_id, kind=kind)
+            db.session.add(log)
+        log.data = data
+        log.size = size
+        log.truncated = truncated
+        return log
+
+    @staticmethod
+    def read(submission, kind: str = None) -> str:
+        """Get the text of a log, falling back to the legacy stdout column.
+
+        kind defaults to the suite that produced the submission's result.
+        """
+        kind = kind or submission.testcase_id
+        log = (
+            SubmissionLog.query.options(undefer(SubmissionLog.data))
+            .filter_by(submission_id=submission.id, kind=kind)
+            .first()
+        )
+        if log is not None:
+            return decompress_text(log.data)
+        if kind == submission.testcase_id:
+            return submission.stdout or ""
+        return ""
+
+
+class SourceSignature(db.Model):
+    """MinHash signature of a submission's extracted source (see similarity.py)."""
+
+    __tablename__ = "source_signatures"
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(
+        db.Integer, db.ForeignKey("submissions.id"), nullable=False, unique=True
+    )
+    # SIGNATURE_SIZE little-endian uint32 values
+    signature = db.Column(db.LargeBinary, nullable=False)
+    shingles = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SourceSignature {self.submission_id}: {self.shingles} shingles>"
+
+    @staticmethod
+    def save(submission_id: int, signature: bytes, shingles: int):
+        """Store (or replace) the signature of a submission."""
+        row = SourceSignature.query.filter_by(submission_id=submission_id).first()
+        if row is None:
+            row = SourceSignature(submission_id=submission_id)
+            db.session.add(row)
+        row.signature = signature
+        row.shingles = shingles
+        row.created_at = datetime.utcnow()
+        return row
+
+
+class StageTiming(db.Model):
+    """Duration of one processing stage of a submission (see metrics.py)."""
+
+    __tablename__ = "stage_timings"
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(
+        db.Integer, db.ForeignKey("submissions.id"), nullable=False, index=True
+    )
+    # e.g. redmine_fetch, download, extract, container_start, build,
+    # suite:01test, db_write
+    stage = db.Column(db.String(50), nullable=False, index=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    duration = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<StageTiming {self.submission_id}/{self.stage}: {self.duration:.2f}s>"
+
+
+class Worker(db.Model):
+    """A runner or remote test worker, as reported by its last heartbeat."""
+
+    __tablename__ = "workers"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    host = db.Column(db.String(255), default="")
+    capacity = db.Column(db.Integer, default=1)
+    running = db.Column(db.Integer, default=0)
+    # Test image the worker runs submissions with
+    image = db.Column(db.String(255), default="")
+    started_at = db.Column(db.DateTime, nullable=True)
+    last_seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Worker {self.name}@{self.host}>"
+
+
 class Student(db.Model):
     __tablename__ = "students"
 
@@ -84,6 +261,24 @@ class Student(db.Model):
         return [s.project_id for s in students]
 
 
+class ProjectFingerprint(db.Model):
+    """Roster state of a Redmine project at its last sync (see roster.py)."""
+
+    __tablename__ = "project_fingerprints"
+
+    id = db.Column(db.Integer, primary_key=True)
+    redmine_project_id = db.Column(db.Integer, nullable=False, unique=True)
+    project_id = db.Column(db.String(50), nullable=False)
+    # Redmine's updated_on of the project, as sent
+    updated_on = db.Column(db.String(50), nullable=True)
+    # sha256 of the project's memberships (users and their roles)
+    membership_hash = db.Column(db.String(64), nullable=True)
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ProjectFingerprint {self.project_id}>"
+
+
 class RedmineIssue(db.Model):
     __tablename__ = "redmine_issues"
 
@@ -122,6 +317,35 @@ class Deadline(db.Model):
         return {d.type_id: d.deadline for d in deadlines}
 
 
+class CorpusManifest(db.Model):
+    """Case hashes of an lpp_collector corpus version (testcases.corpus_manifest)."""
+
+    __tablename__ = "corpus_manifests"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String(32), nullable=False, unique=True)
+    # JSON {suite: {case basename: sha256}}
+    manifest = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CorpusManifest {self.version}>"
+
+
+class CacheVersion(db.Model):
+    """Version counter of data the grading caches depend on (see cache.py)."""
+
+    __tablename__ = "cache_versions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # "type:<type_id>" or "students"
+    scope = db.Column(db.String(100), nullable=False, unique=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CacheVersion {self.scope}: {self.version}>"
+
+
 def calculate_submission_timing(submission, deadline: datetime = None) -> str:
     """Calculate submission timing at display time.
 
@@ -168,3 +392,50 @@ def calculate_submission_timing(submission, deadline: datetime = None) -> str:
         return "resubmission"
     else:
         return "late"
+
+
+class BackgroundTask(db.Model):
+    """A background task (see tasks.py), shared by every dashboard worker."""
+
+    __tablename__ = "background_tasks"
+
+    id = db.Column(db.String(16), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="running")
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    done = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.Text, default="")
+    # JSON of the task function's return value
+    result = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f"<BackgroundTask {self.kind} {self.id}: {self.status}>"
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "done": self.done or 0,
+            "total": self.total,
+            "message": self.message or "",
+            "result": json.loads(self.result) if self.result else None,
+        }
+
+
+class TaskLock(db.Model):
+    """Held by the running task of a kind, so only one runs across processes."""
+
+    __tablename__ = "task_locks"
+
+    kind = db.Column(db.String(50), primary_key=True)
+    task_id = db.Column(db.String(16), nullable=False)
+    # Refreshed while the task runs; a stale lock was left by a dead process
+    heartbeat_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<TaskLock {self.kind}: {self.task_id}>"
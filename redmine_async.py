@@ -0,0 +1,132 @@
+"""Concurrent, rate-limited Redmine access for the sync loops.
+
+python-redmine is blocking, so every call runs in a thread via
+asyncio.to_thread. AsyncRedmine bounds how many calls are in flight,
+spaces them with a token bucket, retries transient failures with
+exponential backoff and gives up on a call after a timeout:
+
+    REDMINE_CONCURRENCY=8         calls in flight
+    REDMINE_RATE=10               calls per second, sustained
+    REDMINE_BURST=20              calls allowed back to back
+    REDMINE_RETRIES=3             retries of a failed call
+    REDMINE_TIMEOUT_SECONDS=30    per call
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, Callable, List
+
+REDMINE_CONCURRENCY = int(os.getenv("REDMINE_CONCURRENCY", "8"))
+REDMINE_RATE = float(os.getenv("REDMINE_RATE", "10"))
+REDMINE_BURST = int(os.getenv("REDMINE_BURST", "20"))
+REDMINE_RETRIES = int(os.getenv("REDMINE_RETRIES", "3"))
+REDMINE_TIMEOUT_SECONDS = float(os.getenv("REDMINE_TIMEOUT_SECONDS", "30"))
+# First retry waits about this long; each further retry doubles it
+BACKOFF_SECONDS = 0.5
+PAGE_SIZE = 100
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying (timeouts, 5xx, connection errors)."""
+    from redminelib import exceptions
+    from requests import exceptions as http
+
+    return isinstance(
+        error,
+        (
+            asyncio.TimeoutError,
+            exceptions.ServerError,
+            exceptions.UnknownError,
+            exceptions.JSONDecodeError,
+            http.ConnectionError,
+            http.Timeout,
+        ),
+    )
+
+
+class AsyncRedmine:
+    """Runs blocking python-redmine calls under the limits above."""
+
+    def __init__(
+        self,
+        redmine,
+        concurrency: int = REDMINE_CONCURRENCY,
+        rate: float = REDMINE_RATE,
+        burst: int = REDMINE_BURST,
+        retries: int = REDMINE_RETRIES,
+        timeout: float = REDMINE_TIMEOUT_SECONDS,
+    ):
+        self.redmine = redmine
+        self.retries = retries
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.calls = 0
+        self.retried = 0
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in a thread, retrying transient failures.
+
+        fn must do all of its requests itself; return lists, not lazy
+        ResourceSets.
+        """
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with self.semaphore:
+                    self.calls += 1
+                    return await asyncio.wait_for(
+                        asyncio.to_thread(fn, *args, **kwargs), self.timeout
+                    )
+            except Exception as e:
+                if attempt >= self.retries or not is_transient(e):
+                    raise
+                delay = BACKOFF_SECONDS * 2**attempt * (0.5 + random.random())
+                print(
+                    f"Redmine call failed ({type(e).__name__}: {e}), "
+                    f"retrying in {delay:.1f}s"
+                )
+                self.retried += 1
+                await asyncio.sleep(delay)
+
+    async def fetch_all(self, manager, page_size: int = PAGE_SIZE, **filters) -> List:
+        """All resources of a manager (e.g. redmine.issue), pages fetched in parallel."""
+
+        def page(offset: int):
+            if filters:
+                resources = manager.filter(limit=page_size, offset=offset, **filters)
+            else:
+                resources = manager.all(limit=page_size, offset=offset)
+            return list(resources), resources.total_count
+
+        first, total = await self.call(page, 0)
+        rest = await asyncio.gather(
+            *(self.call(page, offset) for offset in range(page_size, total, page_size))
+        )
+        return first + [resource for resources, _ in rest for resource in resources]
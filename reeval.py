@@ -0,0 +1,162 @@
+"""Selective re-evaluation after the test image or the test corpus changed.
+
+Every result records the docker image id it was tested with and the
+version of the lpp_collector corpus (a hash over the inputs and expected
+outputs of every case, see testcases.corpus_manifest). The manifest of
+each corpus version is kept as a CorpusManifest row, so a later corpus can
+be diffed against the one a result came from:
+
+- a result from another image is rerun in full
+- a result from another corpus is rerun only for the cases of its suite
+  that changed (include_cases), merged into its existing case results
+- a result whose suite did not change is just restamped
+
+Results without a recorded image or corpus predate this and are left
+alone unless include_unknown is set. The corpus is the one installed next
+to the web app and runner, expected to match the one in the test image.
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from eval import image_digest
+from grader import ALL_SUITES, TEST_MAP
+from jobqueue import mark_requeued
+from models import CorpusManifest, Submission, db
+from testcases import changed_cases, corpus_manifest, manifest_version
+
+# Versions known to have a CorpusManifest row, per process
+_recorded: set = set()
+
+
+@dataclass
+class StaleResult:
+    submission_id: int
+    project_id: str
+    type_id: str
+    reason: str  # "image", "corpus" or "unknown"
+    # Case basenames to rerun; empty for a full rerun
+    cases: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ReevaluationPlan:
+    image_digest: Optional[str]
+    corpus_version: str
+    stale: List[StaleResult] = field(default_factory=list)
+    # Results whose suite is unchanged in the new corpus
+    restamp: List[int] = field(default_factory=list)
+    # Results without a recorded image or corpus, not in stale
+    unknown: int = 0
+
+    def to_json(self) -> dict:
+        return {
+            "image_digest": self.image_digest,
+            "corpus_version": self.corpus_version,
+            "stale": [asdict(s) for s in self.stale],
+            "restamp": len(self.restamp),
+            "unknown": self.unknown,
+        }
+
+
+def record_corpus(version: str, manifest: Dict[str, Dict[str, str]]):
+    """Keep the manifest of a corpus version (added to the session)."""
+    if version in _recorded:
+        return
+    if CorpusManifest.query.filter_by(version=version).first() is None:
+        db.session.add(
+            CorpusManifest(version=version, manifest=json.dumps(manifest))
+        )
+    _recorded.add(version)
+
+
+def ensure_corpus_recorded(version: Optional[str]):
+    """Record the installed corpus if a result was produced with it."""
+    if version is None or version in _recorded:
+        return
+    manifest = corpus_manifest(ALL_SUITES)
+    if manifest_version(manifest) == version:
+        record_corpus(version, manifest)
+
+
+def plan_reevaluation(
+    type_ids: Optional[List[str]] = None, include_unknown: bool = False
+) -> ReevaluationPlan:
+    """Find completed results that the current image or corpus would change."""
+    manifest = corpus_manifest(ALL_SUITES)
+    version = manifest_version(manifest)
+    record_corpus(version, manifest)
+    digest = image_digest()
+    plan = ReevaluationPlan(digest, version)
+
+    manifests: Dict[str, Optional[dict]] = {}
+
+    def old_manifest(old_version: str) -> Optional[dict]:
+        if old_version not in manifests:
+            row = CorpusManifest.query.filter_by(version=old_version).first()
+            manifests[old_version] = json.loads(row.manifest) if row else None
+        return manifests[old_version]
+
+    submissions = (
+        Submission.query.filter(
+            Submission.status == "completed",
+            Submission.type_id.in_(type_ids or list(TEST_MAP)),
+        )
+        .order_by(Submission.id)
+        .all()
+    )
+    for sub in submissions:
+        stale = StaleResult(sub.id, sub.project_id, sub.type_id, "")
+        if digest is not None and sub.image_digest != digest:
+            if sub.image_digest is None and not include_unknown:
+                plan.unknown += 1
+                continue
+            stale.reason = "image" if sub.image_digest else "unknown"
+            plan.stale.append(stale)
+            continue
+        if sub.corpus_version == version:
+            continue
+        if sub.corpus_version is None:
+            if include_unknown:
+                stale.reason = "unknown"
+                plan.stale.append(stale)
+            else:
+                plan.unknown += 1
+            continue
+
+        stale.reason = "corpus"
+        old = old_manifest(sub.corpus_version)
+        if old is None or sub.testcase_id not in manifest:
+            # Nothing to diff against; rerun everything
+            plan.stale.append(stale)
+            continue
+        stale.cases = changed_cases(
+            old.get(sub.testcase_id, {}), manifest[sub.testcase_id]
+        )
+        if stale.cases:
+            plan.stale.append(stale)
+        else:
+            plan.restamp.append(sub.id)
+    return plan
+
+
+def requeue_stale(plan: ReevaluationPlan) -> int:
+    """Queue the stale results of a plan and restamp the unaffected ones.
+
+    They are released to the runner gradually (jobqueue.release_requeued).
+    """
+    for stale in plan.stale:
+        sub = db.session.get(Submission, stale.submission_id)
+        if sub is None or not mark_requeued(sub, ",".join(stale.cases) or None):
+            continue
+        print(
+            f"Requeued {sub.project_id}/{sub.type_id} ({stale.reason}): "
+            f"{len(stale.cases) or 'all'} cases"
+        )
+    if plan.restamp:
+        Submission.query.filter(Submission.id.in_(plan.restamp)).update(
+            {"corpus_version": plan.corpus_version}, synchronize_session=False
+        )
+    db.session.commit()
+    return len(plan.stale)
@@ -0,0 +1,258 @@
+"""Static HTML report builder.
+
+Renders ``templates/testcase.jinja2`` for every completed program submission
+and ``templates/summary.jinja2`` for the whole class into ``REPORT_DIR``.
+
+Usage:
+    python report.py [--out DIR] [--workers N] [--force]
+
+Only reports whose inputs changed since the previous build are re-rendered;
+the fingerprints of the last build are kept in ``<out>/manifest.json``.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from jinja2 import Environment, FileSystemLoader, ModuleLoader
+
+load_dotenv()
+
+REPORT_DIR = Path(os.getenv("REPORT_DIR", "./reports"))
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+REPORT_TEMPLATES = ["testcase.jinja2", "summary.jinja2"]
+MANIFEST_NAME = "manifest.json"
+COMPILED_DIR_NAME = ".compiled"
+
+# Per-process template, set up by _init_worker
+_testcase_template = None
+
+
+def _templates_hash() -> str:
+    """Hash of the report templates, so template edits invalidate every report."""
+    h = hashlib.sha256()
+    for name in REPORT_TEMPLATES:
+        h.update((TEMPLATE_DIR / name).read_bytes())
+    return h.hexdigest()
+
+
+def compile_templates(out_dir: Path) -> Path:
+    """Precompile the report templates to Python modules under out_dir."""
+    compiled_dir = out_dir / COMPILED_DIR_NAME
+    shutil.rmtree(compiled_dir, ignore_errors=True)
+    env = Environment(loader=FileSystemLoader(str(TEMPLATE_DIR)))
+    env.compile_templates(
+        str(compiled_dir),
+        zip=None,
+        filter_func=lambda name: name in REPORT_TEMPLATES,
+        ignore_errors=False,
+    )
+    return compiled_dir
+
+
+def _load_env(compiled_dir: Path) -> Environment:
+    return Environment(loader=ModuleLoader(str(compiled_dir)))
+
+
+def _init_worker(compiled_dir: str):
+    global _testcase_template
+    _testcase_template = _load_env(Path(compiled_dir)).get_template("testcase.jinja2")
+
+
+def _fingerprint(submission, templates_hash: str) -> str:
+    data = [
+        templates_hash,
+        submission.id,
+        submission.attachment_id,
+        submission.testcase_id,
+        submission.passed,
+        submission.total,
+        submission.failed,
+        submission.evaluated_at.isoformat() if submission.evaluated_at else None,
+    ]
+    return hashlib.sha256(json.dumps(data).encode("utf-8")).hexdigest()
+
+
+def _render_report(job: dict) -> str:
+    """Render one per-submission report. Runs in a worker process."""
+    from testcases import create_testcase_pairs
+
+    testpairs = create_testcase_pairs(job["testcase_id"], job["outputs"])
+    testpairs.sort(key=lambda p: p.name)
+
+    html = _testcase_template.render(
+        project_id=job["project_id"],
+        testcase_id=job["testcase_id"],
+        passed=job["passed"],
+        total=job["total"],
+        testpairs=testpairs,
+        logs=json.dumps(job["stdout"] or ""),
+    )
+    out_path = Path(job["out_path"])
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(html)
+    return job["key"]
+
+
+def _stored_outputs(submission_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """Failed-case outputs captured at evaluation time, keyed by submission."""
+    from sqlalchemy.orm import undefer
+
+    from models import TestCaseResult
+    from storage import decompress_text
+    from testcases import case_basename
+
+    outputs: Dict[int, Dict[str, str]] = {sid: {} for sid in submission_ids}
+    if not submission_ids:
+        return outputs
+    rows = (
+        TestCaseResult.query.options(undefer(TestCaseResult.output_blob))
+        .filter(
+            TestCaseResult.submission_id.in_(submission_ids),
+            TestCaseResult.output_blob.isnot(None),
+        )
+        .all()
+    )
+    for row in rows:
+        outputs[row.submission_id][case_basename(row.name)] = decompress_text(
+            row.output_blob
+        )
+    return outputs
+
+
+def _best_submissions(submissions) -> Dict[tuple, object]:
+    """Keep the submission with the highest passed count per (project, type)."""
+    best = {}
+    for sub in submissions:
+        key = (sub.project_id, sub.type_id)
+        if key in best and sub.passed < best[key].passed:
+            continue
+        best[key] = sub
+    return best
+
+
+def build_reports(out_dir: Path = REPORT_DIR, workers: int = None, force=False):
+    """Render changed per-submission reports and the summary page.
+
+    Returns the number of per-submission reports that were re-rendered.
+    """
+    from grader import REPORT_MAP, TEST_MAP, get_submission_path
+    from models import Submission, SubmissionLog
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    manifest = {}
+    if manifest_path.exists() and not force:
+        manifest = json.loads(manifest_path.read_text())
+
+    templates_hash = _templates_hash()
+    compiled_dir = compile_templates(out_dir)
+
+    submissions = (
+        Submission.query.filter_by(status="completed")
+        .order_by(Submission.project_id, Submission.id)
+        .all()
+    )
+    best = _best_submissions(submissions)
+
+    changed = []
+    new_manifest = {}
+    for (project_id, type_id), sub in best.items():
+        key = f"{project_id}/{type_id}"
+        fingerprint = _fingerprint(sub, templates_hash)
+        new_manifest[key] = fingerprint
+
+        if type_id not in TEST_MAP:
+            # Reports are published as-is
+            target = out_dir / project_id / type_id / "submission.pdf"
+            if manifest.get(key) != fingerprint or not target.exists():
+                source = get_submission_path(sub.attachment_id, type_id)
+                if source.exists():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(source, target)
+            continue
+
+        out_path = out_dir / project_id / type_id / "report.html"
+        if manifest.get(key) == fingerprint and out_path.exists():
+            continue
+
+        changed.append((key, sub, out_path))
+
+    stored_outputs = _stored_outputs([sub.id for _, sub, _ in changed])
+    jobs: List[dict] = []
+    for key, sub, out_path in changed:
+        jobs.append(
+            {
+                "key": key,
+                "project_id": sub.project_id,
+                "testcase_id": sub.testcase_id,
+                "passed": sub.passed,
+                "total": sub.total,
+                "stdout": SubmissionLog.read(sub),
+                "outputs": stored_outputs[sub.id],
+                "out_path": str(out_path),
+            }
+        )
+
+    print(f"Rendering {len(jobs)} of {len(new_manifest)} reports")
+
+    if jobs:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(str(compiled_dir),),
+        ) as executor:
+            list(executor.map(_render_report, jobs, chunksize=4))
+
+    if jobs or new_manifest != manifest or not (out_dir / "index.html").exists():
+        rows = []
+        for (project_id, type_id), sub in sorted(best.items()):
+            if type_id not in TEST_MAP:
+                continue
+            rows.append(
+                {
+                    "project_id": project_id,
+                    "type_id": type_id,
+                    "report_id": REPORT_MAP[type_id],
+                    "testcase_id": sub.testcase_id,
+                    "passed": sub.passed,
+                    "total": sub.total,
+                    "failed": sub.failed,
+                    "timestamp": sub.submitted_at,
+                    "other_info": sub.other_info,
+                }
+            )
+        summary = _load_env(compiled_dir).get_template("summary.jinja2")
+        (out_dir / "index.html").write_text(summary.render(rows=rows))
+
+    manifest_path.write_text(json.dumps(new_manifest, indent=2, sort_keys=True))
+    return len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build static HTML reports")
+    parser.add_argument("--out", type=Path, default=REPORT_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="Re-render every report"
+    )
+    args = parser.parse_args()
+
+    from database import create_db_app
+
+    app = create_db_app()
+    started = time.monotonic()
+    with app.app_context():
+        rendered = build_reports(args.out, args.workers, args.force)
+    print(f"Rendered {rendered} reports in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
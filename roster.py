@@ -0,0 +1,188 @@
+"""Incremental sync of the student roster from Redmine projects.
+
+The updated_on of every course project and a hash of its memberships are
+kept as ProjectFingerprint rows. A sync lists the projects (paged), then
+fetches memberships only for projects that are new, changed since the last
+sync, or not checked for ROSTER_RECHECK_HOURS (adding a member does not
+touch a project's updated_on). Changed students are upserted in one
+statement per batch.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from cache import STUDENTS_SCOPE, bump
+from grader import PROJECT_REGEX, STUDENT_ROLE_NAME, get_redmine_client
+from models import ProjectFingerprint, Student, db
+from redmine_async import AsyncRedmine
+from tasks import advance_progress, report_progress
+
+ROSTER_RECHECK_HOURS = int(os.getenv("ROSTER_RECHECK_HOURS", "24"))
+UPSERT_BATCH_SIZE = 500
+
+
+@dataclass
+class RosterSyncResult:
+    projects: int = 0
+    # Projects whose memberships were fetched
+    refreshed: int = 0
+    # project_ids of students added or updated
+    changed: List[str] = field(default_factory=list)
+    failed: int = 0
+
+    def summary(self) -> dict:
+        return {
+            "synced": len(self.changed),
+            "projects": self.projects,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+        }
+
+
+def find_student(memberships) -> Optional[Tuple[str, int]]:
+    """Name and user id of the member with the student role, if any."""
+    for membership in memberships:
+        # Check if this member has the student role
+        roles = getattr(membership, "roles", [])
+        for role in roles:
+            if role.name == STUDENT_ROLE_NAME:
+                user = getattr(membership, "user", None)
+                if user:
+                    return user.name, user.id
+    return None
+
+
+def membership_hash(memberships) -> str:
+    members = []
+    for membership in memberships:
+        raw = membership.raw()
+        principal = raw.get("user") or raw.get("group") or {}
+        roles = sorted(role.get("name", "") for role in raw.get("roles", []))
+        members.append([principal.get("id"), principal.get("name"), roles])
+    members.sort(key=json.dumps)
+    return hashlib.sha256(json.dumps(members).encode("utf-8")).hexdigest()
+
+
+def upsert_students(rows: List[Dict]):
+    """Insert students or update name and user id of existing project_ids."""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = insert(Student).values(rows[start : start + UPSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Student.project_id],
+            set_={
+                "name": stmt.excluded.name,
+                "redmine_user_id": stmt.excluded.redmine_user_id,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.session.execute(stmt)
+
+
+def sync_roster(force: bool = False) -> RosterSyncResult:
+    """Sync students from the projects that changed since the last sync.
+
+    force refreshes every project.
+    """
+    return asyncio.run(_sync_roster(force))
+
+
+async def _sync_roster(force: bool) -> RosterSyncResult:
+    client = AsyncRedmine(get_redmine_client())
+    result = RosterSyncResult()
+
+    report_progress(message="Listing projects")
+    projects = await client.fetch_all(client.redmine.project)
+    fingerprints = {f.redmine_project_id: f for f in ProjectFingerprint.query.all()}
+    students = {s.project_id: s for s in Student.query.all()}
+    now = datetime.utcnow()
+    recheck_before = now - timedelta(hours=ROSTER_RECHECK_HOURS)
+
+    due = []
+    for project in projects:
+        match = PROJECT_REGEX.match(project.name)
+        if not match:
+            continue
+        result.projects += 1
+        fingerprint = fingerprints.get(project.id)
+        updated_on = project.raw().get("updated_on")
+        if (
+            force
+            or fingerprint is None
+            or fingerprint.updated_on != updated_on
+            or fingerprint.checked_at < recheck_before
+        ):
+            due.append((match.group(1), project, updated_on))
+
+    report_progress(0, len(due), "Fetching memberships")
+
+    async def _memberships(project):
+        try:
+            return await client.fetch_all(
+                client.redmine.project_membership, project_id=project.id
+            )
+        except Exception as e:
+            print(f"Failed to fetch memberships for {project.name}: {e}")
+            return None
+        finally:
+            advance_progress()
+
+    all_memberships = await asyncio.gather(
+        *(_memberships(project) for _, project, _ in due)
+    )
+
+    rows = []
+    for (project_id, project, updated_on), memberships in zip(due, all_memberships):
+        if memberships is None:
+            # Fingerprint left as is, so the next sync tries again
+            result.failed += 1
+            continue
+        result.refreshed += 1
+
+        digest = membership_hash(memberships)
+        fingerprint = fingerprints.get(project.id)
+        if fingerprint is None:
+            fingerprint = ProjectFingerprint(redmine_project_id=project.id)
+            db.session.add(fingerprint)
+        unchanged = fingerprint.membership_hash == digest
+        fingerprint.project_id = project_id
+        fingerprint.updated_on = updated_on
+        fingerprint.membership_hash = digest
+        fingerprint.checked_at = now
+
+        existing = students.get(project_id)
+        if unchanged and existing is not None:
+            continue
+        found = find_student(memberships)
+        if found is None:
+            continue
+        name, user_id = found
+        if existing is not None and existing.name == name:
+            if existing.redmine_user_id == user_id:
+                continue
+        rows.append(
+            {
+                "project_id": project_id,
+                "name": name,
+                "redmine_user_id": user_id,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        result.changed.append(project_id)
+        print(f"Synced student: {project_id} - {name}")
+
+    upsert_students(rows)
+    if rows:
+        bump(STUDENTS_SCOPE)
+    db.session.commit()
+    return result
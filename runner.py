@@ -1,89 +1,295 @@
 import os
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import socket
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Set, Union
 
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.interval import IntervalTrigger
 from dotenv import load_dotenv
-from flask import Flask
 
 load_dotenv()
 
+from burst import BURST_MAX_PARALLEL_TESTS, current_burst_state, drain_estimate
+from database import create_db_app
 from models import db, Submission
-from grader import check_all_issues, run_submission_tests, TEST_MAP
+from grader import check_all_issues, record_error, run_submission_tests, TEST_MAP
+from jobqueue import (
+    WORKER_TIMEOUT_SECONDS,
+    claim_pending,
+    heartbeat,
+    release_requeued,
+    requeue_stale_claims,
+    runner_name,
+)
+from migrations import LATEST, current_version
+from tasks import run_task
+from tracing import start_profiler_from_env
+from workspace import collect_garbage, record_disk_usage
 
+# Jobs of the scheduler besides ingest (see burst.py for its interval)
+DRAIN_INTERVAL = int(os.getenv("DRAIN_INTERVAL_SECONDS", "30"))
+ROSTER_INTERVAL = int(os.getenv("ROSTER_SYNC_INTERVAL_SECONDS", "3600"))
+GC_INTERVAL = int(os.getenv("GC_INTERVAL_SECONDS", "1800"))
+SCORE_INTERVAL = int(os.getenv("SCORE_INTERVAL_SECONDS", "120"))
+# Well within the timeout after which the runner's claims are requeued
+HEARTBEAT_INTERVAL = max(1, WORKER_TIMEOUT_SECONDS // 4)
+# A connection per test thread, plus ingest, the scheduler jobs and tasks
+RUNNER_POOL_SIZE = BURST_MAX_PARALLEL_TESTS + 4
 
-def create_app():
+
+def create_app(pool_size: int = RUNNER_POOL_SIZE):
     """Create a minimal Flask app for DB access."""
-    app = Flask(__name__)
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
-        "DATABASE_URL", "sqlite:///submissions.db"
-    )
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    db.init_app(app)
-    return app
+    return create_db_app(pool_size)
+
 
+def check_redmine(app) -> int:
+    """Check Redmine for updated issues and register pending submissions.
 
-def check_redmine(app):
-    """Check Redmine for updated issues and register pending submissions."""
+    Returns the number of registered submissions.
+    """
     with app.app_context():
         try:
-            registered = check_all_issues()
-            if registered:
-                print(f"Registered {len(registered)} new/updated submissions")
+            # Shares the lock of /api/refresh, so only one scan runs at a time
+            task_id, result = run_task(
+                "refresh", lambda: {"registered": len(check_all_issues())}
+            )
+            if task_id is None:
+                print("Skipping Redmine check: a refresh is already running")
+                return 0
+            if result["registered"]:
+                print(f"Registered {result['registered']} new/updated submissions")
+            return result["registered"]
         except Exception as e:
             print(f"Error checking Redmine: {e}")
+            return 0
+
+
+def run_pending_tests(app, max_workers: Union[int, Callable[[], int]]) -> int:
+    """Test pending submissions in parallel until none are left to claim.
 
+    max_workers may be a callable; it is re-read while draining, so burst
+    mode can scale a long drain up or down. Submissions are claimed one at
+    a time, so remote workers (worker.py) polling the same queue take their
+    share. Returns the number that were pending at the start.
+    """
+    capacity = max_workers if callable(max_workers) else lambda: max_workers
 
-def run_pending_tests(app, max_workers):
-    """Run tests for all pending submissions in parallel."""
     with app.app_context():
-        pending = Submission.query.filter_by(status="pending").all()
-        testable = [s for s in pending if s.type_id in TEST_MAP]
+        requeue_stale_claims()
+        release_requeued()
+        pending = Submission.query.filter(
+            Submission.status == "pending", Submission.type_id.in_(TEST_MAP)
+        ).count()
 
-    if not testable:
-        return
+    if not pending:
+        return 0
 
-    print(f"Running tests for {len(testable)} submissions (max_workers={max_workers})")
+    print(f"Running tests for {pending} submissions (max_workers={capacity()})")
 
     def _run_one(submission_id):
         with app.app_context():
-            sub = Submission.query.get(submission_id)
-            if sub is None:
-                return
+            sub = db.session.get(Submission, submission_id)
             try:
                 run_submission_tests(sub)
             except Exception as e:
                 print(f"Error running tests for submission {submission_id}: {e}")
-                sub.status = "error"
-                sub.other_info = str(e)
+                db.session.rollback()
+                record_error(sub, str(e))
                 db.session.commit()
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_run_one, s.id): s.id for s in testable}
-        for future in as_completed(futures):
-            sid = futures[future]
-            try:
-                future.result()
-            except Exception as e:
-                print(f"Unexpected error for submission {sid}: {e}")
+    running: Set[Future] = set()
+    upper = max(BURST_MAX_PARALLEL_TESTS, capacity())
+    with ThreadPoolExecutor(max_workers=upper) as executor:
+        while True:
+            if len(running) < capacity():
+                with app.app_context():
+                    claimed = claim_pending(runner_name(), 1, list(TEST_MAP))
+                    claimed_id = claimed[0].id if claimed else None
+                if claimed_id is not None:
+                    running.add(executor.submit(_run_one, claimed_id))
+                    continue
+                if not running:
+                    break
+            done, running = wait(running, timeout=5, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Unexpected error in test worker: {e}")
+    return pending
+
+
+def send_heartbeat(app, capacity: int, started_at: datetime):
+    """Keep the claims of this runner from being requeued as stale."""
+    with app.app_context():
+        try:
+            name = runner_name()
+            running = Submission.query.filter_by(
+                status="running", claimed_by=name
+            ).count()
+            heartbeat(
+                name,
+                host=socket.getfqdn(),
+                capacity=capacity,
+                running=running,
+                started_at=started_at,
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error sending heartbeat: {e}")
+
+
+def sync_student_roster(app):
+    """Pick up students of new or changed Redmine projects."""
+    from roster import sync_roster
+
+    with app.app_context():
+        try:
+            # Shares the lock of /api/students/sync
+            task_id, result = run_task("roster", lambda: sync_roster().summary())
+            if task_id is None:
+                print("Skipping roster sync: one is already running")
+                return
+            print(
+                f"Roster: {result['refreshed']}/{result['projects']} projects "
+                f"refreshed, {result['synced']} students updated"
+            )
+        except Exception as e:
+            print(f"Error syncing students: {e}")
+
+
+def collect_workspace_garbage(app):
+    """Remove stale workspaces and evict archives over the disk quota."""
+    with app.app_context():
+        active = Submission.query.filter(
+            Submission.status.in_(["pending", "running"])
+        ).all()
+        protected = [s.attachment_id for s in active]
+
+    try:
+        result = collect_garbage(protected)
+        usage = record_disk_usage()
+        print(
+            f"Workspace GC: freed {result.freed_bytes // 1024} KiB, "
+            f"{usage.archive_count} archives ({usage.archive_bytes // 1024} KiB), "
+            f"{usage.build_cache_count} cached builds"
+        )
+    except Exception as e:
+        print(f"Error collecting workspace garbage: {e}")
+
+
+def rematerialize_scores_job(app):
+    """Fill in scores of newly completed submissions."""
+    from score import rematerialize_scores
+
+    with app.app_context():
+        try:
+            updated = rematerialize_scores()
+            if updated:
+                print(f"Scored {updated} submissions")
+        except Exception as e:
+            print(f"Error computing scores: {e}")
+
+
+def _interval_trigger(seconds: int) -> IntervalTrigger:
+    # Jitter spreads runs so that jobs started together do not stay in step
+    return IntervalTrigger(seconds=seconds, jitter=max(1, seconds // 10))
 
 
 def main():
     app = create_app()
-    interval = int(os.getenv("RUNNER_INTERVAL_SECONDS", "300"))
-    max_workers = int(os.getenv("MAX_PARALLEL_TESTS", "2"))
 
     with app.app_context():
-        db.create_all()
+        version = current_version(db.engine)
+        if version != LATEST:
+            print(
+                f"Schema is at version {version}, expected {LATEST}; "
+                "run python migrations.py upgrade"
+            )
+            sys.exit(1)
+        state = current_burst_state()
+    # Claims of a previous run are requeued once its heartbeats time out
+    started_at = datetime.utcnow()
+    send_heartbeat(app, state.max_workers, started_at)
+
+    start_profiler_from_env()
+
+    scheduler = BlockingScheduler(
+        timezone=timezone.utc,
+        job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 60},
+    )
+    now = datetime.now(timezone.utc)
 
-    print(f"Runner started (interval={interval}s, max_workers={max_workers})")
+    def ingest():
+        if check_redmine(app):
+            # Start testing right away instead of at the next drain interval
+            scheduler.modify_job("drain", next_run_time=datetime.now(timezone.utc))
 
-    while True:
-        print("--- Checking Redmine ---")
-        check_redmine(app)
-        print("--- Running pending tests ---")
-        run_pending_tests(app, max_workers)
-        print(f"--- Sleeping {interval}s ---")
-        time.sleep(interval)
+    def drain():
+        # Re-read while draining, so burst mode applies to a drain in progress
+        if run_pending_tests(app, lambda: state.max_workers):
+            scheduler.modify_job("scores", next_run_time=datetime.now(timezone.utc))
+
+    def tune():
+        """Follow burst mode and report the expected drain time."""
+        nonlocal state
+        with app.app_context():
+            new_state = current_burst_state()
+            estimate = drain_estimate(new_state.max_workers)
+        if new_state.active != state.active:
+            if new_state.active:
+                print(
+                    f"Burst mode on for {', '.join(new_state.type_ids)}: polling "
+                    f"every {new_state.ingest_interval}s, "
+                    f"{new_state.max_workers} parallel tests"
+                )
+            else:
+                print("Burst mode off")
+        if new_state.ingest_interval != state.ingest_interval:
+            scheduler.reschedule_job(
+                "ingest", trigger=_interval_trigger(new_state.ingest_interval)
+            )
+        state = new_state
+        if estimate.pending or estimate.running:
+            late = [d["type_id"] for d in estimate.deadlines if not d["on_track"]]
+            print(
+                f"Queue: {estimate.pending} pending, {estimate.running} running, "
+                f"drained in ~{estimate.eta_seconds / 60:.0f} min"
+                + (f" (AFTER results are due for {', '.join(late)})" if late else "")
+            )
+
+    jobs = [
+        ("ingest", ingest, state.ingest_interval),
+        ("drain", drain, DRAIN_INTERVAL),
+        ("roster", lambda: sync_student_roster(app), ROSTER_INTERVAL),
+        ("gc", lambda: collect_workspace_garbage(app), GC_INTERVAL),
+        ("scores", lambda: rematerialize_scores_job(app), SCORE_INTERVAL),
+        ("tune", tune, 60),
+        (
+            "heartbeat",
+            lambda: send_heartbeat(app, state.max_workers, started_at),
+            HEARTBEAT_INTERVAL,
+        ),
+    ]
+    for job_id, func, seconds in jobs:
+        scheduler.add_job(
+            func,
+            _interval_trigger(seconds),
+            id=job_id,
+            name=job_id,
+            next_run_time=now,
+        )
+
+    print(
+        f"Runner started (interval={state.ingest_interval}s, "
+        f"max_workers={state.max_workers}, burst={state.active})"
+    )
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
 
 
 if __name__ == "__main__":
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from typing import Dict, Optional
 
-from models import Submission
+from models import Submission, TestCaseResult, db
 
 
 def program01score(input_data: Dict[str, bool], submission: Submission) -> float:
@@ -89,3 +89,39 @@ def grand_score(
         elif testsuite == "program04":
             total_score += program04score(test_result.summary, test_result.submission)
     return total_score
+
+
+# Mapping of type_id to scoring function
+SCORE_FUNCTIONS = {
+    "program01": program01score,
+    "program02": program02score,
+    "program03": program03score,
+    "program04": program04score,
+}
+
+
+def rematerialize_scores(force: bool = False, batch_size: int = 500) -> int:
+    """Compute Submission.score for completed submissions that lack one.
+
+    force recomputes every score, e.g. after a scoring function changed.
+    Returns the number of scores written.
+    """
+    query = db.session.query(Submission.id).filter(
+        Submission.status == "completed",
+        Submission.type_id.in_(SCORE_FUNCTIONS),
+    )
+    if not force:
+        query = query.filter(Submission.score.is_(None))
+    ids = [row.id for row in query]
+
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start : start + batch_size]
+        results: Dict[int, Dict[str, bool]] = {sid: {} for sid in batch}
+        for submission_id, name, outcome in db.session.query(
+            TestCaseResult.submission_id, TestCaseResult.name, TestCaseResult.outcome
+        ).filter(TestCaseResult.submission_id.in_(batch)):
+            results[submission_id][name] = outcome == "passed"
+        for sub in Submission.query.filter(Submission.id.in_(batch)):
+            sub.score = SCORE_FUNCTIONS[sub.type_id](results[sub.id], sub)
+        db.session.commit()
+    return len(ids)
@@ -0,0 +1,315 @@
+"""Source similarity index for plagiarism checks.
+
+evaluate_workspace() indexes the extracted source of every submission.
+Its .c and .h files are tokenized with comments and preprocessor lines
+dropped and identifiers, numbers and literals normalized, so renaming
+does not hide a copy. The tokens are cut into SHINGLE_SIZE-token
+shingles and summarized as a MinHash signature of SIGNATURE_SIZE values,
+all filled from a single hash per shingle (one-permutation hashing).
+Signatures are stored as SourceSignature rows, so the index grows with
+each evaluation; older submissions are backfilled with
+``python similarity.py index``.
+
+similar_pairs() finds candidates among the latest signature of each
+project with locality-sensitive hashing. Projects that share one of the
+LSH_BANDS bands of a signature are compared, so the work grows with the
+number of submissions rather than with its square.
+
+Usage:
+    python similarity.py index [type_id]
+    python similarity.py pairs <type_id> [threshold]
+"""
+
+import hashlib
+import os
+import re
+import struct
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SHINGLE_SIZE = 8
+SIGNATURE_SIZE = 128
+# 32 bands of 4 values: pairs above ~0.45 Jaccard become candidates
+LSH_BANDS = 32
+LSH_ROWS = SIGNATURE_SIZE // LSH_BANDS
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.6"))
+SIMILARITY_INDEX_WORKERS = int(os.getenv("SIMILARITY_INDEX_WORKERS", "4"))
+SOURCE_SUFFIXES = {".c", ".h"}
+# Generated or vendored files beyond this size are not indexed
+MAX_SOURCE_BYTES = 1024 * 1024
+
+_EMPTY = 1 << 32
+# Added per step when an empty bin borrows from a later one
+_DENSIFY_OFFSET = 0x9E3779B1
+
+C_KEYWORDS = frozenset(
+    """auto break case char const continue default do double else enum extern
+    float for goto if inline int long register restrict return short signed
+    sizeof static struct switch typedef union unsigned void volatile while
+    _Bool bool NULL""".split()
+)
+
+_TOKEN = re.compile(
+    r"""(?P<skip>^[ \t]*\#[^\n]*|//[^\n]*|/\*.*?(?:\*/|\Z))"""
+    r"""|(?P<string>"(?:\\.|[^"\\\n])*")"""
+    r"""|(?P<char>'(?:\\.|[^'\\\n])*')"""
+    r"""|(?P<name>[A-Za-z_]\w*)"""
+    r"""|(?P<number>\.?\d[\w.]*)"""
+    r"""|(?P<op>->|\+\+|--|<<=?|>>=?|&&|\|\||[<>=!&|+\-*/%^]=|\S)""",
+    re.S | re.M,
+)
+_PLACEHOLDERS = {"string": "S", "char": "C", "number": "N"}
+
+
+def tokenize(text: str) -> List[str]:
+    """C tokens with identifiers, numbers and literals replaced by placeholders."""
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind == "skip":
+            continue
+        if kind == "name":
+            word = match.group()
+            tokens.append(word if word in C_KEYWORDS else "I")
+        elif kind in _PLACEHOLDERS:
+            tokens.append(_PLACEHOLDERS[kind])
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+def source_tokens(root: Path) -> List[str]:
+    tokens = []
+    for path in sorted(root.rglob("*")):
+        if path.suffix not in SOURCE_SUFFIXES or "test_results" in path.parts:
+            continue
+        if not path.is_file() or path.stat().st_size > MAX_SOURCE_BYTES:
+            continue
+        tokens.extend(tokenize(path.read_text(errors="replace")))
+    return tokens
+
+
+def minhash(tokens: List[str]) -> Tuple[Optional[List[int]], int]:
+    """MinHash signature of the token shingles and the number of shingles.
+
+    Each shingle hash picks one of SIGNATURE_SIZE bins and competes for its
+    minimum; empty bins borrow from the next filled one (rotation
+    densification). None for sources shorter than one shingle.
+    """
+    shingles = {
+        " ".join(tokens[i : i + SHINGLE_SIZE])
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    }
+    if not shingles:
+        return None, 0
+    bins = [_EMPTY] * SIGNATURE_SIZE
+    for shingle in shingles:
+        h = int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        index, value = h % SIGNATURE_SIZE, h >> 32
+        if value < bins[index]:
+            bins[index] = value
+
+    signature = list(bins)
+    for i in range(SIGNATURE_SIZE):
+        if bins[i] != _EMPTY:
+            continue
+        step = 1
+        while bins[(i + step) % SIGNATURE_SIZE] == _EMPTY:
+            step += 1
+        borrowed = bins[(i + step) % SIGNATURE_SIZE]
+        signature[i] = (borrowed + step * _DENSIFY_OFFSET) & 0xFFFFFFFF
+    return signature, len(shingles)
+
+
+def pack(signature: List[int]) -> bytes:
+    return struct.pack(f"<{SIGNATURE_SIZE}I", *signature)
+
+
+def unpack(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f"<{SIGNATURE_SIZE}I", data)
+
+
+def index_source(root: Path) -> Tuple[Optional[bytes], int]:
+    """Packed signature of the source tree at root and its shingle count."""
+    signature, shingles = minhash(source_tokens(root))
+    return (pack(signature) if signature else None), shingles
+
+
+def estimate(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingles behind two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / SIGNATURE_SIZE
+
+
+@dataclass
+class SimilarPair:
+    project_a: str
+    project_b: str
+    submission_a: int
+    submission_b: int
+    similarity: float
+
+
+@dataclass
+class SimilarityReport:
+    type_id: str
+    threshold: float
+    indexed: int
+    projects: int
+    candidates: int
+    pairs: List[SimilarPair]
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+
+def _latest_submissions(type_id: str):
+    from models import Submission
+
+    submissions = (
+        Submission.query.filter(
+            Submission.type_id == type_id,
+            Submission.status.in_(["completed", "error"]),
+        )
+        .order_by(Submission.project_id, Submission.submitted_at.desc())
+        .all()
+    )
+    latest = {}
+    for sub in submissions:
+        latest.setdefault(sub.project_id, sub)
+    return latest
+
+
+def similar_pairs(type_id: str, threshold: float = SIMILARITY_THRESHOLD):
+    """Pairs of projects whose latest sources of type_id look alike."""
+    from models import SourceSignature, db
+
+    latest = _latest_submissions(type_id)
+    ids = [sub.id for sub in latest.values()]
+    rows = (
+        db.session.query(SourceSignature.submission_id, SourceSignature.signature)
+        .filter(SourceSignature.submission_id.in_(ids))
+        .all()
+        if ids
+        else []
+    )
+    by_id = {sub.id: sub for sub in latest.values()}
+    entries = [(by_id[sid], data) for sid, data in rows]
+
+    band_size = LSH_ROWS * 4
+    buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+    for index, (_, data) in enumerate(entries):
+        for band in range(LSH_BANDS):
+            key = data[band * band_size : (band + 1) * band_size]
+            buckets[(band, key)].append(index)
+    candidates = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1 :]:
+                candidates.add((a, b))
+
+    signatures = [unpack(data) for _, data in entries]
+    pairs = []
+    for a, b in candidates:
+        similarity = estimate(signatures[a], signatures[b])
+        if similarity < threshold:
+            continue
+        sub_a, sub_b = sorted([entries[a][0], entries[b][0]], key=lambda s: s.project_id)
+        pairs.append(
+            SimilarPair(
+                sub_a.project_id,
+                sub_b.project_id,
+                sub_a.id,
+                sub_b.id,
+                round(similarity, 3),
+            )
+        )
+    pairs.sort(key=lambda p: (-p.similarity, p.project_a, p.project_b))
+    return SimilarityReport(
+        type_id, threshold, len(entries), len(latest), len(candidates), pairs
+    )
+
+
+def index_missing(type_id: Optional[str] = None, workers=SIMILARITY_INDEX_WORKERS):
+    """Index the latest submissions that have no signature yet.
+
+    For submissions evaluated before the index existed. Returns the number
+    of indexed submissions.
+    """
+    from cache import bump, type_scope
+    from eval import run_extract
+    from grader import TEST_MAP, get_submission_path
+    from models import SourceSignature, db
+    from workspace import scratch_workspace
+
+    missing = []
+    for t in [type_id] if type_id else list(TEST_MAP):
+        latest = _latest_submissions(t)
+        indexed = {
+            sid
+            for (sid,) in db.session.query(SourceSignature.submission_id).filter(
+                SourceSignature.submission_id.in_([s.id for s in latest.values()])
+            )
+        }
+        for sub in latest.values():
+            archive = get_submission_path(sub.attachment_id, sub.type_id).resolve()
+            if sub.id not in indexed and archive.exists():
+                missing.append((sub.id, t, archive))
+
+    def _index(item):
+        submission_id, type_of, archive = item
+        try:
+            with scratch_workspace(archive, f"index-{submission_id}") as work_dir:
+                return submission_id, type_of, index_source(run_extract(work_dir))
+        except Exception as e:
+            print(f"Failed to index submission {submission_id}: {e}")
+            return submission_id, type_of, (None, 0)
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for submission_id, type_of, (signature, shingles) in executor.map(
+            _index, missing
+        ):
+            if signature is None:
+                continue
+            SourceSignature.save(submission_id, signature, shingles)
+            bump(type_scope(type_of))
+            db.session.commit()
+            count += 1
+    return count
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "index"
+    from database import create_db_app
+
+    app = create_db_app()
+    with app.app_context():
+        if command == "index":
+            type_id = sys.argv[2] if len(sys.argv) > 2 else None
+            print(f"Indexed {index_missing(type_id)} submissions")
+        elif command == "pairs" and len(sys.argv) > 2:
+            threshold = float(sys.argv[3]) if len(sys.argv) > 3 else SIMILARITY_THRESHOLD
+            report = similar_pairs(sys.argv[2], threshold)
+            print(
+                f"{report.indexed}/{report.projects} projects indexed, "
+                f"{report.candidates} candidates, {len(report.pairs)} pairs"
+            )
+            for pair in report.pairs:
+                print(f"{pair.similarity:.2f} {pair.project_a} {pair.project_b}")
+        else:
+            print(f"Unknown command: {' '.join(sys.argv[1:])}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
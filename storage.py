@@ -0,0 +1,75 @@
+import os
+import zlib
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Per-case actual output kept for failed test cases
+CASE_OUTPUT_LIMIT = int(os.getenv("CASE_OUTPUT_LIMIT_BYTES", str(64 * 1024)))
+# Cached diff against the expected output
+CASE_DIFF_LIMIT = int(os.getenv("CASE_DIFF_LIMIT_BYTES", str(64 * 1024)))
+# lpptest stdout and suite logs kept per submission
+SUBMISSION_LOG_LIMIT = int(os.getenv("SUBMISSION_LOG_LIMIT_BYTES", str(1024 * 1024)))
+
+TRUNCATION_MARKER = "\n\n... [{omitted} bytes truncated] ...\n\n"
+
+
+def _marker(omitted: int) -> bytes:
+    return TRUNCATION_MARKER.format(omitted=omitted).encode("utf-8")
+
+
+def _kept_half(size: int, limit: int) -> int:
+    """Bytes kept from each end of size bytes so that, with the marker, they fit.
+
+    The marker for all size bytes omitted is at least as long as the real one.
+    """
+    return max(0, (limit - len(_marker(size))) // 2)
+
+
+def truncate_bytes(data: bytes, limit: int) -> Tuple[bytes, bool]:
+    """Keep the head and tail of data within limit bytes, with a marker between."""
+    if len(data) <= limit:
+        return data, False
+    half = _kept_half(len(data), limit)
+    tail = data[len(data) - half :]
+    return data[:half] + _marker(len(data) - 2 * half) + tail, True
+
+
+def read_capped(path: Path, limit: int) -> Tuple[bytes, bool]:
+    """Read at most limit bytes (head and tail) from path without loading it all.
+
+    Runaway programs can write gigabytes, so only the two ends are read.
+    """
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        if size <= limit:
+            return f.read(), False
+        half = _kept_half(size, limit)
+        head = f.read(half)
+        f.seek(size - half)
+        tail = f.read(half)
+    return head + _marker(size - 2 * half) + tail, True
+
+
+def compress_text(text: str, limit: int) -> bytes:
+    """Truncate text to limit bytes (head and tail) and zlib-compress it."""
+    data, _ = truncate_bytes(text.encode("utf-8", errors="replace"), limit)
+    return zlib.compress(data)
+
+
+def compress_text_with_info(text: str, limit: int) -> Tuple[bytes, int, bool]:
+    """Like compress_text, also returning the original size and truncation flag."""
+    data = text.encode("utf-8", errors="replace")
+    size = len(data)
+    data, truncated = truncate_bytes(data, limit)
+    return zlib.compress(data), size, truncated
+
+
+def compress_bytes(data: bytes, limit: int) -> bytes:
+    data, _ = truncate_bytes(data, limit)
+    return zlib.compress(data)
+
+
+def decompress_text(blob: Optional[bytes]) -> str:
+    if not blob:
+        return ""
+    return zlib.decompress(blob).decode("utf-8", errors="replace")
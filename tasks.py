@@ -0,0 +1,249 @@
+"""Background tasks started from the web UI or the runner.
+
+Long Redmine walks (/api/refresh, /api/students/sync) run on a thread of
+their own instead of inside the request. Each task is a BackgroundTask
+row with progress and a result, polled through /api/tasks/<id>, so any
+dashboard worker can answer for a task another one started.
+
+Only one task of a kind runs at a time across all processes: starting
+one inserts the kind's TaskLock row, and a kind that is already locked
+returns the running task instead, so several people clicking "Refresh"
+and the runner's own ingest share one scan. While a task runs, a
+heartbeat thread writes its progress and refreshes the lock; a lock
+whose heartbeat is older than TASK_LOCK_TIMEOUT_SECONDS was left by a
+dead process and is taken over.
+"""
+
+import json
+import os
+import secrets
+import threading
+import traceback
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import BackgroundTask, TaskLock, db
+
+# Finished tasks kept for status queries
+KEEP_FINISHED = 50
+TASK_HEARTBEAT_SECONDS = float(os.getenv("TASK_HEARTBEAT_SECONDS", "1"))
+TASK_LOCK_TIMEOUT_SECONDS = int(os.getenv("TASK_LOCK_TIMEOUT_SECONDS", "60"))
+
+_tasks = BackgroundTask.__table__
+_locks = TaskLock.__table__
+
+
+@dataclass
+class _Progress:
+    """Progress of the running task, written out by its heartbeat."""
+
+    done: int = 0
+    total: Optional[int] = None
+    message: str = ""
+
+
+_current_progress: ContextVar[Optional[_Progress]] = ContextVar(
+    "task_progress", default=None
+)
+
+
+def _claim(engine, kind: str) -> Tuple[str, bool]:
+    """Lock kind for a new task; or the id of the task holding the lock.
+
+    Task state is written on connections of its own, never through
+    db.session, so it does not commit the task function's pending work.
+    """
+    task_id = secrets.token_hex(8)
+    # The lock can be released between a failed insert and the lookup
+    for _ in range(3):
+        now = datetime.utcnow()
+        new_task = insert(_tasks).values(
+            id=task_id, kind=kind, status="running", started_at=now, done=0
+        )
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    insert(_locks).values(kind=kind, task_id=task_id, heartbeat_at=now)
+                )
+                conn.execute(new_task)
+            return task_id, True
+        except IntegrityError:
+            pass
+
+        with engine.begin() as conn:
+            lock = conn.execute(select(_locks).where(_locks.c.kind == kind)).first()
+            if lock is None:
+                continue
+            if lock.heartbeat_at >= now - timedelta(seconds=TASK_LOCK_TIMEOUT_SECONDS):
+                return lock.task_id, False
+            # Conditional on the old holder, so only one process takes it over
+            taken = conn.execute(
+                update(_locks)
+                .where(_locks.c.kind == kind, _locks.c.task_id == lock.task_id)
+                .values(task_id=task_id, heartbeat_at=now)
+            ).rowcount
+            if not taken:
+                continue
+            conn.execute(
+                update(_tasks)
+                .where(_tasks.c.id == lock.task_id, _tasks.c.status == "running")
+                .values(status="error", finished_at=now, message="Abandoned")
+            )
+            conn.execute(new_task)
+        print(f"Took over the {kind} task lock from abandoned task {lock.task_id}")
+        return task_id, True
+    raise Exception(f"Could not lock the {kind} task")
+
+
+def _write_progress(engine, kind: str, task_id: str, progress: _Progress):
+    with engine.begin() as conn:
+        conn.execute(
+            update(_tasks)
+            .where(_tasks.c.id == task_id)
+            .values(
+                done=progress.done, total=progress.total, message=progress.message
+            )
+        )
+        conn.execute(
+            update(_locks)
+            .where(_locks.c.kind == kind, _locks.c.task_id == task_id)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+
+
+def _heartbeat(engine, kind: str, task_id: str, progress: _Progress, stop):
+    while not stop.wait(TASK_HEARTBEAT_SECONDS):
+        try:
+            _write_progress(engine, kind, task_id, progress)
+        except Exception as e:
+            print(f"Task {task_id} heartbeat failed: {e}")
+
+
+def _execute(engine, kind: str, task_id: str, fn: Callable[[], Any]) -> Any:
+    """Run fn as task_id, then store its result and release the lock."""
+    progress = _Progress()
+    _current_progress.set(progress)
+    stop = threading.Event()
+    threading.Thread(
+        target=_heartbeat,
+        args=(engine, kind, task_id, progress, stop),
+        name=f"task-{kind}-heartbeat",
+        daemon=True,
+    ).start()
+    values = {}
+    try:
+        result = fn()
+        values = {"status": "completed", "result": json.dumps(result)}
+        return result
+    except Exception as e:
+        traceback.print_exc()
+        values = {"status": "error"}
+        progress.message = str(e)
+        raise
+    finally:
+        stop.set()
+        _current_progress.set(None)
+        with engine.begin() as conn:
+            conn.execute(
+                update(_tasks)
+                .where(_tasks.c.id == task_id)
+                .values(
+                    finished_at=datetime.utcnow(),
+                    done=progress.done,
+                    total=progress.total,
+                    message=progress.message,
+                    **values,
+                )
+            )
+            conn.execute(
+                delete(_locks).where(
+                    _locks.c.kind == kind, _locks.c.task_id == task_id
+                )
+            )
+            _prune(conn)
+
+
+def _prune(conn, keep_finished: int = KEEP_FINISHED):
+    stale = (
+        select(_tasks.c.id)
+        .where(_tasks.c.status != "running")
+        .order_by(_tasks.c.started_at.desc())
+        .offset(keep_finished)
+    )
+    ids = [task_id for (task_id,) in conn.execute(stale)]
+    if ids:
+        conn.execute(delete(_tasks).where(_tasks.c.id.in_(ids)))
+
+
+def start_task(app, kind: str, fn: Callable[[], Any]) -> Tuple[str, bool]:
+    """Run fn in an app context on a new thread, unless kind is running.
+
+    Returns the task id and whether it was newly started; the id is that
+    of the running task otherwise.
+    """
+    engine = db.engine
+    task_id, started = _claim(engine, kind)
+    if not started:
+        return task_id, False
+
+    def run():
+        with app.app_context():
+            try:
+                _execute(engine, kind, task_id, fn)
+            except Exception:
+                # Recorded on the task row
+                pass
+
+    threading.Thread(target=run, name=f"task-{kind}", daemon=True).start()
+    return task_id, True
+
+
+def run_task(kind: str, fn: Callable[[], Any]) -> Tuple[Optional[str], Any]:
+    """Run fn on this thread as a task of kind, unless kind is running.
+
+    Returns (task id, result), or (None, None) if another task of kind is
+    running. Exceptions of fn propagate after being recorded.
+    """
+    engine = db.engine
+    task_id, started = _claim(engine, kind)
+    if not started:
+        return None, None
+    return task_id, _execute(engine, kind, task_id, fn)
+
+
+def get_task(task_id: str) -> Optional[BackgroundTask]:
+    return db.session.get(BackgroundTask, task_id)
+
+
+def recent_tasks(limit: int = KEEP_FINISHED) -> List[BackgroundTask]:
+    return (
+        BackgroundTask.query.order_by(BackgroundTask.started_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def report_progress(
+    done: Optional[int] = None, total: Optional[int] = None, message: str = None
+):
+    """Update the progress of the task running this code (no-op outside tasks)."""
+    progress = _current_progress.get()
+    if progress is None:
+        return
+    if done is not None:
+        progress.done = done
+    if total is not None:
+        progress.total = total
+    if message is not None:
+        progress.message = message
+
+
+def advance_progress(step: int = 1):
+    progress = _current_progress.get()
+    if progress is not None:
+        progress.done += step
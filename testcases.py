@@ -1,18 +1,28 @@
+import difflib
+import hashlib
+import json
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import List
-import lpp_collector
+from typing import Dict, List
 
-# Too dirty work...
-TEST_CASE_DIR = Path(lpp_collector.__file__).parent / "testcases"
 
+@lru_cache(maxsize=None)
+def test_case_dir() -> Path:
+    # Imported on first use, off the startup path of app.py
+    import lpp_collector
 
+    # Too dirty work...
+    return Path(lpp_collector.__file__).parent / "testcases"
+
+
+@lru_cache(maxsize=None)
 def get_testcase(testsuite: str, basename: str):
     testcase_num = int(testsuite[1:2])
     # num = 2 -> dir target are input02, input01
     targets = [f"input{str(i).zfill(2)}" for i in range(1, testcase_num + 1)]
     for target in targets:
-        path = TEST_CASE_DIR / target / f"{basename}.mpl"
+        path = test_case_dir() / target / f"{basename}.mpl"
         if path.exists():
             return path.read_text()
     if testcase_num == 4:
@@ -20,8 +30,9 @@ def get_testcase(testsuite: str, basename: str):
     raise FileNotFoundError(f"Testcase {basename} not found in {testsuite}")
 
 
+@lru_cache(maxsize=None)
 def get_testcase_expect(testsuite: str, basename: str, type: str):
-    path = TEST_CASE_DIR / testsuite / "test_expects" / f"{basename}.{type}"
+    path = test_case_dir() / testsuite / "test_expects" / f"{basename}.{type}"
     if not path.exists():
         return ""
     return path.read_text()
@@ -36,15 +47,11 @@ class TestcasePair:
     test_expect_stderr: str
 
 
-def create_testcase_result_pair(testsuite: str, result_dir: Path) -> List[TestcasePair]:
-    all_outputs = result_dir.glob("*.out")
+def create_testcase_pairs(testsuite: str, outputs: Dict[str, str]) -> List[TestcasePair]:
+    """Build pairs from actual outputs keyed by test case basename."""
     pairs = []
-    for output in all_outputs:
-        basename = output.stem
-        if basename.endswith(".mpl"):
-            basename = basename[:-4]
+    for basename, test_output in outputs.items():
         test_input = get_testcase(testsuite, basename)
-        test_output = output.read_text()
         test_expect_stdout = get_testcase_expect(testsuite, basename, "stdout")
         test_expect_stderr = get_testcase_expect(testsuite, basename, "stderr")
         pairs.append(
@@ -60,6 +67,40 @@ def create_testcase_result_pair(testsuite: str, result_dir: Path) -> List[Testca
     return pairs
 
 
+def create_testcase_result_pair(testsuite: str, result_dir: Path) -> List[TestcasePair]:
+    outputs = {}
+    for output in result_dir.glob("*.out"):
+        basename = output.stem
+        if basename.endswith(".mpl"):
+            basename = basename[:-4]
+        outputs[basename] = output.read_text()
+
+    return create_testcase_pairs(testsuite, outputs)
+
+
+def case_basename(name: str) -> str:
+    """Corpus basename of a case, e.g. test_run[sample11p.mpl] -> sample11p."""
+    if "[" in name and "]" in name:
+        name = name[name.index("[") + 1 : name.index("]")]
+    if name.endswith(".mpl"):
+        name = name[:-4]
+    return name
+
+
+def diff_case_output(testsuite: str, name: str, test_output: str) -> str:
+    """Unified diff of a case's actual output against the expected stdout."""
+    basename = case_basename(name)
+    expected = get_testcase_expect(testsuite, basename, "stdout")
+    return "".join(
+        difflib.unified_diff(
+            expected.splitlines(keepends=True),
+            test_output.splitlines(keepends=True),
+            fromfile=f"{basename}.stdout (expected)",
+            tofile=f"{basename}.out (actual)",
+        )
+    )
+
+
 def shorten_testcase(name: str) -> str:
     if name.startswith("test_idempotency["):
         return f"id[{name[16:-1]}]".replace(".mpl", "").replace("sample", "")
@@ -68,3 +109,98 @@ def shorten_testcase(name: str) -> str:
         end = name.index("]")
         return name[start + 1 : end].replace(".mpl", "").replace("sample", "")
     return name
+
+
+def corpus_inputs(testsuite: str) -> Dict[str, Path]:
+    """Input file of every case of a suite, keyed by basename."""
+    testcase_num = int(testsuite[1:2])
+    inputs: Dict[str, Path] = {}
+    for i in range(1, testcase_num + 1):
+        input_dir = test_case_dir() / f"input{str(i).zfill(2)}"
+        for path in sorted(input_dir.glob("*.mpl")):
+            # Earlier inputNN directories win, as in get_testcase()
+            inputs.setdefault(path.stem, path)
+    return inputs
+
+
+def _corpus_files(testsuites: List[str]) -> Dict[str, Dict[str, List[Path]]]:
+    """Input and expected output files of every case, per suite."""
+    suites = {}
+    for testsuite in testsuites:
+        files: Dict[str, List[Path]] = {
+            basename: [path] for basename, path in corpus_inputs(testsuite).items()
+        }
+        for path in (test_case_dir() / testsuite / "test_expects").glob("*.std*"):
+            files.setdefault(path.stem, []).append(path)
+        suites[testsuite] = files
+    return suites
+
+
+def _corpus_dirs(testsuites: List[str]) -> List[Path]:
+    """Directories holding the files of testsuites."""
+    count = max(int(testsuite[1:2]) for testsuite in testsuites)
+    dirs = [test_case_dir() / f"input{str(i).zfill(2)}" for i in range(1, count + 1)]
+    return dirs + [test_case_dir() / t / "test_expects" for t in testsuites]
+
+
+# (testsuites) -> (directory mtimes, manifest, version) of the last hashing
+_manifests: Dict[tuple, tuple] = {}
+
+
+def _corpus(testsuites: List[str]) -> tuple:
+    """Manifest and version of testsuites.
+
+    Hashed again only when a corpus directory changed. Installing
+    lpp_collector replaces the files, which changes their directories;
+    editing a file in place without replacing it is not noticed until
+    the process restarts.
+    """
+    mtimes = []
+    for directory in _corpus_dirs(testsuites):
+        try:
+            mtimes.append(directory.stat().st_mtime_ns)
+        except FileNotFoundError:
+            mtimes.append(None)
+    mtimes = tuple(mtimes)
+    key = tuple(testsuites)
+    cached = _manifests.get(key)
+    if cached is not None and cached[0] == mtimes:
+        return cached[1], cached[2]
+
+    suites = _corpus_files(testsuites)
+    manifest = {}
+    for testsuite, files in suites.items():
+        cases = {}
+        for basename, paths in sorted(files.items()):
+            h = hashlib.sha256()
+            for path in sorted(paths):
+                h.update(path.name.encode("utf-8") + b"\0" + path.read_bytes())
+            cases[basename] = h.hexdigest()
+        manifest[testsuite] = cases
+    version = manifest_version(manifest)
+    _manifests[key] = (mtimes, manifest, version)
+    return manifest, version
+
+
+def corpus_manifest(testsuites: List[str]) -> Dict[str, Dict[str, str]]:
+    """sha256 of input and expected outputs per case, per suite.
+
+    Follows changes of the installed corpus, unlike get_testcase(); the
+    result is shared between calls and must not be modified.
+    """
+    return _corpus(testsuites)[0]
+
+
+def manifest_version(manifest: Dict[str, Dict[str, str]]) -> str:
+    data = json.dumps(manifest, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def changed_cases(old: Dict[str, str], new: Dict[str, str]) -> List[str]:
+    """Basenames of cases added, removed or modified between two suite manifests."""
+    names = old.keys() | new.keys()
+    return sorted(name for name in names if old.get(name) != new.get(name))
+
+
+def corpus_version(testsuites: List[str]) -> str:
+    return _corpus(testsuites)[1]
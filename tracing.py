@@ -0,0 +1,309 @@
+"""Tracing spans and an optional sampling profiler.
+
+Spans wrap container runs (eval._call_container), Redmine requests made
+through get_redmine_client() and, when instrumented, SQL statements.
+They are only collected when an exporter is configured:
+
+    TRACE_FILE=traces.jsonl           one Zipkin v2 JSON span per line
+    TRACE_COLLECTOR_URL=http://localhost:9411/api/v2/spans
+                                      POSTed in batches (Zipkin v2 JSON,
+                                      accepted by Zipkin, Jaeger and the
+                                      OpenTelemetry collector)
+    TRACE_SAMPLE_RATE=1.0             share of traces that are kept
+
+Setting PROFILE_FILE makes the runner sample its own stacks and write them
+in collapsed format (flamegraph.pl / speedscope).
+"""
+
+import atexit
+import json
+import os
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "lpp-eval")
+PROFILE_FILE = os.getenv("PROFILE_FILE", "")
+PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", "10"))
+
+# Attributes that child spans copy from their parent
+INHERITED_ATTRIBUTES = ("attachment_id", "suite")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    sampled: bool
+    kind: Optional[str] = None
+    start_us: int = 0
+    duration_us: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_zipkin(self) -> dict:
+        data = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": self.start_us,
+            "duration": self.duration_us,
+            "localEndpoint": {"serviceName": TRACE_SERVICE_NAME},
+            "tags": {k: str(v) for k, v in self.attributes.items()},
+        }
+        if self.parent_id:
+            data["parentId"] = self.parent_id
+        if self.kind:
+            data["kind"] = self.kind
+        return data
+
+
+class _Exporter:
+    """Batches finished spans on a background thread."""
+
+    def __init__(self, file_path: str, collector_url: str, flush_interval=1.0):
+        self.file_path = file_path
+        self.collector_url = collector_url
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _drain(self) -> List[dict]:
+        spans = []
+        while True:
+            try:
+                spans.append(self.queue.get_nowait().to_zipkin())
+            except queue.Empty:
+                return spans
+
+    def flush(self):
+        spans = self._drain()
+        if not spans:
+            return
+        try:
+            if self.file_path:
+                with open(self.file_path, "a") as f:
+                    for data in spans:
+                        f.write(json.dumps(data) + "\n")
+            if self.collector_url:
+                request = urllib.request.Request(
+                    self.collector_url,
+                    data=json.dumps(spans).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            print(f"Failed to export {len(spans)} spans: {e}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+_exporter: Optional[_Exporter] = None
+if TRACE_FILE or TRACE_COLLECTOR_URL:
+    _exporter = _Exporter(TRACE_FILE, TRACE_COLLECTOR_URL)
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def _new_span(name: str, kind: Optional[str], attributes: Dict[str, Any]) -> Span:
+    parent = _current_span.get()
+    if parent is None:
+        trace_id = secrets.token_hex(16)
+        sampled = random.random() < TRACE_SAMPLE_RATE
+        inherited = {}
+    else:
+        trace_id = parent.trace_id
+        sampled = parent.sampled
+        inherited = {
+            k: parent.attributes[k]
+            for k in INHERITED_ATTRIBUTES
+            if k in parent.attributes
+        }
+    return Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        sampled=sampled,
+        kind=kind,
+        start_us=int(time.time() * 1_000_000),
+        attributes={**inherited, **attributes},
+    )
+
+
+@contextmanager
+def span(name: str, kind: Optional[str] = None, **attributes):
+    """Trace the enclosed block. Yields the Span, or None if tracing is off."""
+    if _exporter is None:
+        yield None
+        return
+
+    current = _new_span(name, kind, attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.set_attribute("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current, started)
+
+
+def _finish(current: Span, started: float):
+    current.duration_us = int((time.perf_counter() - started) * 1_000_000)
+    if current.sampled:
+        _exporter.export(current)
+
+
+def set_attribute(key: str, value: Any):
+    """Set an attribute on the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+@lru_cache(maxsize=None)
+def tracing_engine():
+    """python-redmine engine class that wraps every request in a span."""
+    from redminelib.engines.sync import SyncEngine
+
+    class TracingEngine(SyncEngine):
+        def request(self, method, url, headers=None, params=None, data=None):
+            with span(
+                f"redmine {method.upper()}",
+                kind="CLIENT",
+                **{"http.method": method.upper(), "http.url": url},
+            ):
+                return super().request(method, url, headers, params, data)
+
+    return TracingEngine
+
+
+def instrument_sqlalchemy(engine):
+    """Record a span for every SQL statement executed on engine within a trace."""
+    if _exporter is None:
+        return
+
+    from sqlalchemy import event
+
+    # SQL spans are leaves: they are never made the current span, so a
+    # statement that fails (ending in handle_error, not after_cursor_execute)
+    # cannot leave one behind as the parent of everything that follows
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # Only statements issued inside a traced operation are recorded
+        if _current_span.get() is None:
+            context._trace_span = None
+            return
+        attributes = {"db.statement": statement[:200]}
+        context._trace_span = (
+            _new_span("sql", "CLIENT", attributes),
+            time.perf_counter(),
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        if getattr(context, "_trace_span", None) is not None:
+            _finish(*context._trace_span)
+            context._trace_span = None
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        if getattr(context, "_trace_span", None) is not None:
+            error = exception_context.original_exception
+            context._trace_span[0].set_attribute(
+                "error", f"{type(error).__name__}: {error}"
+            )
+            _finish(*context._trace_span)
+            context._trace_span = None
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads and counts them in collapsed form."""
+
+    def __init__(self, output: str, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.output = output
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self.write()
+
+    def _sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        last_write = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self._sample()
+            if time.monotonic() - last_write > 60:
+                self.write()
+                last_write = time.monotonic()
+
+    def write(self):
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        with open(self.output, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def start_profiler_from_env() -> Optional[SamplingProfiler]:
+    if not PROFILE_FILE:
+        return None
+    print(f"Sampling profiler writing to {PROFILE_FILE}")
+    return SamplingProfiler(PROFILE_FILE).start()
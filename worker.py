@@ -0,0 +1,193 @@
+"""Remote test worker.
+
+Runs on any Linux host with docker and the test image. Claims pending
+submissions from the coordinator (the /api/worker endpoints of app.py),
+downloads their archives, tests them with the local docker daemon and
+posts the results back. The runner on the coordinator keeps testing
+locally; both take submissions from the same queue (see jobqueue.py).
+
+    COORDINATOR_URL=http://grader.example:5000
+    WORKER_TOKEN=...              same value as on the coordinator
+    WORKER_NAME=lab-pc-12         defaults to the host name
+    WORKER_CAPACITY=2             submissions tested in parallel
+    WORKER_POLL_SECONDS=10        also the heartbeat interval
+
+Usage:
+    python worker.py
+"""
+
+import json
+import os
+import socket
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from eval import TEST_DOCKER_IMAGE
+from grader import EXT_MAP, Evaluation, evaluate_workspace
+from metrics import recording, stage
+from workspace import OUTPUT_DIR, collect_garbage, scratch_workspace
+
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "http://localhost:5000").rstrip("/")
+WORKER_TOKEN = os.getenv("WORKER_TOKEN", "")
+WORKER_NAME = os.getenv("WORKER_NAME", socket.gethostname())
+WORKER_CAPACITY = int(os.getenv("WORKER_CAPACITY", "2"))
+WORKER_POLL_SECONDS = int(os.getenv("WORKER_POLL_SECONDS", "10"))
+GC_INTERVAL_SECONDS = 600
+
+
+class CoordinatorClient:
+    def __init__(self, url: str, token: str, name: str):
+        self.url = url
+        self.token = token
+        self.name = name
+
+    def _open(self, method: str, path: str, payload=None, timeout=30):
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "X-Worker-Name": self.name,
+        }
+        data = None
+        if payload is not None:
+            data = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(
+            self.url + path, data=data, headers=headers, method=method
+        )
+        return urllib.request.urlopen(request, timeout=timeout)
+
+    def post(self, path: str, payload: dict, timeout=30) -> dict:
+        with self._open("POST", path, payload, timeout) as response:
+            return json.loads(response.read())
+
+    def download(self, path: str, dest: Path):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        partial = dest.with_name(dest.name + ".part")
+        with self._open("GET", path, timeout=120) as response, open(
+            partial, "wb"
+        ) as f:
+            while chunk := response.read(1024 * 1024):
+                f.write(chunk)
+        partial.replace(dest)
+
+
+def run_job(client: CoordinatorClient, job: dict):
+    """Test one claimed submission and report the result."""
+    submission_id = job["submission_id"]
+    label = f"{job['project_id']}/{job['type_id']}"
+    print(f"Testing {label} ({job['attachment_id']})")
+
+    # Attachments never change, so a cached archive can be reused
+    archive = (
+        OUTPUT_DIR / job["attachment_id"] / f"submission{EXT_MAP[job['type_id']]}"
+    )
+
+    def on_progress(progress: str):
+        client.post(
+            f"/api/worker/jobs/{submission_id}/progress", {"progress": progress}
+        )
+
+    with recording() as recorder:
+        try:
+            if not archive.exists():
+                with stage("download"):
+                    client.download(
+                        f"/api/worker/jobs/{submission_id}/archive", archive
+                    )
+            with scratch_workspace(archive, job["attachment_id"]) as work_dir:
+                evaluation = evaluate_workspace(
+                    work_dir,
+                    job["type_id"],
+                    job.get("include_cases", []),
+                    on_progress,
+                    job.get("suites"),
+                )
+        except Exception as e:
+            print(f"Failed to test {label}: {e}")
+            evaluation = Evaluation("error", f"Worker {client.name} failed: {e}")
+
+    stages = {
+        name: [started_at.isoformat(), duration]
+        for name, (started_at, duration) in recorder.timings.items()
+    }
+    try:
+        client.post(
+            f"/api/worker/jobs/{submission_id}/result",
+            {"evaluation": evaluation.to_json(), "stages": stages},
+            timeout=120,
+        )
+        print(f"Reported {label}: {evaluation.status}")
+    except urllib.error.HTTPError as e:
+        if e.code == 409:
+            print(f"Dropped result of {label}: claim was revoked")
+        else:
+            print(f"Failed to report {label}: {e}")
+    except Exception as e:
+        print(f"Failed to report {label}: {e}")
+
+
+def main():
+    if not WORKER_TOKEN:
+        raise SystemExit("WORKER_TOKEN is not set")
+
+    client = CoordinatorClient(COORDINATOR_URL, WORKER_TOKEN, WORKER_NAME)
+    executor = ThreadPoolExecutor(max_workers=WORKER_CAPACITY)
+    running: Set[Future] = set()
+    active: List[str] = []
+    started_at = datetime.utcnow().isoformat()
+    last_gc = 0.0
+
+    print(
+        f"Worker {WORKER_NAME} started (coordinator={COORDINATOR_URL}, "
+        f"capacity={WORKER_CAPACITY})"
+    )
+
+    while True:
+        running = {f for f in running if not f.done()}
+        try:
+            client.post(
+                "/api/worker/heartbeat",
+                {
+                    "name": WORKER_NAME,
+                    "host": socket.getfqdn(),
+                    "capacity": WORKER_CAPACITY,
+                    "running": len(running),
+                    "image": TEST_DOCKER_IMAGE,
+                    "started_at": started_at,
+                },
+            )
+            free = WORKER_CAPACITY - len(running)
+            if free > 0:
+                jobs = client.post(
+                    "/api/worker/claim", {"name": WORKER_NAME, "slots": free}
+                )["jobs"]
+                for job in jobs:
+                    active.append(job["attachment_id"])
+                    future = executor.submit(run_job, client, job)
+                    future.add_done_callback(
+                        lambda _, a=job["attachment_id"]: active.remove(a)
+                    )
+                    running.add(future)
+        except Exception as e:
+            print(f"Coordinator unreachable: {e}")
+
+        if time.monotonic() - last_gc > GC_INTERVAL_SECONDS:
+            try:
+                collect_garbage(list(active))
+            except Exception as e:
+                print(f"Error collecting workspace garbage: {e}")
+            last_gc = time.monotonic()
+
+        time.sleep(WORKER_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Workspace lifecycle for submissions.
+
+OUTPUT_DIR/<attachment_id>/ only keeps the pristine downloaded archive.
+Every test run extracts and builds in a fresh scratch copy under
+WORKSPACE_DIR, which is removed afterwards; built copies kept for
+interactive runs (interactive.py) live under RUN_WORKSPACE_DIR.
+collect_garbage() keeps the whole tree under a disk quota and the build
+cache (buildcache.py) under its own. Walking the tree is slow, so the
+runner's GC job records the usage (record_disk_usage()) for /metrics to
+read.
+
+Usage:
+    python workspace.py stats
+    python workspace.py gc
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from buildcache import cache_usage, prune
+from eval import RUN_WORKSPACE_DIR, TEST_TEMP_DIR
+
+OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "./output"))
+WORKSPACE_DIR = Path(os.getenv("WORKSPACE_DIR", "./workspaces"))
+KEEP_WORKSPACES = os.getenv("KEEP_WORKSPACES", "false").lower() == "true"
+
+DISK_QUOTA_BYTES = int(os.getenv("DISK_QUOTA_MB", "10240")) * 1024 * 1024
+# Archives not used for this long are removed (0 disables age-based cleanup)
+ARCHIVE_MAX_AGE_SECONDS = int(os.getenv("ARCHIVE_MAX_AGE_DAYS", "120")) * 86400
+# Scratch copies and test reports older than this belong to crashed runs
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_HOURS", "6")) * 3600
+TEMP_MAX_AGE_SECONDS = int(os.getenv("TEMP_MAX_AGE_HOURS", "1")) * 3600
+
+ARCHIVE_PREFIX = "submission"
+# Last disk usage measured by record_disk_usage()
+DISK_USAGE_FILE = OUTPUT_DIR / ".disk_usage.json"
+
+
+def _tree_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _archive_dirs() -> List[Path]:
+    if not OUTPUT_DIR.exists():
+        return []
+    return [p for p in OUTPUT_DIR.iterdir() if p.is_dir()]
+
+
+def _last_used(archive_dir: Path) -> float:
+    archives = list(archive_dir.glob(f"{ARCHIVE_PREFIX}.*"))
+    if not archives:
+        return archive_dir.stat().st_mtime
+    return max(a.stat().st_mtime for a in archives)
+
+
+@contextmanager
+def scratch_workspace(archive: Path, label: str = ""):
+    """Yield a fresh directory holding a copy of archive.
+
+    The archive itself is never modified; its mtime is bumped so that
+    collect_garbage() evicts the least recently used archives first.
+    """
+    WORKSPACE_DIR.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix=f"{label}-", dir=WORKSPACE_DIR)).resolve()
+    try:
+        shutil.copyfile(archive, path / archive.name)
+        os.utime(archive)
+        yield path
+    finally:
+        if not KEEP_WORKSPACES:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@dataclass
+class DiskUsage:
+    archive_bytes: int = 0
+    archive_count: int = 0
+    scratch_bytes: int = 0
+    scratch_count: int = 0
+    temp_bytes: int = 0
+    temp_count: int = 0
+    build_cache_bytes: int = 0
+    build_cache_count: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return (
+            self.archive_bytes
+            + self.scratch_bytes
+            + self.temp_bytes
+            + self.build_cache_bytes
+        )
+
+
+def disk_usage() -> DiskUsage:
+    """Measure disk use of archives, scratch workspaces and test temp files."""
+    usage = DiskUsage()
+    for archive_dir in _archive_dirs():
+        usage.archive_bytes += _tree_size(archive_dir)
+        usage.archive_count += 1
+    for directory in (WORKSPACE_DIR, RUN_WORKSPACE_DIR):
+        if not directory.exists():
+            continue
+        for path in directory.iterdir():
+            usage.scratch_bytes += _tree_size(path)
+            usage.scratch_count += 1
+    if TEST_TEMP_DIR.exists():
+        for path in TEST_TEMP_DIR.iterdir():
+            usage.temp_bytes += _tree_size(path)
+            usage.temp_count += 1
+    usage.build_cache_bytes, usage.build_cache_count = cache_usage()
+    return usage
+
+
+def record_disk_usage() -> DiskUsage:
+    """Measure disk use and store it in DISK_USAGE_FILE."""
+    usage = disk_usage()
+    DISK_USAGE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = DISK_USAGE_FILE.with_name(f"{DISK_USAGE_FILE.name}.{os.getpid()}")
+    tmp.write_text(json.dumps({**asdict(usage), "measured_at": time.time()}))
+    os.replace(tmp, DISK_USAGE_FILE)
+    return usage
+
+
+def recorded_disk_usage() -> Optional[Tuple[DiskUsage, float]]:
+    """The last recorded disk usage and when it was measured, if any."""
+    try:
+        data = json.loads(DISK_USAGE_FILE.read_text())
+        measured_at = data.pop("measured_at")
+        return DiskUsage(**data), measured_at
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+@dataclass
+class GcResult:
+    removed_scratch: int = 0
+    removed_temp: int = 0
+    pruned_extracted: int = 0
+    removed_archives: int = 0
+    removed_builds: int = 0
+    freed_bytes: int = 0
+
+
+def _remove_older_than(directory: Path, max_age: float, now: float) -> Tuple[int, int]:
+    removed = freed = 0
+    if not directory.exists():
+        return removed, freed
+    for path in directory.iterdir():
+        try:
+            if now - path.stat().st_mtime < max_age:
+                continue
+        except FileNotFoundError:
+            continue
+        freed += _tree_size(path)
+        _remove(path)
+        removed += 1
+    return removed, freed
+
+
+def collect_garbage(
+    protected: Iterable[str] = (),
+    quota_bytes: int = DISK_QUOTA_BYTES,
+    archive_max_age: int = ARCHIVE_MAX_AGE_SECONDS,
+    now: float = None,
+) -> GcResult:
+    """Clean up workspaces and keep OUTPUT_DIR under quota_bytes.
+
+    protected: attachment IDs whose archives must be kept (pending or
+    running submissions). Removed archives are re-downloaded from Redmine
+    when a submission is run again.
+    """
+    now = now or time.time()
+    protected = set(protected)
+    result = GcResult()
+
+    # Leftovers from crashed or killed runs
+    result.removed_scratch, freed = _remove_older_than(
+        WORKSPACE_DIR, SCRATCH_MAX_AGE_SECONDS, now
+    )
+    result.freed_bytes += freed
+    removed, freed = _remove_older_than(RUN_WORKSPACE_DIR, SCRATCH_MAX_AGE_SECONDS, now)
+    result.removed_scratch += removed
+    result.freed_bytes += freed
+    result.removed_temp, freed = _remove_older_than(
+        TEST_TEMP_DIR, TEMP_MAX_AGE_SECONDS, now
+    )
+    result.freed_bytes += freed
+    result.removed_builds, freed = prune()
+    result.freed_bytes += freed
+
+    # Only the original archive is retained per attachment
+    archives = []
+    for archive_dir in _archive_dirs():
+        for path in archive_dir.iterdir():
+            if not path.name.startswith(f"{ARCHIVE_PREFIX}."):
+                result.freed_bytes += _tree_size(path)
+                _remove(path)
+                result.pruned_extracted += 1
+        archives.append((_last_used(archive_dir), archive_dir, _tree_size(archive_dir)))
+
+    # Age-based, then LRU eviction under the quota
+    archives.sort(key=lambda a: a[0])
+    total = sum(size for _, _, size in archives)
+    for last_used, archive_dir, size in archives:
+        if archive_dir.name in protected:
+            continue
+        expired = archive_max_age > 0 and now - last_used > archive_max_age
+        if not expired and total <= quota_bytes:
+            continue
+        _remove(archive_dir)
+        total -= size
+        result.removed_archives += 1
+        result.freed_bytes += size
+
+    return result
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        usage = disk_usage()
+        print(json.dumps({**asdict(usage), "total_bytes": usage.total_bytes}, indent=2))
+    elif command == "gc":
+        from models import Submission
+        from database import create_db_app
+
+        app = create_db_app()
+        with app.app_context():
+            active = Submission.query.filter(
+                Submission.status.in_(["pending", "running"])
+            ).all()
+            protected = [s.attachment_id for s in active]
+        print(json.dumps(asdict(collect_garbage(protected)), indent=2))
+        record_disk_usage()
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()